@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+Timing and scheduling for animations on the LCD display. Animations are
+written as generators that draw a step and then yield how long to wait before
+the next one, so the same animation can be played with blocking sleeps or
+awaited alongside other animations on an asyncio event loop.
+"""
+import asyncio
+from time import monotonic, sleep
+from typing import Callable, Coroutine, Dict, Iterable, Set
+
+# An animation draws one step each time it is advanced and yields the delay
+# (in seconds) until the next step should be drawn
+Animation = Iterable[float]
+
+
+class Pacer:
+    """
+    Description
+    -----------
+    Waits out the delays of an animation against monotonic deadlines rather
+    than sleeping for each delay in turn, so the time spent drawing each step
+    does not accumulate into drift.
+    """
+    def __init__(self, clock: Callable[[], float] = monotonic) -> None:
+        """
+        Description
+        -----------
+        Create a pacer whose first deadline is measured from the first wait
+
+        Params
+        ------
+        :clock: Callable[[], float] = monotonic
+        The clock deadlines are measured against
+        """
+        self.clock = clock
+        self.deadline = None
+
+    def _until_next(self, delay: float) -> float:
+        now = self.clock()
+        # If drawing fell more than a whole step behind, start over from now
+        # instead of rushing through the missed steps to catch up
+        if self.deadline is None or self.deadline + delay < now:
+            self.deadline = now
+        self.deadline += delay
+        return max(self.deadline - now, 0.0)
+
+    def sleep(self, delay: float) -> None:
+        """
+        Description
+        -----------
+        Block until the next deadline
+
+        Params
+        ------
+        :delay: float
+        Seconds between the previous deadline and the next one
+        """
+        remaining = self._until_next(delay)
+        if remaining:
+            sleep(remaining)
+
+    async def async_sleep(self, delay: float) -> None:
+        """
+        Description
+        -----------
+        Yield to the event loop until the next deadline
+
+        Params
+        ------
+        :delay: float
+        Seconds between the previous deadline and the next one
+        """
+        await asyncio.sleep(self._until_next(delay))
+
+
+def play(animation: Animation, pacer: Pacer = None) -> None:
+    """
+    Description
+    -----------
+    Play an animation to completion, blocking while it plays
+
+    Params
+    ------
+    :animation: Animation
+    The animation to play
+
+    :pacer: Pacer = None
+    The pacer to time the steps with, a new one by default
+    """
+    pacer = pacer or Pacer()
+    for delay in animation:
+        pacer.sleep(delay)
+
+
+async def play_async(animation: Animation, pacer: Pacer = None) -> None:
+    """
+    Description
+    -----------
+    Play an animation to completion without blocking the event loop
+
+    Params
+    ------
+    :animation: Animation
+    The animation to play
+
+    :pacer: Pacer = None
+    The pacer to time the steps with, a new one by default
+    """
+    pacer = pacer or Pacer(asyncio.get_running_loop().time)
+    for delay in animation:
+        await pacer.async_sleep(delay)
+
+
+class AnimationScheduler:
+    """
+    Description
+    -----------
+    Runs several animations on the display at the same time, each one owning
+    its own band of lines. Since every animation runs on the same event loop
+    their writes to the display never interleave mid step.
+
+    Example
+    -------
+    scheduler = AnimationScheduler()
+    scheduler.start(display.refresh_line_async(0, clock_text), rows=[0])
+    scheduler.start(display.flow_text_async(message, first_row=1), rows=[1, 2, 3])
+    await scheduler.wait()
+    """
+    def __init__(self) -> None:
+        self._regions: Dict[asyncio.Task, Set[int]] = {}
+
+    def start(self, animation: Coroutine, rows: Iterable[int]) -> asyncio.Task:
+        """
+        Description
+        -----------
+        Start an animation on a region of the display
+
+        Params
+        ------
+        :animation: Coroutine
+        The coroutine playing the animation, for example
+        display.flow_text_async("...", first_row=1)
+
+        :rows: Iterable[int]
+        The lines (zero based index) the animation draws on
+
+        Return
+        ------
+        asyncio.Task
+        The task playing the animation
+        """
+        rows = set(rows)
+        for task, taken in self._regions.items():
+            if rows & taken:
+                animation.close()
+                raise ValueError(
+                    f"rows {sorted(rows & taken)} are already being animated "
+                    + f"by {task.get_name()}"
+                )
+        task = asyncio.ensure_future(animation)
+        self._regions[task] = rows
+        task.add_done_callback(lambda done: self._regions.pop(done, None))
+        return task
+
+    def stop(self, rows: Iterable[int] = None) -> None:
+        """
+        Description
+        -----------
+        Stop the animations drawing on any of the given lines, freeing their
+        lines straight away for new animations
+
+        Params
+        ------
+        :rows: Iterable[int] = None
+        The lines (zero based index) to free up, every line by default
+        """
+        rows = None if rows is None else set(rows)
+        for task, taken in list(self._regions.items()):
+            if rows is None or rows & taken:
+                del self._regions[task]
+                task.cancel()
+
+    async def wait(self) -> None:
+        """
+        Description
+        -----------
+        Wait for every running animation to finish, raising the first error
+        any of them hit
+        """
+        while self._regions:
+            await asyncio.gather(*self._regions)
+
+    def cancel(self) -> None:
+        """
+        Description
+        -----------
+        Stop every running animation
+        """
+        self.stop()
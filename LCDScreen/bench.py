@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+Benchmarks the LCDDisplay hot paths against a recording fake SMBus, so the
+cost of each operation can be measured (and tracked for regressions) on any
+machine without a display attached.
+
+For each operation it reports:
+- frames: how many times the operation drew to the display
+- transactions: the i2c transactions it took
+- bytes_written: the bytes those transactions put on the bus
+- seconds: the time spent outside of sleep (every sleep, including the ones
+  RPLCD makes between enable pulses, is skipped and only tallied)
+- sleep_seconds: the time the operation asked to sleep for
+- fps: the frames per second achievable with every delay set to zero
+
+Running the Program
+-------------------
+./bench.py                     # JSON results on stdout
+./bench.py --output bench.json # or to a file
+./bench.py --batched           # only the batched transport
+"""
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List
+
+import animation
+from display import LCDDisplay
+from transport import FakeSMBus
+
+MESSAGE = (
+    "The quick brown fox jumps over the lazy dog while the marquee keeps on "
+    + "scrolling across every line of the display"
+)
+
+
+class SleepMeter:
+    """
+    Description
+    -----------
+    Stands in for time.sleep, tallying how long was asked for instead of
+    sleeping
+    """
+    def __init__(self) -> None:
+        self.requested = 0.0
+        self.calls = 0
+
+    def __call__(self, seconds: float) -> None:
+        self.requested += seconds
+        self.calls += 1
+
+
+@contextmanager
+def metered_sleep() -> Iterator[SleepMeter]:
+    """
+    Description
+    -----------
+    Replace every sleep the display code makes with a SleepMeter for the
+    duration of the block
+
+    Return
+    ------
+    Iterator[SleepMeter]
+    The meter tallying the sleeps
+    """
+    meter = SleepMeter()
+    original_sleep, original_animation_sleep = time.sleep, animation.sleep
+    time.sleep = animation.sleep = meter
+    try:
+        yield meter
+    finally:
+        time.sleep = original_sleep
+        animation.sleep = original_animation_sleep
+
+
+def _count_frames(display: LCDDisplay) -> List[int]:
+    """Count every render the display makes, returning the live counter"""
+    frames = [0]
+    send_runs = display._send_runs
+
+    def counting_send_runs(*args, **kwargs):
+        frames[0] += 1
+        send_runs(*args, **kwargs)
+
+    display._send_runs = counting_send_runs
+    return frames
+
+
+def _write_line(display: LCDDisplay) -> None:
+    for count in range(200):
+        display.write_line(f"Line update {count}", count % display.lcd.rows)
+
+
+def _show_time(display: LCDDisplay) -> None:
+    start = datetime(2024, 1, 1, 23, 58)
+    for second in range(300):
+        display.show_time(start + timedelta(seconds=second))
+
+
+def _flow_text(display: LCDDisplay) -> None:
+    display.flow_text(MESSAGE)
+
+
+def _write_words(display: LCDDisplay) -> None:
+    display.write_words(MESSAGE.split())
+
+
+OPERATIONS: Dict[str, Callable[[LCDDisplay], None]] = {
+    "write_line": _write_line,
+    "show_time": _show_time,
+    "flow_text": _flow_text,
+    "write_words": _write_words,
+}
+
+
+def bench(name: str, batched: bool) -> Dict[str, Any]:
+    """
+    Description
+    -----------
+    Benchmark one operation on a freshly initialized display
+
+    Params
+    ------
+    :name: str
+    The operation to run, one of OPERATIONS
+
+    :batched: bool
+    Whether the display uses the batched transport
+
+    Return
+    ------
+    Dict[str, Any]
+    The measurements, see the module docstring
+    """
+    bus = FakeSMBus()
+    with metered_sleep() as meter:
+        display = LCDDisplay(
+            bus=bus,
+            batched=batched,
+            letter_delay=0,
+            word_delay=0,
+            clear_delay=0,
+        )
+        bus.reset()
+        frames = _count_frames(display)
+        sleep_before = meter.requested
+        started = time.perf_counter()
+        OPERATIONS[name](display)
+        seconds = time.perf_counter() - started
+        sleep_seconds = meter.requested - sleep_before
+    return {
+        "operation": name,
+        "batched": batched,
+        "frames": frames[0],
+        "transactions": len(bus.transactions),
+        "bytes_written": bus.bytes_written,
+        "seconds": seconds,
+        "sleep_seconds": sleep_seconds,
+        "fps": frames[0] / seconds if seconds else None,
+        "display_bytes_sent": display.render_stats.bytes_sent,
+        "display_bytes_saved": display.render_stats.bytes_saved,
+    }
+
+
+def run(operations: List[str], modes: List[bool]) -> List[Dict[str, Any]]:
+    """
+    Description
+    -----------
+    Benchmark several operations in several modes
+
+    Params
+    ------
+    :operations: List[str]
+    The operations to run, see OPERATIONS
+
+    :modes: List[bool]
+    For each operation, whether to run it unbatched (False), batched
+    (True) or both
+
+    Return
+    ------
+    List[Dict[str, Any]]
+    The measurements for every operation and mode
+    """
+    return [bench(name, batched) for name in operations for batched in modes]
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from argparse import RawTextHelpFormatter
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--operation",
+        choices=sorted(OPERATIONS),
+        action="append",
+        help="An operation to benchmark, may be repeated (default: all)",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--batched",
+        action="store_true",
+        help="Only benchmark the batched transport",
+    )
+    mode.add_argument(
+        "--unbatched",
+        action="store_true",
+        help="Only benchmark the stock RPLCD transport",
+    )
+    parser.add_argument(
+        "--output",
+        type=argparse.FileType("w"),
+        default=sys.stdout,
+        help="Where to write the JSON results (default: stdout)",
+    )
+
+    args = parser.parse_args()
+    if args.batched:
+        modes = [True]
+    elif args.unbatched:
+        modes = [False]
+    else:
+        modes = [False, True]
+
+    results = run(args.operation or list(OPERATIONS), modes)
+    json.dump(results, args.output, indent=2)
+    args.output.write("\n")
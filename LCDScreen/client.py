@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+A thin client for the LCD display daemon (see daemon.py). Messages are sent
+over the daemon's unix socket as one line of JSON each, so showing something
+only costs a socket round trip rather than starting up and initializing the
+display again.
+
+Running the Program
+-------------------
+With the daemon running, pass a command and its params, for example:
+
+./client.py write_line --line_no 0 "Hello there"
+./client.py flow_text --first_row 1 "A long message to scroll by"
+./client.py show_text --repeat -1 "Some words to write out"
+./client.py clock --tzname America/Chicago
+./client.py stop
+"""
+import json
+import os
+import socket
+from typing import Any, Dict
+
+DEFAULT_SOCKET_PATH = os.getenv("LCD_SOCKET", "/tmp/lcd_display.sock")
+
+
+def send(
+    command: str,
+    socket_path: str = DEFAULT_SOCKET_PATH,
+    **params: Any,
+) -> Dict[str, Any]:
+    """
+    Description
+    -----------
+    Send one command to the daemon and wait for it to be accepted
+
+    Params
+    ------
+    :command: str
+    One of show_text, write_line, flow_text, clock, clear or stop
+
+    :socket_path: str = DEFAULT_SOCKET_PATH
+    The unix socket the daemon is listening on
+
+    :params: Any
+    The params for the command, see the daemon's handler for it
+
+    Return
+    ------
+    Dict[str, Any]
+    The daemon's response, {"ok": True} or {"ok": False, "error": "..."}
+    """
+    message = json.dumps({"command": command, **params}).encode("utf-8")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(message + b"\n")
+        with connection.makefile("rb") as responses:
+            return json.loads(responses.readline())
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from argparse import RawTextHelpFormatter
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help=f"The daemon's unix socket (default: {DEFAULT_SOCKET_PATH})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show_text = commands.add_parser("show_text", help="Write words out")
+    show_text.add_argument("text", type=str)
+    show_text.add_argument("--repeat", type=int, default=0)
+    show_text.add_argument("--first_row", type=int, default=0)
+    show_text.add_argument("--row_count", type=int, default=None)
+
+    write_line = commands.add_parser("write_line", help="Replace one line")
+    write_line.add_argument("text", type=str)
+    write_line.add_argument("--line_no", type=int, required=True)
+
+    flow_text = commands.add_parser("flow_text", help="Scroll text by")
+    flow_text.add_argument("text", type=str)
+    flow_text.add_argument("--first_row", type=int, default=0)
+    flow_text.add_argument("--row_count", type=int, default=None)
+
+    clock = commands.add_parser("clock", help="Show a ticking clock")
+    clock.add_argument("--tzname", type=str, default=None)
+    clock.add_argument("--first_row", type=int, default=0)
+
+    commands.add_parser("clear", help="Stop everything and clear the display")
+
+    stop = commands.add_parser("stop", help="Stop animations")
+    stop.add_argument("--rows", type=int, nargs="*", default=None)
+
+    args = vars(parser.parse_args())
+    socket_path = args.pop("socket")
+    command = args.pop("command")
+    params = {name: value for name, value in args.items() if value is not None}
+
+    response = send(command, socket_path, **params)
+    if not response["ok"]:
+        print(response["error"], file=sys.stderr)
+        sys.exit(1)
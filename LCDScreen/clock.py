@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+An always-on clock for the LCD display. Rather than formatting and rewriting
+every line each second, the clock keeps track of what it last showed and only
+works out the lines that actually changed. The date lines only change at
+midnight and the time line is built from its fields instead of strftime.
+"""
+from datetime import datetime, tzinfo
+from time import time
+from typing import Dict, Optional
+
+# How far past each second boundary the clock wakes up so that it never reads
+# the time a hair early and shows the second that just ended
+TICK_OFFSET = 0.01
+
+
+class ClockFace:
+    """
+    Description
+    -----------
+    The lines of the clock, in the same layout as LCDDisplay.show_time:
+
+    Saturday
+    October 18, 2026
+    09:41:07 AM CDT
+    """
+    def __init__(self, tz: tzinfo) -> None:
+        """
+        Description
+        -----------
+        Create a clock face that has not shown anything yet
+
+        Params
+        ------
+        :tz: tzinfo
+        The timezone to show the time in
+        """
+        self.tz = tz
+        self._date = None
+        self._hour = None
+        self._suffix = ""
+        self._time_line = None
+
+    def changes(self, dt: datetime) -> Dict[int, str]:
+        """
+        Description
+        -----------
+        Work out which lines need to change to show a time
+
+        Params
+        ------
+        :dt: datetime
+        The time to show
+
+        Return
+        ------
+        Dict[int, str]
+        The new text for each line (zero based index) that changed
+        """
+        changed = {}
+        if dt.date() != self._date:
+            self._date = dt.date()
+            changed[0] = dt.strftime("%A")
+            changed[1] = dt.strftime("%B %d, %Y")
+        hour = (dt.hour, dt.utcoffset())
+        if hour != self._hour:
+            # The AM/PM and timezone abbreviation (which flips with daylight
+            # saving time) can only change on the hour, keyed on the offset
+            # too since the hour repeats when the clocks go back
+            self._hour = hour
+            self._suffix = f" {'AM' if dt.hour < 12 else 'PM'} {dt.tzname()}"
+        time_line = (
+            f"{(dt.hour - 1) % 12 + 1:02d}:{dt.minute:02d}:{dt.second:02d}"
+            + self._suffix
+        )
+        if time_line != self._time_line:
+            self._time_line = time_line
+            changed[2] = time_line
+        return changed
+
+    def until_next_tick(self, timestamp: Optional[float] = None) -> float:
+        """
+        Description
+        -----------
+        Seconds until just after the next second boundary
+
+        Params
+        ------
+        :timestamp: Optional[float] = None
+        The current unix time, read from the system clock if not given
+
+        Return
+        ------
+        float
+        How long to wait before the next tick
+        """
+        if timestamp is None:
+            timestamp = time()
+        return 1.0 - timestamp % 1.0 + TICK_OFFSET
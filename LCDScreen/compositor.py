@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+A compositor that sits in front of an LCDDisplay and decides what actually
+gets drawn. Producers can submit lines faster than the display can take them
+(every character costs ~40us on the HD44780 plus the i2c overhead to get it
+there), so rather than queueing every update, the compositor keeps only the
+newest text for each line and draws whatever is newest at a capped frame
+rate. Updates that get replaced before they are drawn are dropped.
+
+Each line also has priority layers. Whatever is on the highest priority layer
+is what shows, so an alert can cover up a scrolling message for a while and
+the message carries on underneath it once the alert expires.
+"""
+import threading
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from animation import Pacer
+from display import LCDDisplay
+
+BACKGROUND = 0
+NORMAL = 10
+ALERT = 20
+
+
+@dataclass
+class CompositorStats:
+    """
+    Description
+    -----------
+    Running totals for the compositor
+    """
+    submitted: int = 0
+    dropped_frames: int = 0
+    frames: int = 0
+    lines_drawn: int = 0
+
+
+class Compositor:
+    """
+    Description
+    -----------
+    Coalesces line updates from any number of producer threads and draws them
+    on its own render thread at no more than max_fps frames per second.
+    While the compositor is running it should be the only thing drawing on
+    the display.
+    """
+    def __init__(
+        self,
+        display: LCDDisplay,
+        max_fps: float = 20.0,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        """
+        Description
+        -----------
+        Create a compositor, call start() to begin drawing
+
+        Params
+        ------
+        :display: LCDDisplay
+        The initialized LCD Character display to draw on
+
+        :max_fps: float = 20.0
+        The most frames to draw per second
+
+        :clock: Callable[[], float] = monotonic
+        The clock alert hold times are measured against
+        """
+        if max_fps <= 0:
+            raise ValueError("Cannot cap the frame rate at or below 0 fps.")
+        self.display = display
+        self.max_fps = max_fps
+        self.clock = clock
+        self.stats = CompositorStats()
+        # line_no -> priority -> (text, expires at or None)
+        self._layers: Dict[int, Dict[int, Tuple[str, Optional[float]]]] = {}
+        self._dirty = set()
+        self._shown: Dict[int, str] = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def queue_depth(self) -> int:
+        """How many lines have updates waiting to be drawn"""
+        with self._condition:
+            return len(self._dirty)
+
+    def submit(
+        self,
+        line_no: int,
+        text: str,
+        priority: int = NORMAL,
+        hold: Optional[float] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Set the text of a line on one of its priority layers, replacing
+        anything submitted there before
+
+        Params
+        ------
+        :line_no: int
+        The line number (zero based index) to write the text to
+
+        :text: str
+        The text to show on the line
+
+        :priority: int = NORMAL
+        The layer to put the text on, the highest layer on a line is the
+        one that shows
+
+        :hold: Optional[float] = None
+        Seconds before the text is taken back off its layer, it stays until
+        replaced if not given
+        """
+        if not 0 <= line_no < self.display.lcd.rows:
+            raise IndexError(
+                f"line_no {line_no} out of range for Compositor.submit()"
+            )
+        expires = None if hold is None else self.clock() + hold
+        with self._condition:
+            layers = self._layers.setdefault(line_no, {})
+            if line_no in self._dirty and self._top(line_no) == priority:
+                # The last update to this line never made it to the display
+                self.stats.dropped_frames += 1
+            layers[priority] = (text, expires)
+            self._dirty.add(line_no)
+            self.stats.submitted += 1
+            self._condition.notify()
+
+    def submit_lines(
+        self,
+        lines: Sequence[str],
+        first_row: int = 0,
+        priority: int = NORMAL,
+        hold: Optional[float] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Submit a block of lines at once, see submit
+
+        Params
+        ------
+        :lines: Sequence[str]
+        The lines of text, one per row
+
+        :first_row: int = 0
+        The line the first of the lines goes on
+        """
+        for offset, text in enumerate(lines):
+            self.submit(first_row + offset, text, priority, hold)
+
+    def clear(self, line_no: int, priority: int = NORMAL) -> None:
+        """
+        Description
+        -----------
+        Take whatever is on a layer of a line off it, uncovering the layer
+        underneath
+
+        Params
+        ------
+        :line_no: int
+        The line number (zero based index) to clear the layer on
+
+        :priority: int = NORMAL
+        The layer to clear
+        """
+        with self._condition:
+            if self._layers.get(line_no, {}).pop(priority, None) is not None:
+                self._dirty.add(line_no)
+                self._condition.notify()
+
+    def _top(self, line_no: int) -> Optional[int]:
+        layers = self._layers.get(line_no)
+        return max(layers) if layers else None
+
+    def _expire(self, now: float) -> Optional[float]:
+        """Take expired text off its layer, returning when the next expires"""
+        next_expiry = None
+        for line_no, layers in self._layers.items():
+            for priority, (_, expires) in list(layers.items()):
+                if expires is None:
+                    continue
+                if expires <= now:
+                    del layers[priority]
+                    self._dirty.add(line_no)
+                elif next_expiry is None or expires < next_expiry:
+                    next_expiry = expires
+        return next_expiry
+
+    def render(self) -> int:
+        """
+        Description
+        -----------
+        Draw the newest text for every line that changed since the last frame
+
+        Return
+        ------
+        int
+        How many lines were drawn
+        """
+        with self._condition:
+            self._expire(self.clock())
+            frame: List[Tuple[int, str]] = []
+            for line_no in self._dirty:
+                top = self._top(line_no)
+                text = "" if top is None else self._layers[line_no][top][0]
+                if self._shown.get(line_no) != text:
+                    frame.append((line_no, text))
+            self._dirty.clear()
+        if not frame:
+            return 0
+        with self.display.batch():
+            for line_no, text in frame:
+                self.display.write_line(text[:self.display.lcd.cols], line_no)
+                self._shown[line_no] = text
+        self.stats.frames += 1
+        self.stats.lines_drawn += len(frame)
+        return len(frame)
+
+    def _run(self) -> None:
+        pacer = Pacer(self.clock)
+        while not self._stopped.is_set():
+            with self._condition:
+                while not self._dirty and not self._stopped.is_set():
+                    next_expiry = self._expire(self.clock())
+                    if self._dirty:
+                        break
+                    timeout = None
+                    if next_expiry is not None:
+                        timeout = max(next_expiry - self.clock(), 0.0)
+                    self._condition.wait(timeout)
+            if self._stopped.is_set():
+                break
+            self.render()
+            pacer.sleep(1.0 / self.max_fps)
+
+    def start(self) -> None:
+        """
+        Description
+        -----------
+        Start drawing on a background thread
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="Compositor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Description
+        -----------
+        Stop drawing, anything still waiting to be drawn stays undrawn
+        """
+        with self._condition:
+            self._stopped.set()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def feed(
+        self,
+        frames: Iterable[Sequence[str]],
+        first_row: int = 0,
+        priority: int = NORMAL,
+        interval: float = 0.05,
+    ) -> None:
+        """
+        Description
+        -----------
+        Submit a stream of frames (such as a marquee's) one after another,
+        blocking while it plays. Frames that come faster than the compositor
+        draws are coalesced rather than queued.
+
+        Params
+        ------
+        :frames: Iterable[Sequence[str]]
+        The frames to submit, each a block of lines
+
+        :first_row: int = 0
+        The line the first line of each frame goes on
+
+        :priority: int = NORMAL
+        The layer to submit the frames on
+
+        :interval: float = 0.05
+        Seconds between frames
+        """
+        pacer = Pacer(self.clock)
+        for lines in frames:
+            self.submit_lines(lines, first_row, priority)
+            pacer.sleep(interval)
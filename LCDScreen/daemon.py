@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+A long running daemon that owns the LCD display and takes commands over a
+unix socket. Starting python, importing RPLCD and initializing the display
+takes seconds on a Pi Zero and resets whatever was on the screen, so rather
+than paying for that on every message, the daemon does it once and any
+number of producers can then share the screen through client.py.
+
+Every command is one line of JSON with a "command" key plus that command's
+params, and is answered with one line of JSON, either {"ok": true} or
+{"ok": false, "error": "..."}. Commands that animate (show_text, flow_text
+and clock) are accepted straight away and play in the background. A new
+command takes over the lines it draws on from whatever was animating them.
+
+Running the Program
+-------------------
+./daemon.py --socket /tmp/lcd_display.sock
+
+then see client.py for sending it commands.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict
+
+from animation import AnimationScheduler
+from client import DEFAULT_SOCKET_PATH
+from dates import DEFAULT_TIMEZONE, get_timezone
+from display import LCDDisplay
+from splittext import text_to_words
+
+logger = logging.getLogger()
+
+# The lines run_clock draws on
+CLOCK_ROWS = 3
+
+
+class DisplayDaemon:
+    """
+    Description
+    -----------
+    Serves commands for an LCDDisplay over a unix socket
+    """
+    def __init__(
+        self,
+        display: LCDDisplay,
+        socket_path: str = DEFAULT_SOCKET_PATH,
+    ) -> None:
+        """
+        Description
+        -----------
+        Create the daemon, it does not listen until served
+
+        Params
+        ------
+        :display: LCDDisplay
+        The initialized LCD Character display to draw on
+
+        :socket_path: str = DEFAULT_SOCKET_PATH
+        The unix socket to listen on
+        """
+        self.display = display
+        self.socket_path = socket_path
+        self.scheduler = AnimationScheduler()
+        self.handlers = {
+            "show_text": self.show_text,
+            "write_line": self.write_line,
+            "flow_text": self.flow_text,
+            "clock": self.clock,
+            "clear": self.clear,
+            "stop": self.stop,
+        }
+
+    def _animate(self, animation, rows: range) -> None:
+        self.scheduler.stop(rows)
+        task = self.scheduler.start(animation, rows)
+        task.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Animation failed: {task.exception()!r}")
+
+    def show_text(
+        self,
+        text: str,
+        repeat: int = 0,
+        first_row: int = 0,
+        row_count: int = None,
+    ) -> None:
+        """Write words out a letter at a time, see LCDDisplay.write_words"""
+        rows = self.display._region(first_row, row_count, "write_words")
+        self._animate(
+            self.display.write_words_async(
+                text_to_words(text), repeat, first_row, len(rows)
+            ),
+            rows,
+        )
+
+    def write_line(self, text: str, line_no: int) -> None:
+        """Replace a single line, see LCDDisplay.write_line"""
+        self.scheduler.stop([line_no])
+        self.display.write_line(text, line_no)
+
+    def flow_text(
+        self,
+        text: str,
+        first_row: int = 0,
+        row_count: int = None,
+    ) -> None:
+        """Scroll text through the display, see LCDDisplay.flow_text"""
+        rows = self.display._region(first_row, row_count, "flow_text")
+        self._animate(
+            self.display.flow_text_async(text, first_row, len(rows)),
+            rows,
+        )
+
+    def clock(self, tzname: str = DEFAULT_TIMEZONE, first_row: int = 0) -> None:
+        """Show a ticking clock, see LCDDisplay.run_clock"""
+        rows = self.display._region(first_row, CLOCK_ROWS, "run_clock")
+        # Looked up now so a bad name is rejected before anything is stopped
+        get_timezone(tzname)
+        self._animate(self.display.run_clock_async(tzname, first_row), rows)
+
+    def clear(self) -> None:
+        """Stop every animation and clear the display"""
+        self.scheduler.stop()
+        self.display.clear()
+
+    def stop(self, rows: list = None) -> None:
+        """Stop the animations on some lines, or all of them, leaving the
+        display showing whatever they last drew"""
+        self.scheduler.stop(rows)
+
+    def handle(self, line: bytes) -> Dict[str, Any]:
+        """
+        Description
+        -----------
+        Run one command
+
+        Params
+        ------
+        :line: bytes
+        The command as a line of JSON
+
+        Return
+        ------
+        Dict[str, Any]
+        The response to send back
+        """
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise TypeError(f"Expected a JSON object, got {type(message).__name__}")
+            command = message.pop("command")
+            if command not in self.handlers:
+                raise ValueError(f"Unknown command {command!r}")
+            self.handlers[command](**message)
+        except (
+            IndexError,
+            KeyError,
+            OverflowError,
+            TypeError,
+            ValueError,
+        ) as e:
+            logger.warning(f"Rejected {line!r}: {e!r}")
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True}
+
+    async def _serve_client(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = json.dumps(self.handle(line)) + "\n"
+                writer.write(response.encode("utf-8"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve_forever(self) -> None:
+        """
+        Description
+        -----------
+        Listen on the socket and run commands until cancelled
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(
+            self._serve_client, path=self.socket_path
+        )
+        logger.info(f"Listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.scheduler.cancel()
+            os.unlink(self.socket_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    from argparse import RawTextHelpFormatter
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help=f"The unix socket to listen on (default: {DEFAULT_SOCKET_PATH})",
+    )
+    parser.add_argument(
+        "--address",
+        type=lambda value: int(value, 0),
+        default=0x27,
+        help="The i2c address of the display (default: 0x27)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=1,
+        help="The i2c port the display is on (default: 1)",
+    )
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="Batch writes to the display into i2c block writes",
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    daemon = DisplayDaemon(
+        LCDDisplay(address=args.address, port=args.port, batched=args.batched),
+        socket_path=args.socket,
+    )
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        daemon.display.clear()
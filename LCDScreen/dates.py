@@ -5,11 +5,33 @@ Description
 Reusable functions for date/time manipulation
 """
 from datetime import datetime
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
 DEFAULT_TIMEZONE = "America/Chicago"
 
 
+@lru_cache(maxsize=None)
+def get_timezone(tzname: str = DEFAULT_TIMEZONE) -> ZoneInfo:
+    """
+    Description
+    -----------
+    Look up a timezone by name, caching it so that repeated lookups (such as
+    a clock ticking every second) do not have to build it again
+
+    Params
+    ------
+    :tzname: str = "America/Chicago"
+    The timezone to look up
+
+    Return
+    ------
+    ZoneInfo
+    The timezone
+    """
+    return ZoneInfo(tzname)
+
+
 def get_current_datetime_at_tz(tzname: str = DEFAULT_TIMEZONE) -> datetime:
     """
     Description
@@ -27,4 +49,4 @@ def get_current_datetime_at_tz(tzname: str = DEFAULT_TIMEZONE) -> datetime:
     datetime
     The timezone aware datetime object
     """
-    return datetime.now(tz=ZoneInfo(tzname))
+    return datetime.now(tz=get_timezone(tzname))
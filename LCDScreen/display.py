@@ -5,13 +5,27 @@ Description
 A helper class for writing to the LCD display
 """
 import logging
+from contextlib import contextmanager
 from datetime import datetime
-from time import sleep
-from typing import List
+from time import time
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
 
 from RPLCD import i2c
 
-from dates import DEFAULT_TIMEZONE, get_current_datetime_at_tz
+from animation import Animation, play, play_async
+from clock import ClockFace
+from dates import DEFAULT_TIMEZONE, get_current_datetime_at_tz, get_timezone
+from glyphs import (
+    GLYPHS,
+    Bitmap,
+    GlyphCache,
+    bar_glyphs,
+    big_text_glyphs,
+)
+from framebuffer import FrameBuffer, RenderStats, Run
+from layout import WordLayout
+from marquee import Marquee, split_rows
+from transport import PCF8574_RS, SLOW_INSTRUCTIONS, PCF8574Transport
 
 logger = logging.getLogger()
 
@@ -36,6 +50,8 @@ class LCDDisplay(i2c.CharLCD):
         letter_delay: float = 0.05,
         word_delay: float = 0.3,
         clear_delay: float = 1.0,
+        bus: object = None,
+        batched: bool = False,
     ) -> None:
         """
         Description
@@ -56,7 +72,28 @@ class LCDDisplay(i2c.CharLCD):
         :clear_delay: float = 1.0
         For certain methods that write one block of the display at a time,
         the delay between clearing the display and writing again
+
+        :bus: object = None
+        An already open SMBus to talk to the display over instead of opening
+        the one on port, for example a transport.FakeSMBus to run without a
+        display attached
+
+        :batched: bool = False
+        Whether to send writes through a PCF8574Transport, which batches each
+        update into a few SMBus block writes instead of four single byte
+        writes per nibble. Only the PCF8574 expander is supported.
         """
+        if batched and i2c_expander != 'PCF8574':
+            raise NotImplementedError(
+                f"Batched writes are not supported for {i2c_expander}"
+            )
+        self._injected_bus = bus
+        self.transport = None
+        self._batch_depth = 0
+        # The base class clears the display while initializing, which resets
+        # the framebuffer, so it has to exist before that happens.
+        self.framebuffer = FrameBuffer(cols=cols, rows=rows)
+        self.render_stats = RenderStats()
         super().__init__(
             i2c_expander=i2c_expander,
             address=address,
@@ -65,102 +102,425 @@ class LCDDisplay(i2c.CharLCD):
             cols=cols,
             rows=rows,
         )
+        self.address = address
+        self.port = port
         self.letter_delay = letter_delay
         self.word_delay = word_delay
         self.clear_delay = clear_delay
+        self.glyphs = GlyphCache(self.create_char)
+        # The display is initialized through the base class's unbatched
+        # writes, which take care of the timing the power on sequence needs
+        if batched:
+            self.transport = PCF8574Transport(self.bus, address)
+            self.render_stats.transactions_per_byte = (
+                self.transport.transactions_per_byte()
+            )
+
+    def _init_connection(self) -> None:
+        if self._injected_bus is None:
+            super()._init_connection()
+        else:
+            self.bus = self._injected_bus
+
+    def _send_data(self, value: int) -> None:
+        if self.transport is None:
+            super()._send_data(value)
+            return
+        self.transport.send(value, PCF8574_RS | self._backlight)
+        if not self._batch_depth:
+            self.flush()
+
+    def _send_instruction(self, value: int) -> None:
+        if self.transport is None:
+            super()._send_instruction(value)
+            return
+        self.transport.send(value, self._backlight)
+        if not self._batch_depth or value in SLOW_INSTRUCTIONS:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Description
+        -----------
+        Send any batched writes that are still waiting to go to the display
+        """
+        if self.transport is not None:
+            self.transport.flush()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Description
+        -----------
+        Hold every write made inside the block and send them together when it
+        exits, as a few block writes when the display is batched
+
+        Example
+        -------
+        with display.batch():
+            display.cursor_pos = (1, 0)
+            display.write_string("Hello")
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
+
+    def write_string(self, value: str) -> None:
+        """
+        Description
+        -----------
+        Write a string to the display at the cursor, see the i2c module. When
+        the display is batched the whole string goes out in one burst.
+
+        Params
+        ------
+        :value: str
+        The string to write
+        """
+        with self.batch():
+            super().write_string(value)
+
+    def create_char(self, location: int, bitmap: Bitmap) -> None:
+        """
+        Description
+        -----------
+        Upload a custom character to a CGRAM slot, see the i2c module. When
+        the display is batched the whole upload goes out in one burst.
+
+        Params
+        ------
+        :location: int
+        The CGRAM slot (0-7) to upload to
+
+        :bitmap: Bitmap
+        The 8 rows of 5 pixels making up the character
+        """
+        with self.batch():
+            super().create_char(location, bitmap)
+
+    def clear(self) -> None:
+        """
+        Description
+        -----------
+        Clear the display and mark every cell of the framebuffer as blank to
+        match
+        """
+        super().clear()
+        self.framebuffer.reset()
+
+    def _send_runs(self, runs: List[Run], naive: int) -> None:
+        """
+        Description
+        -----------
+        Send the changed runs of cells to the display, only moving the cursor
+        when it is not already sitting where the run starts
+
+        Params
+        ------
+        :runs: List[Run]
+        The (row, col, text) runs returned from diffing the framebuffer
+
+        :naive: int
+        How many bytes rewriting the same cells without the framebuffer would
+        have sent, used to count the savings
+        """
+        sent = 0
+        with self.batch():
+            for row, col, text in runs:
+                if self.cursor_pos != (row, col):
+                    self.cursor_pos = (row, col)
+                    sent += 1
+                self.write_string(text)
+                sent += len(text)
+        self.render_stats.record(sent, naive)
+
+    def _draw(
+        self,
+        row: int,
+        col: int,
+        text: str,
+        naive: Optional[int] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Draw text at a position, sending only the cells that changed
+
+        Params
+        ------
+        :row: int
+        The row (zero based index) to draw on
+
+        :col: int
+        The column (zero based index) to start drawing at
+
+        :text: str
+        The text to draw, clipped to the end of the row
+
+        :naive: Optional[int] = None
+        The bytes a plain write of the text would have cost, defaults to a
+        cursor move plus the text itself
+        """
+        runs = self.framebuffer.diff(row, text, col)
+        if naive is None:
+            naive = 1 + len(text)
+        self._send_runs(runs, naive=naive)
 
-    def write_words(self, words: List[str], repeat: int = 0) -> None:
+    def _draw_lines(self, lines: List[str], first_row: int = 0) -> None:
+        """
+        Description
+        -----------
+        Draw whole lines starting at a row, sending only the cells that
+        changed
+
+        Params
+        ------
+        :lines: List[str]
+        The lines of text, one per row, padded to the width of the display
+
+        :first_row: int = 0
+        The row (zero based index) the first line goes on
+        """
+        runs = self.framebuffer.diff_frame(lines, first_row)
+        self._send_runs(runs, naive=1 + len(lines) * self.lcd.cols)
+
+    def _region(
+        self,
+        first_row: int,
+        row_count: Optional[int],
+        caller: str,
+    ) -> range:
+        """
+        Description
+        -----------
+        Work out and validate the lines a region of the display covers
+
+        Params
+        ------
+        :first_row: int
+        The first line (zero based index) of the region
+
+        :row_count: Optional[int]
+        How many lines the region spans, None for every line from first_row
+        to the bottom of the display
+
+        :caller: str
+        The method asking, used in the error message
+
+        Return
+        ------
+        range
+        The lines in the region
+        """
+        if row_count is None:
+            row_count = self.lcd.rows - first_row
+        if not 0 <= first_row < first_row + row_count <= self.lcd.rows:
+            raise IndexError(
+                f"rows {first_row} to {first_row + row_count - 1} out of "
+                + f"range for LCDDisplay.{caller}()"
+            )
+        return range(first_row, first_row + row_count)
+
+    def blank(self, first_row: int = 0, row_count: Optional[int] = None) -> None:
+        """
+        Description
+        -----------
+        Blank the display, or a region of lines on it. Blanking through the
+        framebuffer only touches cells that are not already blank, but once
+        that would cost more than a single clear instruction the hardware
+        clear is used instead (as long as the whole display is being blanked).
+
+        Params
+        ------
+        :first_row: int = 0
+        The first line (zero based index) to blank
+
+        :row_count: Optional[int] = None
+        How many lines to blank, defaults to every line from first_row to the
+        bottom of the display
+        """
+        rows = self._region(first_row, row_count, "blank")
+        lit_cells = sum(
+            1
+            for row in rows
+            for cell in self.framebuffer.cells[row]
+            if cell != self.framebuffer.blank
+        )
+        if len(rows) == self.lcd.rows and lit_cells > self.lcd.rows:
+            self.clear()
+            self.render_stats.record(1, 1)
+        else:
+            self._draw_lines([""] * len(rows), first_row)
+
+    def _write_words_steps(
+        self,
+        words: Iterable[str],
+        repeat: int,
+        first_row: int,
+        row_count: Optional[int],
+    ) -> Animation:
+        rows = self._region(first_row, row_count, "write_words")
+        layout = WordLayout(
+            words,
+            cols=self.lcd.cols,
+            rows=len(rows),
+            cache=repeat != 0,
+        )
+        if repeat < 0:
+            logger.warning("Infinitely repeating these lines!")
+        self.blank(rows.start, len(rows))
+        while True:
+            pages = 0
+            for page in layout.pages():
+                pages += 1
+                yield self.clear_delay
+                self.blank(rows.start, len(rows))
+                for row, col, word in page:
+                    for offset, letter in enumerate(word):
+                        self._draw(rows.start + row, col + offset, letter, naive=1)
+                        yield self.letter_delay
+                    yield self.word_delay
+            if not pages:
+                # Nothing to write, repeating it would spin forever
+                logger.info("No words to write")
+                return
+            repeat -= 1
+            if repeat == -1:
+                logger.info("Finished writing lines")
+                return
+            if repeat >= 0:
+                logger.info(f"Repeating {repeat} more times")
+
+    def write_words(
+        self,
+        words: Iterable[str],
+        repeat: int = 0,
+        first_row: int = 0,
+        row_count: Optional[int] = None,
+    ) -> None:
         """
         Description
         -----------
         Write a series of lines to the display one letter at a time with a
         brief pause between each word and an even briefer pause between each
-        letter
+        letter. The words are laid out into pages as they are read, so they
+        can come from an iterator that is still being filled (such as a file
+        or stdin), and the layout is kept so that repeats replay it.
 
         Params
         ------
-        :words: List[str]
-        The list of words to write to the screen
+        :words: Iterable[str]
+        The words to write to the screen, items with whitespace in them (such
+        as lines of a file) are split into words
 
         :repeat: int = 0
         How many times to repeat (in addition to the first time the words are written)
         Example: repeat = 2 will be a total of 3 times
+
+        :first_row: int = 0
+        The first line (zero based index) of the region to write the words in
+
+        :row_count: Optional[int] = None
+        How many lines the region spans, defaults to every line from
+        first_row to the bottom of the display
         """
         try:
-            self.clear()
-            for word in words:
-                word_len = len(word) + 1
-                end_of_line = self.cursor_pos[1] + word_len > self.lcd.cols
-                end_of_display = self.cursor_pos[0] == self.lcd.rows - 1
-                big_word = word_len > self.lcd.cols
-                if (
-                    (end_of_display and end_of_line)
-                    or self.cursor_pos == (0, 0)
-                ):
-                        sleep(self.clear_delay)
-                        self.clear()
-                        end_of_display = False
-                elif end_of_line and not big_word:
-                        self.cursor_pos = (self.cursor_pos[0] + 1, 0)
-                for letter in word:
-                        self.write_string(letter)
-                        sleep(self.letter_delay)
-                self.write_string(" ")
-                sleep(self.word_delay)
-            repeat_count = repeat - 1
-            if repeat < 0:
-                logger.warning("Infinitely repeating these lines!")
-                self.write_words(words, repeat=repeat_count)
-            elif repeat > 0:
-                logger.info(f"Repeating {repeat_count} more times")
-                self.write_words(words, repeat=repeat_count)
-            else:
-                logger.info("Finished writing lines")
+            play(self._write_words_steps(words, repeat, first_row, row_count))
         except KeyboardInterrupt:
             self.clear()
 
-    def _get_blank_display_array(self) -> None:
-        return [" " for _ in range(self.lcd.rows * self.lcd.cols)]
+    async def write_words_async(
+        self,
+        words: Iterable[str],
+        repeat: int = 0,
+        first_row: int = 0,
+        row_count: Optional[int] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        The same as write_words, but waits between letters and words without
+        blocking the event loop so other animations can run alongside it.
+        See write_words for the params.
+        """
+        await play_async(
+            self._write_words_steps(words, repeat, first_row, row_count)
+        )
+
+    def _flow_text_steps(
+        self,
+        text: Iterable[str],
+        first_row: int,
+        row_count: Optional[int],
+    ) -> Animation:
+        rows = self._region(first_row, row_count, "flow_text")
+        cols = self.lcd.cols
+        marquee = Marquee(cols * len(rows))
+        self._draw_lines(split_rows(marquee.text, cols), first_row)
+        for frame in marquee.frames(text):
+            self._draw_lines(split_rows(frame, cols), first_row)
+            yield self.letter_delay
 
-    def flow_text(self, text: str) -> None:
+    def flow_text(
+        self,
+        text: Iterable[str],
+        first_row: int = 0,
+        row_count: Optional[int] = None,
+    ) -> None:
         """
         Description
         -----------
         Flow a long string of text through the display starting at the bottom
         left and incrementing one character at a time until the entire message
-        has flowed
+        has flowed. The text can be limited to a region of lines so that the
+        rest of the display stays as it is, for example scrolling a single
+        line underneath a fixed heading.
 
         Params
         ------
-        :text: str
-        The body of text to flow across the screen
+        :text: Iterable[str]
+        The body of text to flow across the screen, either a string or an
+        iterator of strings that is read from as the text scrolls
+
+        :first_row: int = 0
+        The first line (zero based index) of the region the text flows through
+
+        :row_count: Optional[int] = None
+        How many lines the region spans, defaults to every line from
+        first_row to the bottom of the display
 
         Return
         ------
         None
         """
-        current_display = self._get_blank_display_array()
-        self.clear()
-        for letter in text:
-            current_display.append(letter)
-            current_display.pop(0)
-            self.clear()
-            self.write_string("".join(current_display))
-            sleep(self.letter_delay)
-        for blank_space in self._get_blank_display_array():
-            current_display.append(blank_space)
-            current_display.pop(0)
-            self.clear()
-            self.write_string("".join(current_display))
-            sleep(self.letter_delay)
-        self.clear()
+        play(self._flow_text_steps(text, first_row, row_count))
+
+    async def flow_text_async(
+        self,
+        text: Iterable[str],
+        first_row: int = 0,
+        row_count: Optional[int] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        The same as flow_text, but waits between letters without blocking the
+        event loop so other animations can run alongside it. See flow_text
+        for the params.
+        """
+        await play_async(self._flow_text_steps(text, first_row, row_count))
 
     def write_line(self, text: str, line_no: int) -> None:
         """
         Description
         -----------
         Writes text to a particular line, overwriting what was previously on
-        that line
+        that line. Only the characters that differ from what is already on
+        the line get sent to the display.
 
         Params
         ------
@@ -170,7 +530,7 @@ class LCDDisplay(i2c.CharLCD):
         :line_no: int
         The line number (zero based index) to write the text to
         """
-        if 0 > line_no >= self.lcd.rows:
+        if not 0 <= line_no < self.lcd.rows:
             raise IndexError(
                 f"line_no {line_no} out of range for LCDDisplay.write_line()"
             )
@@ -180,8 +540,52 @@ class LCDDisplay(i2c.CharLCD):
                 f"text size {text_size} provided is greater than max line "
                 + "size for display"
             )
-        self.cursor_pos = (line_no, 0)
-        self.write_string(text + (" " * (self.lcd.cols - text_size)))
+        self._draw_lines([text], line_no)
+
+    def _refresh_line_steps(
+        self,
+        line_no: int,
+        text: Callable[[], str],
+        interval: float,
+        count: Optional[int],
+    ) -> Animation:
+        refreshes = 0
+        while count is None or refreshes < count:
+            self.write_line(text(), line_no)
+            refreshes += 1
+            yield interval
+
+    async def refresh_line_async(
+        self,
+        line_no: int,
+        text: Callable[[], str],
+        interval: float = 1.0,
+        count: Optional[int] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Keep a line up to date by rewriting it on a fixed interval without
+        blocking the event loop, for example a clock on the top line while
+        another animation plays below it
+
+        Params
+        ------
+        :line_no: int
+        The line number (zero based index) to keep refreshed
+
+        :text: Callable[[], str]
+        Called on every refresh to get the text for the line
+
+        :interval: float = 1.0
+        Seconds between refreshes
+
+        :count: Optional[int] = None
+        How many times to refresh the line, forever by default
+        """
+        await play_async(
+            self._refresh_line_steps(line_no, text, interval, count)
+        )
 
     def show_time(self, dt: datetime) -> None:
         """
@@ -214,3 +618,168 @@ class LCDDisplay(i2c.CharLCD):
         The unique name of the timezone to display current time for
         """
         self.show_time(get_current_datetime_at_tz(tzname))
+
+    def _clock_steps(self, tzname: str, first_row: int) -> Animation:
+        self._region(first_row, 3, "run_clock")
+        face = ClockFace(get_timezone(tzname))
+        while True:
+            timestamp = time()
+            dt = datetime.fromtimestamp(timestamp, face.tz)
+            for line_no, text in face.changes(dt).items():
+                self.write_line(text, first_row + line_no)
+            yield face.until_next_tick(timestamp)
+
+    def run_clock(
+        self,
+        tzname: str = DEFAULT_TIMEZONE,
+        first_row: int = 0,
+    ) -> None:
+        """
+        Description
+        -----------
+        Keep showing the current time, ticking just after every second
+        boundary. The date lines are only redrawn when the day rolls over and
+        only the digits of the time that changed get sent to the display.
+
+        Params
+        ------
+        :tzname: str = DEFAULT_TIMEZONE (see dates module)
+        The unique name of the timezone to display current time for
+
+        :first_row: int = 0
+        The line (zero based index) the clock's three lines start on
+        """
+        try:
+            play(self._clock_steps(tzname, first_row))
+        except KeyboardInterrupt:
+            self.clear()
+
+    async def run_clock_async(
+        self,
+        tzname: str = DEFAULT_TIMEZONE,
+        first_row: int = 0,
+    ) -> None:
+        """
+        Description
+        -----------
+        The same as run_clock, but ticks without blocking the event loop so
+        other animations can run alongside it. See run_clock for the params.
+        """
+        await play_async(self._clock_steps(tzname, first_row))
+
+    def _glyph_lines(self, lines: Sequence[Sequence[Optional[str]]]) -> List[str]:
+        """
+        Description
+        -----------
+        Turn lines of glyph names into text, loading every glyph they use
+        into CGRAM (through the glyph cache) first
+
+        Params
+        ------
+        :lines: Sequence[Sequence[Optional[str]]]
+        The glyph names (None for blank) across each line
+
+        Return
+        ------
+        List[str]
+        The lines as text to draw
+        """
+        names = sorted({name for line in lines for name in line if name})
+        chars = dict(zip(names, self.glyphs.load([GLYPHS[n] for n in names])))
+        return [
+            "".join(chars[name] if name else " " for name in line)
+            for line in lines
+        ]
+
+    def show_big_time(self, dt: datetime, first_row: int = 0) -> None:
+        """
+        Description
+        -----------
+        Show the hours and minutes of a datetime in big two line tall digits,
+        with AM/PM and the seconds in regular text to the right of them
+
+        Params
+        ------
+        :dt: datetime
+        The datetime to display
+
+        :first_row: int = 0
+        The line (zero based index) the upper half of the digits goes on
+        """
+        self._region(first_row, 2, "show_big_time")
+        hour = f"{(dt.hour - 1) % 12 + 1:02d}"
+        minute = f"{dt.minute:02d}"
+        upper, lower = self._glyph_lines(big_text_glyphs(
+            f"{hour[0]} {hour[1]}:{minute[0]} {minute[1]}"
+        ))
+        self._draw_lines([
+            f"{upper} {'AM' if dt.hour < 12 else 'PM'}",
+            f"{lower} :{dt.second:02d}",
+        ], first_row)
+
+    def _big_clock_steps(self, tzname: str, first_row: int) -> Animation:
+        face = ClockFace(get_timezone(tzname))
+        while True:
+            timestamp = time()
+            self.show_big_time(
+                datetime.fromtimestamp(timestamp, face.tz), first_row
+            )
+            yield face.until_next_tick(timestamp)
+
+    def run_big_clock(
+        self,
+        tzname: str = DEFAULT_TIMEZONE,
+        first_row: int = 0,
+    ) -> None:
+        """
+        Description
+        -----------
+        Keep showing the current time in big digits, ticking just after every
+        second boundary. The digit glyphs stay loaded in CGRAM between ticks
+        so only the cells that changed get sent.
+
+        Params
+        ------
+        :tzname: str = DEFAULT_TIMEZONE (see dates module)
+        The unique name of the timezone to display current time for
+
+        :first_row: int = 0
+        The line (zero based index) the upper half of the digits goes on
+        """
+        try:
+            play(self._big_clock_steps(tzname, first_row))
+        except KeyboardInterrupt:
+            self.clear()
+
+    def draw_bar(
+        self,
+        line_no: int,
+        fraction: float,
+        first_col: int = 0,
+        width: Optional[int] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Draw a horizontal bar graph on a line, filled from the left to 1/5th
+        of a cell's resolution
+
+        Params
+        ------
+        :line_no: int
+        The line number (zero based index) to draw the bar on
+
+        :fraction: float
+        How full the bar is, from 0.0 to 1.0
+
+        :first_col: int = 0
+        The column (zero based index) the bar starts at
+
+        :width: Optional[int] = None
+        How many cells the bar spans, defaults to the rest of the line
+        """
+        self._region(line_no, 1, "draw_bar")
+        if width is None:
+            width = self.lcd.cols - first_col
+        (bar,) = self._glyph_lines([bar_glyphs(fraction, width)])
+        self._draw(line_no, first_col, bar)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+A shadow copy of what is currently on the LCD glass. Renders are diffed
+against it so that only the cells which actually changed get sent over the
+(slow) i2c bus instead of clearing and rewriting the whole display.
+"""
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+# Each byte sent to an HD44780 through a PCF8574 backpack in 4 bit mode is
+# two nibbles, and each nibble is one write plus a three write enable pulse.
+PCF8574_TRANSACTIONS_PER_BYTE = 8
+
+# (row, col, text) for one contiguous run of cells to send to the display
+Run = Tuple[int, int, str]
+
+
+@dataclass
+class RenderStats:
+    """
+    Description
+    -----------
+    Running totals of how many bytes were sent to the display versus how many
+    a naive clear-and-rewrite would have needed. Bytes here are HD44780 bytes
+    (data or instruction); transactions are the i2c writes needed to get
+    those bytes onto the bus.
+    """
+    bytes_sent: int = 0
+    bytes_saved: int = 0
+    transactions_per_byte: float = PCF8574_TRANSACTIONS_PER_BYTE
+
+    @property
+    def transactions_sent(self) -> int:
+        return round(self.bytes_sent * self.transactions_per_byte)
+
+    @property
+    def transactions_saved(self) -> int:
+        return round(self.bytes_saved * self.transactions_per_byte)
+
+    def record(self, sent: int, naive: int) -> None:
+        """
+        Description
+        -----------
+        Record one render
+
+        Params
+        ------
+        :sent: int
+        The bytes actually sent for the render
+
+        :naive: int
+        The bytes a full rewrite of the same cells would have sent
+        """
+        self.bytes_sent += sent
+        self.bytes_saved += max(naive - sent, 0)
+
+    def reset(self) -> None:
+        self.bytes_sent = 0
+        self.bytes_saved = 0
+
+
+class FrameBuffer:
+    """
+    Description
+    -----------
+    A rows x cols grid of the characters believed to be on the display.
+    Writing text into it returns the runs of cells that differ from what was
+    there before, so the caller only has to send those.
+    """
+    def __init__(self, cols: int, rows: int, blank: str = " ") -> None:
+        """
+        Description
+        -----------
+        Create a framebuffer that matches a freshly cleared display
+
+        Params
+        ------
+        :cols: int
+        The number of characters per line on the display
+
+        :rows: int
+        The number of lines on the display
+
+        :blank: str = " "
+        The character a cleared cell shows
+        """
+        self.cols = cols
+        self.rows = rows
+        self.blank = blank
+        self.cells: List[List[str]] = []
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Description
+        -----------
+        Mark every cell as blank, which is what the display shows right after
+        a hardware clear
+        """
+        self.cells = [[self.blank] * self.cols for _ in range(self.rows)]
+
+    def row_text(self, row: int) -> str:
+        """
+        Description
+        -----------
+        Get the text currently on one row of the display
+
+        Params
+        ------
+        :row: int
+        The row (zero based index) to read
+
+        Return
+        ------
+        str
+        The characters on that row
+        """
+        return "".join(self.cells[row])
+
+    def diff(self, row: int, text: str, col: int = 0) -> List[Run]:
+        """
+        Description
+        -----------
+        Place text on a row starting at a column, update the shadow copy and
+        return the runs that need to be sent to bring the glass up to date.
+        Runs separated by a single unchanged cell are merged since rewriting
+        that one cell costs the same as the cursor move needed to skip it.
+
+        Params
+        ------
+        :row: int
+        The row (zero based index) to write on
+
+        :text: str
+        The characters to place, anything past the end of the row is dropped
+
+        :col: int = 0
+        The column (zero based index) the text starts at
+
+        Return
+        ------
+        List[Run]
+        The (row, col, text) runs that changed
+        """
+        if not 0 <= row < self.rows:
+            raise IndexError(f"row {row} out of range for FrameBuffer")
+        line = self.cells[row]
+        text = text[:max(self.cols - col, 0)]
+        runs: List[Run] = []
+        start = None
+        last_changed = None
+        for offset, char in enumerate(text):
+            position = col + offset
+            if line[position] == char:
+                continue
+            line[position] = char
+            if start is not None and position - last_changed > 2:
+                runs.append((row, start, "".join(line[start:last_changed + 1])))
+                start = None
+            if start is None:
+                start = position
+            last_changed = position
+        if start is not None:
+            runs.append((row, start, "".join(line[start:last_changed + 1])))
+        return runs
+
+    def diff_frame(self, lines: Sequence[str], first_row: int = 0) -> List[Run]:
+        """
+        Description
+        -----------
+        Diff a block of whole lines, padding each to the width of the display
+
+        Params
+        ------
+        :lines: Sequence[str]
+        The lines of text, one per row
+
+        :first_row: int = 0
+        The row the first line goes on
+
+        Return
+        ------
+        List[Run]
+        The (row, col, text) runs that changed across all of the lines
+        """
+        runs: List[Run] = []
+        for offset, line in enumerate(lines):
+            runs.extend(
+                self.diff(first_row + offset, line.ljust(self.cols)[:self.cols])
+            )
+        return runs
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+Custom character (CGRAM) management for the LCD display. The HD44780 only
+has room for 8 custom characters and uploading one costs a CGRAM address
+instruction plus 8 data bytes, so glyphs are kept in an LRU cache that
+remembers which slot holds which bitmap. A glyph that is already in a slot is
+reused for free, and slots are only overwritten when a glyph that is not
+loaded is needed and every slot is taken.
+
+Also here are the glyph sets for rendering big (2 line tall) digits and
+smooth horizontal bar graphs out of custom characters.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# 8 rows of 5 pixels, one int per row with the leftmost pixel as bit 4
+Bitmap = Tuple[int, ...]
+
+CGRAM_SLOTS = 8
+
+_FULL_ROW = 0b11111
+_DOT_ROW = 0b01110
+
+GLYPHS: Dict[str, Bitmap] = {
+    # Pieces of the big digits, each a third of a big digit wide
+    "full": (_FULL_ROW,) * 8,
+    "upper": (_FULL_ROW,) * 3 + (0,) * 5,
+    "lower": (0,) * 5 + (_FULL_ROW,) * 3,
+    "upper_lower": (_FULL_ROW,) * 3 + (0,) * 2 + (_FULL_ROW,) * 3,
+    "dot_lower": (0,) * 5 + (_DOT_ROW,) * 2 + (0,),
+    "dot_upper": (0,) + (_DOT_ROW,) * 2 + (0,) * 5,
+}
+# Bar graph cells filled 1 to 5 pixels from the left
+for _filled in range(1, 6):
+    GLYPHS[f"bar_{_filled}"] = (((_FULL_ROW << (5 - _filled)) & _FULL_ROW),) * 8
+
+# Each big character as the glyph names (None for blank) of its upper and
+# lower line
+_F, _U, _L, _B = "full", "upper", "lower", "upper_lower"
+BIG_CHARACTERS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "0": ((_F, _U, _F), (_F, _L, _F)),
+    "1": ((_U, _F, None), (_L, _F, _L)),
+    "2": ((_B, _B, _F), (_F, _L, _L)),
+    "3": ((_B, _B, _F), (_L, _L, _F)),
+    "4": ((_F, _L, _F), (None, None, _F)),
+    "5": ((_F, _B, _B), (_L, _L, _F)),
+    "6": ((_F, _B, _B), (_F, _L, _F)),
+    "7": ((_U, _U, _F), (None, None, _F)),
+    "8": ((_F, _B, _F), (_F, _L, _F)),
+    "9": ((_F, _B, _F), (_L, _L, _F)),
+    ":": (("dot_lower",), ("dot_upper",)),
+    " ": ((None,), (None,)),
+}
+
+
+class GlyphCache:
+    """
+    Description
+    -----------
+    Tracks which bitmap is loaded into which CGRAM slot, evicting the least
+    recently used glyph when a new one needs a slot. Note that overwriting a
+    slot changes every cell on the display that is showing that slot, so
+    anything that draws with glyphs should redraw its cells each frame.
+    """
+    def __init__(
+        self,
+        upload: Callable[[int, Bitmap], None],
+        slots: int = CGRAM_SLOTS,
+    ) -> None:
+        """
+        Description
+        -----------
+        Create a cache with every slot empty
+
+        Params
+        ------
+        :upload: Callable[[int, Bitmap], None]
+        Uploads a bitmap to a slot, such as LCDDisplay.create_char
+
+        :slots: int = CGRAM_SLOTS
+        How many CGRAM slots the display has
+        """
+        self.upload = upload
+        self.slots = slots
+        # bitmap -> slot, least recently used first
+        self._loaded: "OrderedDict[Bitmap, int]" = OrderedDict()
+        self.hits = 0
+        self.uploads = 0
+        self.evictions = 0
+
+    def load(self, bitmaps: Sequence[Bitmap]) -> List[str]:
+        """
+        Description
+        -----------
+        Make sure every one of the bitmaps is loaded at the same time,
+        uploading only the ones that are not already in a slot
+
+        Params
+        ------
+        :bitmaps: Sequence[Bitmap]
+        The glyphs needed, at most one per slot
+
+        Return
+        ------
+        List[str]
+        The character to write to the display for each bitmap
+        """
+        needed = set(bitmaps)
+        if len(needed) > self.slots:
+            raise ValueError(
+                f"Cannot load {len(needed)} glyphs at once into "
+                + f"{self.slots} CGRAM slots"
+            )
+        chars = []
+        for bitmap in bitmaps:
+            if bitmap in self._loaded:
+                self.hits += 1
+                self._loaded.move_to_end(bitmap)
+            else:
+                self._loaded[bitmap] = self._free_slot(needed)
+                self.upload(self._loaded[bitmap], bitmap)
+                self.uploads += 1
+            chars.append(chr(self._loaded[bitmap]))
+        return chars
+
+    def _free_slot(self, needed: set) -> int:
+        if len(self._loaded) < self.slots:
+            taken = set(self._loaded.values())
+            return next(slot for slot in range(self.slots) if slot not in taken)
+        # Evict the least recently used glyph that this load does not need
+        for bitmap in self._loaded:
+            if bitmap not in needed:
+                self.evictions += 1
+                return self._loaded.pop(bitmap)
+        raise ValueError("Every CGRAM slot holds a glyph that is needed")
+
+
+def big_text_glyphs(text: str) -> Tuple[List[str], List[str]]:
+    """
+    Description
+    -----------
+    Lay text out in big characters, see BIG_CHARACTERS for what is supported
+
+    Params
+    ------
+    :text: str
+    The text to lay out
+
+    Return
+    ------
+    Tuple[List[str], List[str]]
+    The glyph names (None for blank) across the upper and lower line
+    """
+    upper, lower = [], []
+    for char in text:
+        if char not in BIG_CHARACTERS:
+            raise ValueError(f"Cannot draw {char!r} as a big character")
+        char_upper, char_lower = BIG_CHARACTERS[char]
+        upper.extend(char_upper)
+        lower.extend(char_lower)
+    return upper, lower
+
+
+def bar_glyphs(fraction: float, width: int) -> List[str]:
+    """
+    Description
+    -----------
+    Lay a horizontal bar out at a resolution of 5 pixels per cell
+
+    Params
+    ------
+    :fraction: float
+    How full the bar is, from 0.0 to 1.0
+
+    :width: int
+    How many cells the bar spans
+
+    Return
+    ------
+    List[str]
+    The glyph names (None for blank) across the bar
+    """
+    pixels = round(min(max(fraction, 0.0), 1.0) * width * 5)
+    full, partial = divmod(pixels, 5)
+    cells = ["bar_5"] * full
+    if partial:
+        cells.append(f"bar_{partial}")
+    return cells + [None] * (width - len(cells))
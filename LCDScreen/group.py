@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+Drives several LCD displays from one process. Panels can sit on different
+PCF8574 addresses on the same i2c bus, or on different buses altogether.
+Writes to panels on different buses go out in parallel, while writes to
+panels sharing a bus are run one after the other on that bus's own worker
+thread so they never overlap. Throughput therefore grows with the number of
+buses rather than the number of panels.
+
+The panels can also be treated as one wide canvas laid out left to right in
+the order given, so that content (like a marquee) can span all of them.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from animation import Pacer
+from display import LCDDisplay
+from marquee import Marquee, split_rows
+
+
+class DisplayGroup:
+    """
+    Description
+    -----------
+    A group of displays rendered to as one
+    """
+    def __init__(self, displays: Sequence[LCDDisplay]) -> None:
+        """
+        Description
+        -----------
+        Group initialized displays together, starting a worker thread for
+        each i2c bus they are on
+
+        Params
+        ------
+        :displays: Sequence[LCDDisplay]
+        The displays, in left to right order for the shared canvas
+        """
+        if not displays:
+            raise ValueError("Cannot create a DisplayGroup with no displays.")
+        self.displays = list(displays)
+        self._buses: Dict[int, ThreadPoolExecutor] = {}
+        for display in self.displays:
+            if display.port not in self._buses:
+                self._buses[display.port] = ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix=f"i2c-{display.port}",
+                )
+        self.cols = sum(display.lcd.cols for display in self.displays)
+        self.rows = min(display.lcd.rows for display in self.displays)
+
+    def run(self, draw: Callable[[LCDDisplay], None]) -> None:
+        """
+        Description
+        -----------
+        Call draw on every display at once, each from its bus's worker
+        thread, and wait for all of them to finish
+
+        Params
+        ------
+        :draw: Callable[[LCDDisplay], None]
+        Draws on one display
+        """
+        self.run_each({display: draw for display in self.displays})
+
+    def run_each(self, draws: Dict[LCDDisplay, Callable[[LCDDisplay], None]]) -> None:
+        """
+        Description
+        -----------
+        Like run, but with a different draw for each display
+
+        Params
+        ------
+        :draws: Dict[LCDDisplay, Callable[[LCDDisplay], None]]
+        What to draw on each display, displays left out are not touched
+        """
+        futures: List[Future] = [
+            self._buses[display.port].submit(draw, display)
+            for display, draw in draws.items()
+        ]
+        # Wait on all of them before raising so no bus is left mid write
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def write_line(self, text: str, line_no: int) -> None:
+        """
+        Description
+        -----------
+        Write the same text to a line of every display
+
+        Params
+        ------
+        :text: str
+        The text to write onto the line
+
+        :line_no: int
+        The line number (zero based index) to write the text to
+        """
+        self.run(lambda display: display.write_line(text, line_no))
+
+    def render(self, lines: Sequence[str], first_row: int = 0) -> None:
+        """
+        Description
+        -----------
+        Draw lines across the shared canvas, each panel getting its slice of
+        every line. Only the cells that changed on each panel get sent.
+
+        Params
+        ------
+        :lines: Sequence[str]
+        The lines of text, one per row, up to the width of every panel put
+        together
+
+        :first_row: int = 0
+        The line the first of the lines goes on
+        """
+        draws = {}
+        start = 0
+        for display in self.displays:
+            end = start + display.lcd.cols
+            panel_lines = [line.ljust(self.cols)[start:end] for line in lines]
+            draws[display] = (
+                lambda display, panel_lines=panel_lines:
+                display._draw_lines(panel_lines, first_row)
+            )
+            start = end
+        self.run_each(draws)
+
+    def flow_text(
+        self,
+        text: Iterable[str],
+        first_row: int = 0,
+        row_count: Optional[int] = None,
+        letter_delay: Optional[float] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Flow text through the shared canvas, so it scrolls across every panel
+        in turn, see LCDDisplay.flow_text
+
+        Params
+        ------
+        :text: Iterable[str]
+        The body of text to flow across the panels
+
+        :first_row: int = 0
+        The first line (zero based index) of the region the text flows through
+
+        :row_count: Optional[int] = None
+        How many lines the region spans, defaults to every line from
+        first_row to the bottom of the shortest panel
+
+        :letter_delay: Optional[float] = None
+        The delay between each letter, defaults to the first display's
+        """
+        if row_count is None:
+            row_count = self.rows - first_row
+        if not 0 <= first_row < first_row + row_count <= self.rows:
+            raise IndexError(
+                f"rows {first_row} to {first_row + row_count - 1} out of "
+                + "range for DisplayGroup.flow_text()"
+            )
+        if letter_delay is None:
+            letter_delay = self.displays[0].letter_delay
+        marquee = Marquee(self.cols * row_count)
+        pacer = Pacer()
+        self.render(split_rows(marquee.text, self.cols), first_row)
+        for frame in marquee.frames(text):
+            self.render(split_rows(frame, self.cols), first_row)
+            pacer.sleep(letter_delay)
+
+    def close(self) -> None:
+        """
+        Description
+        -----------
+        Stop the bus worker threads
+        """
+        for executor in self._buses.values():
+            executor.shutdown()
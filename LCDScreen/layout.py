@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+Lays a stream of words out into pages of lines for the LCD display. Pages are
+worked out lazily as words arrive and are cached once laid out, so words can
+come from an endless source like a file or stdin, and repeating the same words
+replays the cached pages instead of working the line breaks out again.
+"""
+from collections import deque
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+# (row, col, word) for one word placed on a page, with the row relative to
+# the top of the region the page is shown in
+Placement = Tuple[int, int, str]
+Page = Tuple[Placement, ...]
+
+
+class WordLayout:
+    """
+    Description
+    -----------
+    Splits words into pages that each fit the region of the display they
+    will be shown in. Words are separated by a single space and wrap onto the
+    next line when they do not fit on the current one. Words longer than a
+    whole line are broken across as many lines as they need.
+    """
+    def __init__(
+        self,
+        words: Iterable[str],
+        cols: int,
+        rows: int,
+        cache: bool = True,
+    ) -> None:
+        """
+        Description
+        -----------
+        Create the layout, nothing is read from words until pages are asked for
+
+        Params
+        ------
+        :words: Iterable[str]
+        The words to lay out. Each item is split on whitespace so whole lines
+        (such as lines read from a file) work as well as single words.
+
+        :cols: int
+        The number of characters per line
+
+        :rows: int
+        The number of lines per page
+
+        :cache: bool = True
+        Whether to keep the pages once laid out so they can be replayed. Turn
+        this off for endless sources that will only be shown once so memory
+        stays bounded.
+        """
+        if cols < 1 or rows < 1:
+            raise ValueError("Cannot lay words out on a page smaller than 1x1.")
+        self.cols = cols
+        self.rows = rows
+        self.cache = cache
+        self._source = iter(words)
+        self._pending: Deque[str] = deque()
+        self._pages: List[Page] = []
+        self._exhausted = False
+
+    def _next_word(self) -> Optional[str]:
+        while not self._pending:
+            item = next(self._source, None)
+            if item is None:
+                self._exhausted = True
+                return None
+            for word in item.split():
+                # Break words that are longer than a line into line sized
+                # pieces, each of which gets a line of its own
+                self._pending.extend(
+                    word[start:start + self.cols]
+                    for start in range(0, len(word), self.cols)
+                )
+        return self._pending.popleft()
+
+    def _layout_page(self) -> Optional[Page]:
+        placements: List[Placement] = []
+        row, col = 0, 0
+        while True:
+            word = self._next_word()
+            if word is None:
+                break
+            if col and col + len(word) > self.cols:
+                row, col = row + 1, 0
+            if row == self.rows:
+                self._pending.appendleft(word)
+                break
+            placements.append((row, col, word))
+            col += len(word) + 1
+            if col >= self.cols:
+                row, col = row + 1, 0
+        return tuple(placements) if placements else None
+
+    def pages(self) -> Iterator[Page]:
+        """
+        Description
+        -----------
+        Iterate over the pages, replaying any that were already laid out and
+        then laying out more as needed
+
+        Return
+        ------
+        Iterator[Page]
+        Each page as the words placed on it, in the order they are read
+        """
+        index = 0
+        while True:
+            if index < len(self._pages):
+                yield self._pages[index]
+                index += 1
+                continue
+            if self._exhausted:
+                return
+            page = self._layout_page()
+            if page is None:
+                return
+            if self.cache:
+                self._pages.append(page)
+                index += 1
+            yield page
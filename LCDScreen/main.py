@@ -33,15 +33,17 @@ For now it will be a module with the capability to be run via command line.
 You can call this ./main.py file directly and pass in the help flags to see
 this help text and any additional context on running the program.
 """
-from typing import List
+import sys
+from typing import Iterable
 
 from display import LCDDisplay
-from splittext import text_to_words
+from splittext import iter_words, text_to_words
 
 
 def show_text(
-    lines: List[str],
+    lines: Iterable[str],
     display: LCDDisplay = None,
+    repeat: int = 0,
 ) -> None:
     """
     Description
@@ -49,20 +51,25 @@ def show_text(
     Show a series of lines of text on the display. The lines will flow from
     the first to the last line in the list for as many lines as exist in the
     array of lines of text to show. It will repeat as many times as you like
-    (0 by default)
+    (0 by default). The lines can be an iterator that is still being read
+    (such as an open file or stdin) and they will be shown as they arrive.
 
     Params
     ------
-    :lines: List[str]
-    The array of lines of text to show
+    :lines: Iterable[str]
+    The lines (or words) of text to show
 
     :display: LCDDisplay = None
     The initialized LCD Character display
+
+    :repeat: int = 0
+    How many times to repeat the text after showing it once, -1 to repeat
+    forever
     """
     if not display:
         display = LCDDisplay()
     
-    display.write_words(lines)
+    display.write_words(lines, repeat=repeat)
 
 
 if __name__ == "__main__":
@@ -74,12 +81,34 @@ if __name__ == "__main__":
         formatter_class=RawTextHelpFormatter,
     )
 
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "--message",
         type=str,
         help="The message to display on the LCD screen",
     )
+    source.add_argument(
+        "--file",
+        type=argparse.FileType("r"),
+        help="A file to stream onto the LCD screen as it is read",
+    )
+    source.add_argument(
+        "--stdin",
+        action="store_true",
+        help="Stream stdin onto the LCD screen as it is read",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=0,
+        help="How many times to repeat the text, -1 to repeat forever",
+    )
 
     args = parser.parse_args()
 
-    show_text(lines=text_to_words(args.message))
+    if args.message is not None:
+        words = text_to_words(args.message)
+    else:
+        words = iter_words(args.file or sys.stdin)
+
+    show_text(lines=words, repeat=args.repeat)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+A marquee that scrolls text through a region of the display one character
+at a time. The visible characters live in a ring buffer that is stored twice
+back to back, so every frame is a contiguous slice of it and scrolling by one
+character is two byte writes no matter how big the region or how long the
+text is.
+"""
+from typing import Iterable, Iterator, List
+
+# Characters the LCD would treat as cursor movement rather than text
+_WHITESPACE = str.maketrans("\t\n\r\f\v", "     ")
+
+
+class Marquee:
+    """
+    Description
+    -----------
+    A fixed width window that text is pushed into from the right and falls
+    off of on the left.
+    """
+    def __init__(self, width: int, fill: str = " ") -> None:
+        """
+        Description
+        -----------
+        Create a marquee showing nothing but the fill character
+
+        Params
+        ------
+        :width: int
+        How many characters are visible at once, for a region spanning
+        several lines of the display this is cols * rows
+
+        :fill: str = " "
+        The character shown where there is no text
+        """
+        if width < 1:
+            raise ValueError("Cannot create a Marquee less than 1 wide.")
+        self.width = width
+        self.fill = fill
+        self._buffer = bytearray(self._encode(fill) * (2 * width))
+        self._view = memoryview(self._buffer)
+        self._head = 0
+
+    @staticmethod
+    def _encode(text: str) -> bytes:
+        return text.translate(_WHITESPACE).encode("latin-1", errors="replace")
+
+    def push(self, byte: int) -> None:
+        """
+        Description
+        -----------
+        Scroll the marquee by one character
+
+        Params
+        ------
+        :byte: int
+        The character (as a latin-1 byte) entering on the right
+        """
+        self._buffer[self._head] = byte
+        self._buffer[self._head + self.width] = byte
+        self._head = (self._head + 1) % self.width
+
+    @property
+    def window(self) -> memoryview:
+        """The visible characters, oldest first, without copying them"""
+        return self._view[self._head:self._head + self.width]
+
+    @property
+    def text(self) -> str:
+        """The visible characters as a string"""
+        return self.window.tobytes().decode("latin-1")
+
+    def frames(self, chunks: Iterable[str], flush: bool = True) -> Iterator[str]:
+        """
+        Description
+        -----------
+        Lazily scroll text through the marquee, yielding the visible text
+        after every character. Since it pulls from the input as it goes, the
+        input can be a plain string or any (possibly endless) iterator of
+        strings such as a file or a socket.
+
+        Params
+        ------
+        :chunks: Iterable[str]
+        The text to scroll, in chunks of any size
+
+        :flush: bool = True
+        Whether to keep scrolling blanks once the text runs out until the
+        marquee is empty again
+
+        Return
+        ------
+        Iterator[str]
+        One frame of visible text per character scrolled
+        """
+        for chunk in chunks:
+            for byte in self._encode(chunk):
+                self.push(byte)
+                yield self.text
+        if flush:
+            yield from self.frames(self.fill * self.width, flush=False)
+
+
+def split_rows(frame: str, cols: int) -> List[str]:
+    """
+    Description
+    -----------
+    Split a frame that spans several lines of the display into its lines
+
+    Params
+    ------
+    :frame: str
+    The visible text of a marquee
+
+    :cols: int
+    The number of characters per line on the display
+
+    Return
+    ------
+    List[str]
+    The lines of the frame from top to bottom
+    """
+    return [frame[start:start + cols] for start in range(0, len(frame), cols)]
@@ -5,7 +5,13 @@ Description
 This module contains helper code for splitting text into individual words
 """
 import re
-from typing import List
+from typing import Iterable, Iterator, List
+
+WORD_PATTERN = re.compile(r"\S+")
+
+# Past this length a run of text with no whitespace in it is handed on as a
+# word of its own rather than held onto waiting for the word to end
+MAX_WORD_LENGTH = 1024
 
 
 def text_to_words(text: str) -> List[str]:
@@ -25,4 +31,46 @@ def text_to_words(text: str) -> List[str]:
     List[str]
     The list of words found
     """
-    return re.split(r"\s+", text)
+    return WORD_PATTERN.findall(text)
+
+
+def iter_words(
+    chunks: Iterable[str],
+    max_word_length: int = MAX_WORD_LENGTH,
+) -> Iterator[str]:
+    """
+    Description
+    -----------
+    Lazily split a stream of text into words. The text can arrive in chunks
+    of any size (such as lines from a file or stdin) and words that straddle
+    two chunks are put back together. Only the word currently being read is
+    held in memory.
+
+    Params
+    ------
+    :chunks: Iterable[str]
+    The text to split
+
+    :max_word_length: int = MAX_WORD_LENGTH
+    The longest a word can grow to before it is yielded as is
+
+    Return
+    ------
+    Iterator[str]
+    The words found, in order
+    """
+    partial = ""
+    for chunk in chunks:
+        if partial:
+            chunk = partial + chunk
+            partial = ""
+        for match in WORD_PATTERN.finditer(chunk):
+            word_length = match.end() - match.start()
+            if match.end() == len(chunk) and word_length < max_word_length:
+                # The word runs up to the end of the chunk, so it may carry
+                # on into the next one
+                partial = match.group()
+            else:
+                yield match.group()
+    if partial:
+        yield partial
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Description
+-----------
+Batched i2c transport for an HD44780 display behind a PCF8574 backpack.
+
+RPLCD sends every nibble to the backpack as four separate single byte
+writes, with a sleep after each enable pulse. Each of those writes is a whole
+i2c transaction (start, address, byte, stop). The PCF8574 simply latches every
+byte it receives onto its pins though, so the nibbles and enable pulses for a
+whole string can be encoded up front and streamed to it in a handful of block
+writes instead. Block writes are slow enough on the bus that the display has
+long finished with each byte before the next enable pulse arrives.
+"""
+from typing import List, Tuple
+
+# PCF8574 pin bitmasks
+PCF8574_RS = 0x01
+PCF8574_E = 0x04
+PCF8574_BACKLIGHT = 0x08
+
+# Instructions that take the HD44780 ~1.5ms to run, anything sent after one
+# of these has to wait for it rather than being batched straight behind it
+LCD_CLEARDISPLAY = 0x01
+LCD_RETURNHOME = 0x02
+SLOW_INSTRUCTIONS = (LCD_CLEARDISPLAY, LCD_RETURNHOME)
+
+# Port bytes written per nibble: set the pins, raise enable, drop enable
+WRITES_PER_NIBBLE = 3
+
+# The most data bytes an SMBus block write can carry (the command byte that
+# leads each block write is a port byte to the PCF8574 as well)
+SMBUS_BLOCK_MAX = 32
+
+
+class PCF8574Transport:
+    """
+    Description
+    -----------
+    Encodes bytes for the display into the nibble and enable pulse sequence
+    the PCF8574 expects, holding them until flushed and then sending them in
+    as few SMBus block writes as possible.
+    """
+    def __init__(
+        self,
+        bus: object,
+        address: int,
+        block_size: int = SMBUS_BLOCK_MAX,
+    ) -> None:
+        """
+        Description
+        -----------
+        Create a transport over an open SMBus
+
+        Params
+        ------
+        :bus: object
+        The SMBus (smbus, smbus2 or FakeSMBus) the backpack is on
+
+        :address: int
+        The i2c address of the backpack
+
+        :block_size: int = 32
+        The most data bytes to put in one block write
+        """
+        self.bus = bus
+        self.address = address
+        self.block_size = block_size
+        self._pending = bytearray()
+
+    @property
+    def pending(self) -> int:
+        """How many port bytes are waiting to be flushed"""
+        return len(self._pending)
+
+    def _write4bits(self, value: int) -> None:
+        self._pending += bytes((value, value | PCF8574_E, value))
+
+    def send(self, value: int, flags: int) -> None:
+        """
+        Description
+        -----------
+        Queue one byte for the display
+
+        Params
+        ------
+        :value: int
+        The data or instruction byte
+
+        :flags: int
+        The register select and backlight bits to send along with it
+        """
+        self._write4bits(flags | (value & 0xF0))
+        self._write4bits(flags | ((value << 4) & 0xF0))
+
+    def flush(self) -> None:
+        """
+        Description
+        -----------
+        Send everything queued so far to the display
+        """
+        pending = self._pending
+        step = self.block_size + 1
+        for start in range(0, len(pending), step):
+            block = pending[start:start + step]
+            if len(block) == 1:
+                self.bus.write_byte(self.address, block[0])
+            else:
+                self.bus.write_i2c_block_data(
+                    self.address, block[0], list(block[1:])
+                )
+        pending.clear()
+
+    def transactions_per_byte(self) -> float:
+        """
+        Description
+        -----------
+        The average i2c transactions it takes to send one display byte when
+        the transport is kept busy
+
+        Return
+        ------
+        float
+        Transactions per display byte
+        """
+        return 2 * WRITES_PER_NIBBLE / (self.block_size + 1)
+
+
+class FakeSMBus:
+    """
+    Description
+    -----------
+    Stands in for smbus.SMBus, recording every transaction instead of
+    talking to hardware. Handy for measuring how much bus traffic the display
+    code generates on a machine with no display attached.
+    """
+    def __init__(self, port: int = 1) -> None:
+        """
+        Description
+        -----------
+        Create a fake bus with nothing recorded on it
+
+        Params
+        ------
+        :port: int = 1
+        The i2c port being faked, only kept for reference
+        """
+        self.port = port
+        # (address, port bytes) for every transaction
+        self.transactions: List[Tuple[int, bytes]] = []
+        self.bytes_written = 0
+
+    def _record(self, address: int, data: bytes) -> None:
+        self.transactions.append((address, data))
+        self.bytes_written += len(data)
+
+    def write_byte(self, address: int, value: int) -> None:
+        self._record(address, bytes((value,)))
+
+    def write_byte_data(self, address: int, register: int, value: int) -> None:
+        self._record(address, bytes((register, value)))
+
+    def write_i2c_block_data(
+        self,
+        address: int,
+        register: int,
+        data: List[int],
+    ) -> None:
+        if len(data) > SMBUS_BLOCK_MAX:
+            raise ValueError(
+                f"Cannot block write {len(data)} bytes, the SMBus limit is "
+                + f"{SMBUS_BLOCK_MAX}"
+            )
+        self._record(address, bytes((register, *data)))
+
+    def read_byte(self, address: int) -> int:
+        return 0
+
+    def reset(self) -> None:
+        """
+        Description
+        -----------
+        Forget every transaction recorded so far
+        """
+        self.transactions.clear()
+        self.bytes_written = 0
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+An output that stays on for a while after it was last triggered.
+"""
+import threading
+from typing import Optional
+
+from scheduler import DeadlineScheduler
+
+
+class TimedActivator:
+    def __init__(
+        self,
+        device: object,
+        activation_duration: float,
+        scheduler: DeadlineScheduler,
+    ) -> None:
+        """
+        Description
+        -----------
+        Wraps an output device (such as a gpiozero LED) so that triggering it
+        turns it on and (re)starts a countdown, and it turns off once the
+        countdown runs out without being triggered again.
+
+        Params
+        ------
+        :device: object
+        The output to switch, anything with `on()` and `off()`.
+
+        :activation_duration: float
+        How many seconds the device stays on for after the last trigger.
+
+        :scheduler: DeadlineScheduler
+        The scheduler that runs the countdowns.
+        """
+        if activation_duration <= 0:
+            raise ValueError("Cannot specify an activation duration of 0 seconds or less.")
+        self.device = device
+        self.activation_duration = activation_duration
+        self.scheduler = scheduler
+        # Held while switching the device so that a trigger and the deadline
+        # firing can never interleave and leave the device off.
+        self._lock = threading.Lock()
+        # How many times it has been switched on, and for how long in total
+        self.activations = 0
+        self._on_total = 0.0
+        self._on_since: Optional[float] = None
+
+    @property
+    def remaining(self) -> float:
+        """How many more seconds the device will stay on for"""
+        deadline = self.scheduler.deadline(self)
+        if deadline is None:
+            return 0
+        return max(deadline - self.scheduler.clock(), 0)
+
+    @property
+    def on_seconds(self) -> float:
+        """How many seconds the device has been on for in total"""
+        with self._lock:
+            if self._on_since is None:
+                return self._on_total
+            return self._on_total + self.scheduler.clock() - self._on_since
+
+    def _switched_off(self) -> None:
+        """Tally up the time it was on for. Call with the lock held."""
+        if self._on_since is not None:
+            self._on_total += self.scheduler.clock() - self._on_since
+            self._on_since = None
+
+    def trigger(self) -> float:
+        """
+        Description
+        -----------
+        Turn the device on and restart its countdown.
+
+        Return
+        ------
+        float
+        How many seconds were left on the countdown before it restarted.
+        """
+        with self._lock:
+            remaining = self.remaining
+            self.device.on()
+            if self._on_since is None:
+                self._on_since = self.scheduler.clock()
+                self.activations += 1
+            self.scheduler.arm(self, self.activation_duration, self._deactivate)
+        return remaining
+
+    def _deactivate(self) -> None:
+        with self._lock:
+            if self.scheduler.deadline(self) is not None:
+                # Triggered again while this deadline was firing
+                return
+            self.device.off()
+            self._switched_off()
+
+    def shutdown(self) -> None:
+        """
+        Description
+        -----------
+        Stop the countdown and turn the device off.
+        """
+        with self._lock:
+            self.scheduler.cancel(self)
+            self.device.off()
+            self._switched_off()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Records motion sensor edges so they can be analysed later.
+
+Edges are kept in a fixed size ring buffer made of plain arrays, so recording
+one from a gpiozero callback is a few array stores and memory never grows no
+matter how busy the sensor gets. A background thread appends new edges to a
+compact binary file every so often (10 bytes per edge) and the recorder can
+answer questions like "when was the last motion" or "how many minutes of each
+hour was somebody here" straight from memory without parsing any logs.
+
+Timestamps in memory come from the monotonic clock (which can't jump) and are
+converted to wall clock time when they are written out, since the monotonic
+clock starts over on every boot.
+"""
+import struct
+import threading
+from array import array
+from time import monotonic_ns, time_ns
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from logs import get_logger
+
+LOGGER = get_logger("EventRecorder")
+
+FALL = 0
+RISE = 1
+
+FILE_MAGIC = b"MOEV\x01"
+# wall clock ns, pin, edge
+RECORD = struct.Struct("<qBb")
+
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+
+Event = Tuple[int, int, int]
+
+
+class EventRecorder:
+    def __init__(
+        self,
+        capacity: int = 4096,
+        path: Optional[str] = None,
+        flush_interval: float = 60.0,
+        clock_ns: Callable[[], int] = monotonic_ns,
+    ) -> None:
+        """
+        Description
+        -----------
+        A ring buffer of motion edges (timestamp, pin, rise or fall) that can
+        optionally be flushed to a binary file.
+
+        Params
+        ------
+        :capacity: int = 4096
+        How many edges to keep in memory, the oldest are overwritten first.
+
+        :path: Optional[str] = None
+        The file to append edges to, nothing is written if not given.
+
+        :flush_interval: float = 60.0
+        How many seconds between flushes once `start()` has been called.
+
+        :clock_ns: Callable[[], int] = monotonic_ns
+        The clock edges are timestamped with.
+        """
+        if capacity < 1:
+            raise ValueError("Cannot record events into a buffer smaller than 1.")
+        self.capacity = capacity
+        self.path = path
+        self.flush_interval = flush_interval
+        self.clock_ns = clock_ns
+        self._timestamps = array("q", bytes(8 * capacity))
+        self._pins = array("B", bytes(capacity))
+        self._edges = array("b", bytes(capacity))
+        self._next = 0
+        self._count = 0
+        self._unflushed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, pin: int, edge: int, timestamp_ns: Optional[int] = None) -> None:
+        """
+        Description
+        -----------
+        Record one edge, cheap enough to call straight from a gpiozero callback.
+
+        Params
+        ------
+        :pin: int
+        The sensor pin the edge was on.
+
+        :edge: int
+        RISE when motion starts, FALL when it stops.
+
+        :timestamp_ns: Optional[int] = None
+        When the edge happened, now by default.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = self.clock_ns()
+        with self._lock:
+            index = self._next
+            self._timestamps[index] = timestamp_ns
+            self._pins[index] = pin
+            self._edges[index] = edge
+            self._next = (index + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            if self._unflushed == self.capacity:
+                # Overwrote an edge that never made it to the file
+                self.dropped += 1
+            else:
+                self._unflushed += 1
+
+    def _slice(self, newest: int) -> List[Event]:
+        """The newest edges in memory, oldest first. Call with the lock held."""
+        start = (self._next - newest) % self.capacity
+        return [
+            (self._timestamps[index], self._pins[index], self._edges[index])
+            for index in (
+                (start + offset) % self.capacity for offset in range(newest)
+            )
+        ]
+
+    def events(self) -> List[Event]:
+        """
+        Description
+        -----------
+        Every edge in memory.
+
+        Return
+        ------
+        List[Event]
+        (timestamp ns, pin, edge) for each edge, oldest first.
+        """
+        with self._lock:
+            return self._slice(self._count)
+
+    def last_motion(self, pin: Optional[int] = None) -> Optional[int]:
+        """
+        Description
+        -----------
+        When motion was last seen.
+
+        Params
+        ------
+        :pin: Optional[int] = None
+        Only look at this sensor pin, any pin by default.
+
+        Return
+        ------
+        Optional[int]
+        The timestamp (ns) of the newest rising edge, None if there is none
+        in memory.
+        """
+        with self._lock:
+            for offset in range(1, self._count + 1):
+                index = (self._next - offset) % self.capacity
+                if self._edges[index] == RISE and pin in (None, self._pins[index]):
+                    return self._timestamps[index]
+        return None
+
+    def occupied_minutes_per_hour(
+        self,
+        hours: int = 24,
+        now_ns: Optional[int] = None,
+        pin: Optional[int] = None,
+    ) -> List[float]:
+        """
+        Description
+        -----------
+        How many minutes of each recent hour motion was being sensed, counting
+        from each rising edge to the falling edge after it.
+
+        Params
+        ------
+        :hours: int = 24
+        How many hours back to look.
+
+        :now_ns: Optional[int] = None
+        The end of the last hour, now by default.
+
+        :pin: Optional[int] = None
+        Only look at this sensor pin, any pin sensing motion counts by default.
+
+        Return
+        ------
+        List[float]
+        The occupied minutes in each hour, oldest hour first.
+        """
+        if now_ns is None:
+            now_ns = self.clock_ns()
+        start_ns = now_ns - hours * NS_PER_HOUR
+        occupied = [0] * hours
+
+        def add(begin: int, end: int) -> None:
+            begin, end = max(begin, start_ns), min(end, now_ns)
+            while begin < end:
+                hour = (begin - start_ns) // NS_PER_HOUR
+                hour_end = min(start_ns + (hour + 1) * NS_PER_HOUR, end)
+                occupied[hour] += hour_end - begin
+                begin = hour_end
+
+        active = set()
+        since = None
+        for timestamp, event_pin, edge in self.events():
+            if pin is not None and event_pin != pin:
+                continue
+            if edge == RISE:
+                if not active:
+                    since = timestamp
+                active.add(event_pin)
+            elif event_pin in active:
+                active.discard(event_pin)
+                if not active:
+                    add(since, timestamp)
+        if active:
+            add(since, now_ns)
+        return [ns / NS_PER_MINUTE for ns in occupied]
+
+    def flush(self) -> int:
+        """
+        Description
+        -----------
+        Append every edge recorded since the last flush to the file. If the
+        write fails the edges are kept for the next flush and the error is
+        raised.
+
+        Return
+        ------
+        int
+        How many edges were written.
+        """
+        if self.path is None:
+            return 0
+        with self._lock:
+            pending = self._slice(self._unflushed)
+            self._unflushed = 0
+        if not pending:
+            return 0
+        # Anchor the monotonic timestamps to the wall clock as of now
+        offset = time_ns() - self.clock_ns()
+        try:
+            with open(self.path, "ab") as events_file:
+                if events_file.tell() == 0:
+                    events_file.write(FILE_MAGIC)
+                events_file.write(b"".join(
+                    RECORD.pack(timestamp + offset, event_pin, edge)
+                    for timestamp, event_pin, edge in pending
+                ))
+        except BaseException:
+            # Still in the ring buffer, so mark them unflushed again for the
+            # next flush, less any that were overwritten in the meantime
+            with self._lock:
+                unflushed = self._unflushed + len(pending)
+                self.dropped += max(unflushed - self.capacity, 0)
+                self._unflushed = min(unflushed, self.capacity)
+            raise
+        return len(pending)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # Kept for the next flush, which may well work (a disk that
+                # was full having room again, say)
+                LOGGER.exception(f"Could not flush motion events to {self.path}.")
+
+    def start(self) -> None:
+        """Flush to the file every `flush_interval` seconds from a background thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="EventRecorder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and flush whatever is left."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def read_events(path: str, chunk_records: int = 8192) -> Iterator[Event]:
+    """
+    Description
+    -----------
+    Stream the edges back out of a file written by `EventRecorder.flush`,
+    a chunk at a time so that files of any size can be read.
+
+    Params
+    ------
+    :path: str
+    The file to read.
+
+    :chunk_records: int = 8192
+    How many edges to read from the file at a time.
+
+    Return
+    ------
+    Iterator[Event]
+    (wall clock ns, pin, edge) for each edge, in the order they were written.
+    """
+    with open(path, "rb") as events_file:
+        if events_file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a motion events file.")
+        while True:
+            chunk = events_file.read(RECORD.size * chunk_records)
+            usable = len(chunk) - len(chunk) % RECORD.size
+            yield from RECORD.iter_unpack(chunk[:usable])
+            if len(chunk) < RECORD.size * chunk_records:
+                return
@@ -1,21 +1,216 @@
 #!/usr/bin/env python2
 """
 Storing the logger object here.
+
+By default nothing is written on the thread that logs. Records are put on a
+queue and a background thread formats and writes them, so a gpiozero
+callback never waits on the SD card or journald. Lines logged over and over
+from the same spot are rate limited, with a sample of them still let through
+and a count of how many were held back.
+
+It can all be set from the environment without touching the code:
+- RPI_LOG_LEVEL: the lowest level written, a name or number (default: DEBUG)
+- RPI_LOG_QUEUED: set to 0 to write on the logging thread instead
+- RPI_LOG_QUEUE_SIZE: records waiting to be written before new ones are
+  dropped (default: 10000)
+- RPI_LOG_RATE: lines per seconds from any one spot before the rest get
+  sampled, like 10/1, 0 for no limit (default: 10/1)
+- RPI_LOG_SAMPLE: let 1 in this many of the sampled lines through, 0 for
+  none (default: 100)
+
+A setting that can't be read falls back to its default with a warning.
+
+MotionSensor/logs.py and app/logs.py are the same file, copied so that each
+directory can be put on a Pi and run on its own. Change them together, `diff`
+between the two should always come up empty.
 """
+import atexit
+import os
 import sys
 import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from time import monotonic
+from typing import Any, Callable, List, Optional, Tuple
+
+FORMAT = "%(asctime)s||%(pathname)s||%(name)s||%(levelname)s||%(message)s"
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+_configured = threading.Lock()
+_listener = None
+_stream = None
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limit: int, interval: float, sample: int, below: int = logging.ERROR) -> None:
+        """
+        Description
+        -----------
+        Lets through `limit` records every `interval` seconds from each line
+        of code that logs, and then 1 in every `sample` after that. The next
+        record let through says how many were held back.
+
+        Params
+        ------
+        :limit: int
+        How many records from one spot go through per interval.
+
+        :interval: float
+        The length of the interval in seconds.
+
+        :sample: int
+        Let 1 in this many of the rest through, 0 for none.
+
+        :below: int = logging.ERROR
+        Records at this level and up always go through.
+        """
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.sample = sample
+        self.below = below
+        # (pathname, lineno) -> [interval started, passed, held back]
+        self._spots = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.below:
+            return True
+        # Keyed on where the line was logged from rather than the message,
+        # so f-strings with the numbers changing still count as the same
+        key = (record.pathname, record.lineno)
+        now = monotonic()
+        with self._lock:
+            spot = self._spots.get(key)
+            if spot is None or now - spot[0] >= self.interval:
+                spot = self._spots[key] = [now, 0, spot[2] if spot else 0]
+            spot[1] += 1
+            if spot[1] > self.limit:
+                over = spot[1] - self.limit
+                if not self.sample or over % self.sample:
+                    spot[2] += 1
+                    self.suppressed += 1
+                    return False
+            held_back, spot[2] = spot[2], 0
+        if held_back:
+            record.msg = f"{record.msg} [{held_back} similar suppressed]"
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Description
+    -----------
+    Puts records on a bounded queue, dropping them (and counting how many)
+    rather than waiting if the writer falls behind. Formatting is left to
+    the writer's thread.
+    """
+    def __init__(self, record_queue: queue.Queue) -> None:
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Pin the message down now in case the args change before it's written
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_level(value: str) -> int:
+    value = value.upper()
+    if value.isdigit():
+        return int(value)
+    # Gives back "Level X" rather than a number for names it doesn't know
+    number = logging.getLevelName(value)
+    if not isinstance(number, int):
+        raise ValueError(f"{value} is not a level")
+    return number
+
+
+def _parse_count(value: str) -> int:
+    count = int(value)
+    if count < 0:
+        raise ValueError(f"{count} is below 0")
+    return count
+
+
+def _parse_rate(value: str) -> Optional[Tuple[int, float]]:
+    if value == "0":
+        return None
+    limit, _, interval = value.partition("/")
+    interval = float(interval or 1)
+    if interval <= 0:
+        raise ValueError(f"{interval} is not a length of time")
+    return _parse_count(limit), interval
+
+
+def _setting(name: str, default: str, parse: Callable[[str], Any], problems: List[str]) -> Any:
+    """An RPI_LOG_* setting, or its default (noted in `problems`) if it can't be read."""
+    value = os.getenv(name) or default
+    try:
+        return parse(value)
+    except ValueError as e:
+        problems.append(f"Could not read {name}={value!r} ({e}), using {default}.")
+        return parse(default)
+
+
+def _configure() -> None:
+    global _listener, _stream
+    problems = []
+    level = _setting("RPI_LOG_LEVEL", "DEBUG", _parse_level, problems)
+    stream = _stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(FORMAT, DATE_FORMAT))
+    handler = stream
+    if os.getenv("RPI_LOG_QUEUED", "1") != "0":
+        queue_size = _setting("RPI_LOG_QUEUE_SIZE", "10000", _parse_count, problems) or 10000
+        handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        _listener = QueueListener(handler.queue, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+    rate = _setting("RPI_LOG_RATE", "10/1", _parse_rate, problems)
+    if rate is not None:
+        limit, interval = rate
+        handler.addFilter(RateLimitFilter(
+            limit=limit,
+            interval=interval,
+            sample=_setting("RPI_LOG_SAMPLE", "100", _parse_count, problems),
+        ))
+    # On the handler as well as the root so it wins over any logger that
+    # sets its own level
+    handler.setLevel(level)
+    logging.basicConfig(level=level, handlers=[handler])
+    for problem in problems:
+        logging.getLogger().warning(problem)
 
 
 def get_logger(name = "raspberry_pi"):
-    logging.basicConfig(
-        format="%(asctime)s||%(pathname)s||%(name)s||%(levelname)s||%(message)s",
-        datefmt="%Y-%m-%dT%H:%M:%S%z",
-        level=logging.DEBUG,
-        stream=sys.stdout
-    )
+    with _configured:
+        if not logging.getLogger().handlers:
+            _configure()
     return logging.getLogger(name)
 
 
+def set_log_stream(stream) -> None:
+    """Write the logs somewhere other than stdout, say when stdout carries data."""
+    get_logger()
+    if _stream is not None:
+        _stream.setStream(stream)
+        return
+    # Logging was set up by someone else (pytest, or a basicConfig call),
+    # move whichever of their handlers write to stdout
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream in (sys.stdout, sys.__stdout__):
+            handler.setStream(stream)
+
+
 if __name__ == "__main__":
     logger = get_logger(name="test_logging")
     logger.info("Info Test")
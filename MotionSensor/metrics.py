@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Counters, gauges and histograms for the long running GPIO programs, served
+over a tiny local HTTP endpoint in the Prometheus text format so they can be
+scraped or simply read with curl.
+
+Recording is cheap enough for gpiozero callbacks: a counter or gauge update
+is an add under a lock, and a histogram keeps its buckets in a fixed array
+set up front, so an observation is a binary search over the bucket bounds and
+an add, with nothing growing as values come in.
+
+```
+registry = Registry()
+events = registry.counter("motion_events_total", "Motion starts seen")
+events.inc()
+registry.serve(9100)  # curl localhost:9100/metrics
+```
+"""
+import bisect
+import math
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, spanning a fast callback through to a stalled one
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 1.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(labels.items()) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    # Spelled the way the exposition format expects, int() can't take them
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Description
+        -----------
+        One time series (or set of them for a histogram).
+
+        Params
+        ------
+        :name: str
+        The metric's name, metrics sharing a name must differ in labels.
+
+        :help: str
+        What it measures.
+
+        :labels: Optional[Dict[str, str]] = None
+        Labels that stay fixed for this series, like the pin it is for.
+        """
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name, labels, value) for every line this metric renders to"""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, function: Optional[Callable[[], float]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.value = 0.0
+        # Read a total something else already keeps instead of counting here
+        self.function = function
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        value = self.function() if self.function else self.value
+        return [(self.name, _format_labels(self.labels), value)]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, function: Optional[Callable[[], float]] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.value = 0.0
+        # Read the value when scraped instead of having it set
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        value = self.function() if self.function else self.value
+        return [(self.name, _format_labels(self.labels), value)]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = LATENCY_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket plus one for everything above the last
+        self.counts = array("Q", bytes(8 * (len(self.buckets) + 1)))
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append((
+                f"{self.name}_bucket",
+                _format_labels(self.labels, (("le", _format_value(bound)),)),
+                cumulative,
+            ))
+        samples.append((f"{self.name}_sum", _format_labels(self.labels), total))
+        samples.append((f"{self.name}_count", _format_labels(self.labels), count))
+        return samples
+
+
+class Registry:
+    def __init__(self) -> None:
+        """
+        Description
+        -----------
+        Every metric a program exposes, rendered together.
+        """
+        self.metrics: List[Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        """
+        Description
+        -----------
+        Every metric in the Prometheus text format.
+
+        Return
+        ------
+        str
+        The metrics, grouped by name.
+        """
+        with self._lock:
+            metrics = list(self.metrics)
+        by_name: Dict[str, List[Metric]] = {}
+        for metric in metrics:
+            by_name.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, group in by_name.items():
+            lines.append(f"# HELP {name} {group[0].help}")
+            lines.append(f"# TYPE {name} {group[0].kind}")
+            for metric in group:
+                for sample_name, labels, value in metric.samples():
+                    lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Description
+        -----------
+        Serve the metrics at /metrics from a background thread.
+
+        Params
+        ------
+        :port: int
+        The port to listen on, 0 picks a free one.
+
+        :host: str = "127.0.0.1"
+        The address to listen on, only this machine by default.
+
+        Return
+        ------
+        ThreadingHTTPServer
+        The server, `shutdown()` it to stop serving.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_):
+                # Scrapes every few seconds would drown out everything else
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="Metrics", daemon=True).start()
+        return server
@@ -5,18 +5,36 @@ The class that tracks motion from a PIR sensor.
 This program has been triggered on startup from `/etc/rc.local`
 """
 import logging
-from time import sleep
-from typing import Optional
+import threading
+from time import perf_counter
+from typing import Callable, Optional
 
 from gpiozero import MotionSensor
 from gpiozero import LED
 
+from activator import TimedActivator
+from events import FALL, RISE, EventRecorder
 from logs import get_logger
+from metrics import Registry
+from pulse_filter import FilterRule, PulseFilter
+from scheduler import DeadlineScheduler
 
 LOGGER = get_logger("MotionActivated")
 
 class MotionActivated:
-    def __init__(self, sensor_pin: int, activator_pin: int, activation_duration: int, debug_pin: Optional[int] = None) -> None:
+    def __init__(
+        self,
+        sensor_pin: int,
+        activator_pin: int,
+        activation_duration: float,
+        debug_pin: Optional[int] = None,
+        scheduler: Optional[DeadlineScheduler] = None,
+        recorder: Optional[EventRecorder] = None,
+        filter_rule: Optional[FilterRule] = None,
+        sensor_class: Callable[[int], MotionSensor] = MotionSensor,
+        metrics: Optional[Registry] = None,
+        on_motion: Optional[Callable[[], None]] = None,
+    ) -> None:
         """
         Description
         -----------
@@ -32,15 +50,42 @@ class MotionActivated:
         The pin that will receive on/off signals from the motion
         sensor that this class will process.
         
-        :activation_duration: int
+        :activation_duration: float
         How many seconds that the activator should stay on for before being
-        shut off.
+        shut off. Fractions of a second are fine.
 
         :debug_pin: Optional[int] = None
         The optional debug pin that ties to something to activate whenever any
         motion is detected at all. This helps to debug while tuning the
         potentiometer.
 
+        :scheduler: Optional[DeadlineScheduler] = None
+        The scheduler that turns the activator off once its time is up. One
+        is created (and run by `run()`) if not given, pass one in to share it
+        between several instances or to drive it by hand.
+
+        :recorder: Optional[EventRecorder] = None
+        Where to record every motion start and stop for later analysis. The
+        edges are recorded as the sensor gave them, before any filtering.
+
+        :filter_rule: Optional[FilterRule] = None
+        What a pulse from the sensor needs to count as motion, see
+        `pulse_filter.py`. Every pulse counts if not given.
+
+        :sensor_class: Callable[[int], MotionSensor] = MotionSensor
+        What to read the sensor pin with, `replay.py` swaps in one that
+        reacts to its pin straight away for running in simulated time.
+
+        :metrics: Optional[Registry] = None
+        Where to expose counts of motion, how long the activator has been on
+        and how long switching it takes (timed once the pulse filter, if on,
+        has let the motion through), see `metrics.py`.
+
+        :on_motion: Optional[Callable[[], None]] = None
+        Called on the gpiozero callback thread each time motion is sensed,
+        after the activator is switched on. It must not block, hand work off
+        to another thread the way `app/capture_pipeline.py`'s trigger does.
+
         Wiring
         ------
         The PIR motion sensor senses motion with infrared technology.
@@ -100,16 +145,28 @@ class MotionActivated:
         here as well!
         https://www.mpja.com/download/31227sc.pdf
         """
-        self.sensor_pin = sensor_pin
-        self.sensor = MotionSensor(sensor_pin)
-        self.sensor.when_motion = self._sense_motion
-        self.sensor.when_no_motion = self._no_motion_sensed
-        if activation_duration <= 6:
-            raise ValueError("Cannot specify an activation duration less than 6 seconds.")
         self.activation_duration = activation_duration
-        self.activated_for = 0
+        self.owns_scheduler = scheduler is None
+        self.scheduler = scheduler or DeadlineScheduler()
+        self._stopped = threading.Event()
+        self.recorder = recorder
         self.activator_pin = activator_pin
         self.activator = LED(activator_pin)
+        self.timer = TimedActivator(self.activator, activation_duration, self.scheduler)
+        self.sensor_pin = sensor_pin
+        self.sensor = sensor_class(sensor_pin)
+        if filter_rule is None:
+            self.filter = None
+        else:
+            self.filter = PulseFilter(filter_rule, self.scheduler, self.scheduler.clock)
+            self.filter.when_motion = self._sense_motion
+            self.filter.when_no_motion = self._no_motion_sensed
+        self.sensor.when_motion = self._sensor_rise
+        self.sensor.when_no_motion = self._sensor_fall
+        self.on_motion = on_motion
+        self.metrics = metrics
+        if metrics is not None:
+            self._register_metrics(metrics)
         self.debug_pin = debug_pin
         self.debug = LED(debug_pin) if debug_pin else None
         if self.debug:
@@ -118,16 +175,86 @@ class MotionActivated:
             LOGGER.setLevel(logging.INFO)
         LOGGER.info(
             f"Initialized Motion Sensor to {sensor_pin=}, {activator_pin=}, " +
-            f"{activation_duration=}, {debug_pin=}"
+            f"{activation_duration=}, {debug_pin=}, {filter_rule=}"
         )
 
+    def _register_metrics(self, metrics: Registry) -> None:
+        labels = {"sensor_pin": str(self.sensor_pin), "activator_pin": str(self.activator_pin)}
+        self.motion_events = metrics.counter(
+            "motion_events_total", "Motion starts passed on by the sensor.", labels=labels
+        )
+        self.switch_latency = metrics.histogram(
+            "motion_to_activator_seconds",
+            "Time to switch the activator on once motion is passed on, after the pulse filter if on.",
+            labels=labels,
+        )
+        metrics.counter(
+            "activator_activations_total",
+            "Times the activator switched on from off.",
+            labels=labels,
+            function=lambda: self.timer.activations,
+        )
+        metrics.counter(
+            "activator_on_seconds_total",
+            "Seconds the activator has been on for.",
+            labels=labels,
+            function=lambda: self.timer.on_seconds,
+        )
+        metrics.gauge(
+            "activator_on",
+            "1 while the activator is on.",
+            labels=labels,
+            function=lambda: float(self.activator.is_lit),
+        )
+        metrics.gauge(
+            "activator_remaining_seconds",
+            "Seconds until the activator switches off without more motion.",
+            labels=labels,
+            function=lambda: self.timer.remaining,
+        )
+        if self.filter is not None:
+            metrics.counter(
+                "motion_pulses_rejected_total",
+                "Sensor pulses the pulse filter held back.",
+                labels=labels,
+                function=lambda: self.filter.stats.rejected,
+            )
+
+    @property
+    def activated_for(self) -> float:
+        """How many more seconds the activator will stay on for"""
+        return self.timer.remaining
+
+    def _sensor_rise(self):
+        if self.recorder is not None:
+            self.recorder.record(self.sensor_pin, RISE)
+        if self.filter is None:
+            self._sense_motion()
+        else:
+            self.filter.rise()
+
+    def _sensor_fall(self):
+        if self.recorder is not None:
+            self.recorder.record(self.sensor_pin, FALL)
+        if self.filter is None:
+            self._no_motion_sensed()
+        else:
+            self.filter.fall()
+
     def _sense_motion(self):
+        # Timed from here rather than the sensor's edge, so with the pulse
+        # filter on this is the switching itself and not the filter's wait
+        started = perf_counter()
+        remaining = self.timer.trigger()
+        if self.metrics is not None:
+            self.switch_latency.observe(perf_counter() - started)
+            self.motion_events.inc()
+        if self.on_motion is not None:
+            self.on_motion()
         LOGGER.info(
-            f"Motion detected, resetting timer from {self.activated_for} " +
+            f"Motion detected, resetting timer from {remaining:.2f} " +
             f"to {self.activation_duration}."
         )
-        self.activated_for = self.activation_duration
-        self.activator.on()
         if self.debug:
             self.debug.on()
 
@@ -136,18 +263,29 @@ class MotionActivated:
             LOGGER.debug("No motion detected...")
             self.debug.off()
 
+    def stop(self):
+        """Makes `run()` return."""
+        self._stopped.set()
+
     def run(self):
         LOGGER.info("Beginning to watch the lights...")
+        if self.owns_scheduler:
+            self.scheduler.start()
+        if self.recorder is not None:
+            self.recorder.start()
         try:
-            while True:
-                sleep(1)
-                if self.activated_for <= 0:
-                    self.activator.off()
-                    continue
-                self.activated_for -= 1
+            # Everything happens on the gpiozero and scheduler threads, this
+            # just keeps the program alive without waking up until stopped.
+            self._stopped.wait()
         finally:
             LOGGER.error("Sensor shutdown detected! Shutting things off.")
-            self.activator.off()
+            if self.owns_scheduler:
+                self.scheduler.stop()
+            self.timer.shutdown()
+            if self.recorder is not None:
+                self.recorder.stop()
+            if self.filter is not None:
+                LOGGER.info(f"Pulse filter stats: {self.filter.stats}")
             if self.debug:
                 self.debug.off()
             LOGGER.debug("Done.")
@@ -163,15 +301,59 @@ if __name__ == "__main__":
 
     parser.add_argument("--sensor_pin", type=int)
     parser.add_argument("--activator_pin", type=int)
-    parser.add_argument("--activation_duration", type=int, default=30)
+    parser.add_argument("--activation_duration", type=float, default=30)
     parser.add_argument("--debug_pin", required=False, default=None)
+    parser.add_argument(
+        "--events_file",
+        required=False,
+        default=None,
+        help="A file to record every motion start and stop to.",
+    )
+    parser.add_argument(
+        "--min_pulse_width",
+        type=float,
+        default=None,
+        help="Seconds a pulse from the sensor has to last to count as motion. Turns the pulse filter on.",
+    )
+    parser.add_argument(
+        "--required_pulses",
+        type=int,
+        default=None,
+        help=(
+            "How many of the last --pulse_history pulses have to be wide enough and within "
+            "--pulse_window. Turns the pulse filter on."
+        ),
+    )
+    parser.add_argument("--pulse_history", type=int, default=8)
+    parser.add_argument("--pulse_window", type=float, default=60.0)
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics on this port of localhost.",
+    )
 
     args = parser.parse_args()
+    filter_rule = None
+    if args.min_pulse_width is not None or args.required_pulses is not None:
+        filter_rule = FilterRule(
+            min_pulse_width=args.min_pulse_width or 0.0,
+            required_pulses=args.required_pulses or 1,
+            history=args.pulse_history,
+            window=args.pulse_window,
+        )
+    metrics = None
+    if args.metrics_port is not None:
+        metrics = Registry()
+        metrics.serve(args.metrics_port)
 
     sensor = MotionActivated(
         sensor_pin=args.sensor_pin,
         activator_pin=args.activator_pin,
         activation_duration=args.activation_duration,
         debug_pin=args.debug_pin,
+        recorder=EventRecorder(path=args.events_file) if args.events_file else None,
+        filter_rule=filter_rule,
+        metrics=metrics,
     )
     sensor.run()
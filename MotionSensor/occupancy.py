@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Reports how a space is actually used from recorded motion, to help pick an
+`activation_duration` for `motion_activated.py`.
+
+It reads either the events files written with `--events_file` or the logs
+`motion_activated.py` and `zones.py` print (the `||` delimited lines from
+`get_logger`), telling the two apart by the events file header. Every file is
+streamed a chunk of edges at a time and each chunk is binned with NumPy, so
+months of motion take seconds and memory stays flat however big the files are.
+
+The report has:
+- an hour of week heatmap of how much of each hour had motion in it
+- how much of the time the activator was on (its duty cycle)
+- for a range of activation durations, the duty cycle it would have had and
+  how often it would have switched off while somebody was still around,
+  along with a suggested duration
+
+The logs only have a line per motion start (and per stop with `--debug_pin`),
+so a start without a logged stop counts for the minute it happened in.
+
+Running the Program
+-------------------
+./occupancy.py motion.events
+./occupancy.py motion.log --activation_duration 60
+./occupancy.py motion.events older.log --json > report.json
+"""
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from events import FALL, FILE_MAGIC, NS_PER_MINUTE, RISE
+
+# Matches events.RECORD, which NumPy can read straight from the file
+EDGE_DTYPE = np.dtype([("ns", "<i8"), ("pin", "u1"), ("edge", "i1")])
+CHUNK_EDGES = 65536
+NS_PER_SECOND = 10**9
+HOURS_PER_WEEK = 7 * 24
+# 1970-01-01 was a Thursday, the heatmap starts on a Monday
+EPOCH_WEEKDAY = 3
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# Seconds, the activation durations to compare
+CANDIDATE_DURATIONS = (10, 15, 30, 45, 60, 90, 120, 180, 300, 600, 900)
+# Seconds, longer gaps between motion are between visits rather than in one
+VISIT_GAP = 30 * 60
+
+LOG_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+LOG_MOTION = re.compile(r"Motion detected(?: on sensor_pin=(\d+))?")
+LOG_NO_MOTION = "No motion detected"
+LOG_INITIALIZED = re.compile(r"Initialized Motion Sensor to sensor_pin=(\d+).*activation_duration=([\d.]+)")
+
+
+def _to_edges(ns: List[int], pins: List[int], edges: List[int]) -> np.ndarray:
+    chunk = np.empty(len(ns), dtype=EDGE_DTYPE)
+    chunk["ns"] = ns
+    chunk["pin"] = pins
+    chunk["edge"] = edges
+    return chunk
+
+
+def read_event_chunks(path: str, chunk_edges: int = CHUNK_EDGES) -> Iterator[np.ndarray]:
+    """
+    Description
+    -----------
+    Stream the edges out of an events file written by `EventRecorder`.
+
+    Params
+    ------
+    :path: str
+    The events file.
+
+    :chunk_edges: int = CHUNK_EDGES
+    How many edges to read at a time.
+
+    Return
+    ------
+    Iterator[np.ndarray]
+    Arrays of EDGE_DTYPE.
+    """
+    with open(path, "rb") as events_file:
+        if events_file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a motion events file.")
+        while True:
+            chunk = np.fromfile(events_file, dtype=EDGE_DTYPE, count=chunk_edges)
+            if len(chunk):
+                yield chunk
+            if len(chunk) < chunk_edges:
+                return
+
+
+@lru_cache(maxsize=4096)
+def _log_time_ns(stamp: str) -> int:
+    """Log lines only have second resolution so the same stamps repeat a lot"""
+    return int(datetime.strptime(stamp, LOG_DATE_FORMAT).timestamp()) * NS_PER_SECOND
+
+
+class LogReader:
+    def __init__(self, path: str, chunk_edges: int = CHUNK_EDGES) -> None:
+        """
+        Description
+        -----------
+        Streams motion edges out of a `get_logger` log, skipping every line
+        that isn't about motion.
+
+        Params
+        ------
+        :path: str
+        The log file.
+
+        :chunk_edges: int = CHUNK_EDGES
+        How many edges to gather before handing them on.
+        """
+        self.path = path
+        self.chunk_edges = chunk_edges
+        # The last activation_duration a MotionActivated logged
+        self.activation_duration: Optional[float] = None
+        # Logger name -> the sensor pin it last logged starting up with
+        self._pins: Dict[str, int] = {}
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """
+        Description
+        -----------
+        Read through the log.
+
+        Return
+        ------
+        Iterator[np.ndarray]
+        Arrays of EDGE_DTYPE.
+        """
+        ns, pins, edges = [], [], []
+        with open(self.path, errors="replace") as log_file:
+            for line in log_file:
+                parts = line.rstrip("\n").split("||", 4)
+                if len(parts) != 5:
+                    continue
+                stamp, _, name, _, message = parts
+                initialized = LOG_INITIALIZED.match(message)
+                if initialized:
+                    self._pins[name] = int(initialized[1])
+                    self.activation_duration = float(initialized[2])
+                    continue
+                motion = LOG_MOTION.match(message)
+                if motion:
+                    edge = RISE
+                    pin = int(motion[1]) if motion[1] else self._pins.get(name, 0)
+                elif message.startswith(LOG_NO_MOTION):
+                    edge = FALL
+                    pin = self._pins.get(name, 0)
+                else:
+                    continue
+                try:
+                    ns.append(_log_time_ns(stamp))
+                except ValueError:
+                    continue
+                pins.append(pin)
+                edges.append(edge)
+                if len(ns) == self.chunk_edges:
+                    yield _to_edges(ns, pins, edges)
+                    ns, pins, edges = [], [], []
+        if ns:
+            yield _to_edges(ns, pins, edges)
+
+
+class OccupancyReport:
+    def __init__(
+        self,
+        activation_duration: float,
+        candidates: Iterable[float] = CANDIDATE_DURATIONS,
+        utc_offset: timedelta = timedelta(0),
+        visit_gap: float = VISIT_GAP,
+    ) -> None:
+        """
+        Description
+        -----------
+        Accumulates the report one chunk of edges at a time, see `add()`.
+
+        Params
+        ------
+        :activation_duration: float
+        The activation duration the activator was running with, in seconds.
+
+        :candidates: Iterable[float] = CANDIDATE_DURATIONS
+        The activation durations to compare, in seconds.
+
+        :utc_offset: timedelta = timedelta(0)
+        The local time zone's offset from UTC, for the heatmap.
+
+        :visit_gap: float = VISIT_GAP
+        Seconds without motion after which somebody is taken to have left.
+        """
+        self.activation_duration = activation_duration
+        self.durations = np.array(sorted(set(candidates) | {activation_duration}), dtype=float)
+        self.offset_minutes = int(utc_offset.total_seconds()) // 60
+        self.visit_gap = visit_gap
+        self.edges = 0
+        self.rises = 0
+        self.first_ns: Optional[int] = None
+        self.last_ns: Optional[int] = None
+        # Minutes with motion in them per hour of the week
+        self.occupied_minutes = np.zeros(HOURS_PER_WEEK, dtype=np.int64)
+        # Seconds the activator would be on for with each duration
+        self.on_seconds = np.zeros(len(self.durations))
+        # Times the activator would switch off mid visit with each duration
+        self.lights_out = np.zeros(len(self.durations), dtype=np.int64)
+        self.visit_gaps = 0
+        # Pin -> when it went high, for pulses still going at a chunk's end
+        self._open: Dict[int, int] = {}
+        self._last_minute = -1
+        self._last_rise: Optional[int] = None
+
+    def _pulses(self, chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (start, end) ns for every pulse in the chunk. Pulses still going at
+        the end of the chunk are cut there and carried on into the next one,
+        so every minute up to the end of the chunk is final after it.
+        """
+        end_ns = int(chunk["ns"][-1])
+        starts, ends = [], []
+        for pin in np.unique(chunk["pin"]):
+            on_pin = chunk[chunk["pin"] == pin]
+            ns, edge = on_pin["ns"], on_pin["edge"]
+            if pin in self._open:
+                ns = np.concatenate(([self._open.pop(pin)], ns))
+                edge = np.concatenate(([RISE], edge))
+            is_rise = edge == RISE
+            # A start followed by a stop is a pulse between them, a start
+            # followed by another start (the stop wasn't logged) is a moment
+            closes = np.zeros(len(ns), dtype=bool)
+            closes[:-1] = is_rise[:-1] & (edge[1:] == FALL)
+            finished = is_rise.copy()
+            finished[-1] = False
+            starts.append(ns[finished])
+            ends.append(np.where(closes, np.roll(ns, -1), ns)[finished])
+            if is_rise[-1]:
+                starts.append(ns[-1:])
+                ends.append(np.array([end_ns]))
+                self._open[int(pin)] = end_ns
+        return np.concatenate(starts), np.concatenate(ends)
+
+    def add(self, chunk: np.ndarray) -> None:
+        """
+        Description
+        -----------
+        Bin another chunk of edges, which must come after every chunk added
+        so far.
+
+        Params
+        ------
+        :chunk: np.ndarray
+        Edges as EDGE_DTYPE.
+        """
+        if not len(chunk):
+            return
+        chunk = chunk[np.argsort(chunk["ns"], kind="stable")]
+        self.edges += len(chunk)
+        if self.first_ns is None:
+            self.first_ns = int(chunk["ns"][0])
+        self.last_ns = int(chunk["ns"][-1])
+
+        # Expand every pulse into the minutes it covers
+        starts, ends = self._pulses(chunk)
+        first = starts // NS_PER_MINUTE
+        counts = np.maximum(ends - 1, starts) // NS_PER_MINUTE - first + 1
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        minutes = np.unique(np.repeat(first, counts) + offsets)
+        minutes = minutes[minutes > self._last_minute]
+        if len(minutes):
+            self._last_minute = int(minutes[-1])
+            hours = (minutes + self.offset_minutes) // 60
+            hour_of_week = ((hours // 24 + EPOCH_WEEKDAY) % 7) * 24 + hours % 24
+            self.occupied_minutes += np.bincount(hour_of_week, minlength=HOURS_PER_WEEK)
+
+        # The activator turns on at every start and off once a whole
+        # duration goes by without another, from any sensor
+        rises = chunk["ns"][chunk["edge"] == RISE]
+        self.rises += len(rises)
+        if self._last_rise is not None:
+            rises = np.concatenate(([self._last_rise], rises))
+        if len(rises):
+            self._last_rise = int(rises[-1])
+        gaps = (np.diff(rises) / NS_PER_SECOND)[:, np.newaxis]
+        self.on_seconds += np.minimum(gaps, self.durations).sum(axis=0)
+        in_visit = gaps <= self.visit_gap
+        self.visit_gaps += int(in_visit.sum())
+        self.lights_out += ((gaps > self.durations) & in_visit).sum(axis=0)
+
+    def observed_hours(self) -> np.ndarray:
+        """How many of each hour of the week fall between the first and last edge"""
+        if self.first_ns is None:
+            return np.zeros(HOURS_PER_WEEK, dtype=np.int64)
+        first, last = (
+            (ns // NS_PER_MINUTE + self.offset_minutes) // 60
+            for ns in (self.first_ns, self.last_ns)
+        )
+        hours = np.arange(first, last + 1)
+        return np.bincount(((hours // 24 + EPOCH_WEEKDAY) % 7) * 24 + hours % 24, minlength=HOURS_PER_WEEK)
+
+    def results(self, coverage: float = 0.95) -> Dict[str, Any]:
+        """
+        Description
+        -----------
+        The report for everything added so far.
+
+        Params
+        ------
+        :coverage: float = 0.95
+        The share of gaps in a visit the suggested duration should keep the
+        activator on through.
+
+        Return
+        ------
+        Dict[str, Any]
+        The report, the heatmap is 7 rows (Monday first) of 24 hourly
+        fractions, None for hours that were never observed.
+        """
+        if self.first_ns is None:
+            return {"edges": 0}
+        observed = self.observed_hours()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            heatmap = np.where(observed > 0, self.occupied_minutes / (observed * 60), np.nan)
+        span = max((self.last_ns - self.first_ns) / NS_PER_SECOND, 1.0)
+        # The activator stays on for a whole duration after the last start
+        on_seconds = self.on_seconds + self.durations
+        duty_cycles = np.minimum(on_seconds / span, 1.0)
+        if self.visit_gaps:
+            kept_on = 1 - self.lights_out / self.visit_gaps
+        else:
+            kept_on = np.ones(len(self.durations))
+        good_enough = np.flatnonzero(kept_on >= coverage)
+        suggestion = self.durations[good_enough[0]] if len(good_enough) else self.durations[-1]
+        current = int(np.flatnonzero(self.durations == self.activation_duration)[0])
+        return {
+            "first": datetime.fromtimestamp(self.first_ns / NS_PER_SECOND, timezone.utc).isoformat(),
+            "last": datetime.fromtimestamp(self.last_ns / NS_PER_SECOND, timezone.utc).isoformat(),
+            "edges": self.edges,
+            "rises": self.rises,
+            "heatmap": [
+                [None if np.isnan(value) else round(float(value), 4) for value in day]
+                for day in heatmap.reshape(7, 24)
+            ],
+            "activation_duration": self.activation_duration,
+            "duty_cycle": float(duty_cycles[current]),
+            "durations": [
+                {
+                    "activation_duration": float(duration),
+                    "duty_cycle": float(duty_cycle),
+                    "lights_out_mid_visit": int(lights_out),
+                    "kept_on_through": float(share),
+                }
+                for duration, duty_cycle, lights_out, share in zip(
+                    self.durations, duty_cycles, self.lights_out, kept_on
+                )
+            ],
+            "coverage": coverage,
+            "suggested_activation_duration": float(suggestion),
+        }
+
+
+def format_report(results: Dict[str, Any]) -> str:
+    """
+    Description
+    -----------
+    Lay the report out for reading in a terminal.
+
+    Params
+    ------
+    :results: Dict[str, Any]
+    What `OccupancyReport.results()` returned.
+
+    Return
+    ------
+    str
+    The report.
+    """
+    if not results["edges"]:
+        return "No motion recorded."
+    lines = [
+        f"Motion from {results['first']} to {results['last']} " +
+        f"({results['edges']} edges, {results['rises']} motion starts)",
+        "",
+        "Percent of each hour with motion in it (blank = never observed)",
+        "    " + "".join(f"{hour:>4}" for hour in range(24)),
+    ]
+    for day, values in zip(DAYS, results["heatmap"]):
+        lines.append(day + " " + "".join(
+            "    " if value is None else "   ." if value == 0 else f"{round(value * 100):>4}"
+            for value in values
+        ))
+    lines += [
+        "",
+        f"Activator duty cycle at activation_duration={results['activation_duration']:g}s: " +
+        f"{results['duty_cycle']:.1%}",
+        "",
+        f"{'duration':>10}{'duty cycle':>12}{'off mid visit':>15}{'kept on':>10}",
+    ]
+    for row in results["durations"]:
+        lines.append(
+            f"{row['activation_duration']:>9g}s{row['duty_cycle']:>12.1%}" +
+            f"{row['lights_out_mid_visit']:>15}{row['kept_on_through']:>10.1%}"
+        )
+    lines += [
+        "",
+        f"Suggested activation_duration: {results['suggested_activation_duration']:g}s " +
+        f"(stays on through {results['coverage']:.0%} of the gaps in a visit)",
+    ]
+    return "\n".join(lines)
+
+
+def is_events_file(path: str) -> bool:
+    with open(path, "rb") as maybe_events:
+        return maybe_events.read(len(FILE_MAGIC)) == FILE_MAGIC
+
+
+def logged_activation_duration(path: str) -> Optional[float]:
+    """The activation_duration a log's first MotionActivated started up with"""
+    with open(path, errors="replace") as log_file:
+        for line in log_file:
+            parts = line.split("||", 4)
+            initialized = len(parts) == 5 and LOG_INITIALIZED.match(parts[4])
+            if initialized:
+                return float(initialized[2])
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("paths", nargs="+", help="Events files and logs, oldest first.")
+    parser.add_argument(
+        "--activation_duration",
+        type=float,
+        default=None,
+        help="The activation duration the activator ran with (default: from the logs, else 30)",
+    )
+    parser.add_argument(
+        "--coverage",
+        type=float,
+        default=0.95,
+        help="The share of gaps in a visit the suggestion should stay on through (default: 0.95)",
+    )
+    parser.add_argument(
+        "--visit_gap",
+        type=float,
+        default=VISIT_GAP,
+        help=f"Seconds without motion after which a visit is over (default: {VISIT_GAP})",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    args = parser.parse_args()
+
+    readers = [
+        None if is_events_file(path) else LogReader(path)
+        for path in args.paths
+    ]
+    # The duration is needed before the first chunk, so take it from the
+    # newest log that says, falling back on motion_activated's default
+    activation_duration = args.activation_duration
+    for reader in reversed(readers):
+        if activation_duration is None and reader is not None:
+            activation_duration = logged_activation_duration(reader.path)
+    report = OccupancyReport(
+        activation_duration=activation_duration or 30.0,
+        utc_offset=datetime.now().astimezone().utcoffset(),
+        visit_gap=args.visit_gap,
+    )
+    for path, reader in zip(args.paths, readers):
+        for chunk in read_event_chunks(path) if reader is None else reader.chunks():
+            report.add(chunk)
+
+    results = report.results(coverage=args.coverage)
+    print(json.dumps(results, indent=2) if args.json else format_report(results))
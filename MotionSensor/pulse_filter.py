@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Filters spurious pulses out of a PIR sensor's output.
+
+The HC-SR501 every so often puts out short pulses when nothing is there
+(electrical noise, a draft, the sun going behind a cloud), and acting on each
+of them means lights flicking on in empty rooms. This sits between the
+gpiozero `MotionSensor` callbacks and whatever acts on motion, and only
+passes a pulse on once it passes the filter rule:
+
+- the pulse has to stay high for at least `min_pulse_width` seconds, and
+- at least `required_pulses` of the last `history` pulses (this one included)
+  have to have been that wide and started within the last `window` seconds.
+
+The default rule passes every pulse straight through, so the filter can be
+put in place first and tightened while watching its stats.
+
+The recent pulses are kept in NumPy arrays and the rule is checked with a
+handful of vector operations over all of them at once, so checking stays
+cheap however busy the sensor gets.
+"""
+import threading
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, Optional
+
+import numpy as np
+
+from logs import get_logger
+from scheduler import DeadlineScheduler
+
+LOGGER = get_logger("PulseFilter")
+
+
+@dataclass(frozen=True)
+class FilterRule:
+    min_pulse_width: float = 0.0
+    required_pulses: int = 1
+    history: int = 8
+    window: float = 60.0
+
+
+@dataclass
+class FilterStats:
+    """
+    Description
+    -----------
+    Running totals for the filter
+    """
+    pulses: int = 0
+    accepted: int = 0
+    rejected_short: int = 0
+    rejected_sparse: int = 0
+    evaluations: int = 0
+
+    @property
+    def rejected(self) -> int:
+        return self.rejected_short + self.rejected_sparse
+
+
+class PulseFilter:
+    def __init__(
+        self,
+        rule: FilterRule,
+        scheduler: DeadlineScheduler,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        """
+        Description
+        -----------
+        Feed it the raw sensor edges through `rise()` and `fall()` and it
+        calls `when_motion` for each pulse that passes the rule, and
+        `when_no_motion` when a pulse that passed ends.
+
+        Params
+        ------
+        :rule: FilterRule
+        What a pulse needs to pass, see the module docstring.
+
+        :scheduler: DeadlineScheduler
+        The scheduler that checks a pulse again once it has been high for
+        `min_pulse_width` seconds.
+
+        :clock: Callable[[], float] = monotonic
+        The clock the pulses are timed with, should match the scheduler's.
+        """
+        if rule.min_pulse_width < 0:
+            raise ValueError("Cannot specify a minimum pulse width below 0 seconds.")
+        if not 1 <= rule.required_pulses <= rule.history:
+            raise ValueError(
+                f"Cannot require {rule.required_pulses} pulses out of the last {rule.history}."
+            )
+        if rule.window <= 0:
+            raise ValueError("Cannot specify a window of 0 seconds or less.")
+        self.rule = rule
+        self.scheduler = scheduler
+        self.clock = clock
+        self.when_motion: Optional[Callable[[], None]] = None
+        self.when_no_motion: Optional[Callable[[], None]] = None
+        self.stats = FilterStats()
+        # The last `history` pulses, a fall of NaN means it is still high
+        self._rises = np.full(rule.history, np.nan)
+        self._falls = np.full(rule.history, np.nan)
+        self._current: Optional[int] = None
+        self._accepted = False
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _passes(self, now: float) -> bool:
+        """Whether the current pulse passes the rule. Call with the lock held."""
+        self.stats.evaluations += 1
+        widths = np.where(np.isnan(self._falls), now - self._rises, self._falls - self._rises)
+        wide = widths >= self.rule.min_pulse_width
+        if not wide[self._current]:
+            return False
+        # NaN (never used) slots compare False and drop out here
+        recent = self._rises >= now - self.rule.window
+        return np.count_nonzero(wide & recent) >= self.rule.required_pulses
+
+    def _evaluate(self) -> bool:
+        """Accept the current pulse if it passes. Call with the lock held."""
+        if self._current is None or self._accepted:
+            return False
+        if not self._passes(self.clock()):
+            return False
+        self._accepted = True
+        self.stats.accepted += 1
+        return True
+
+    def _check_width(self) -> None:
+        with self._lock:
+            accepted = self._evaluate()
+        if accepted and self.when_motion:
+            self.when_motion()
+
+    def rise(self) -> None:
+        """The sensor's output went high, use as the sensor's `when_motion`."""
+        with self._lock:
+            if self._current is not None:
+                # Missed the fall, close the old pulse off here
+                self._falls[self._current] = self.clock()
+            index = self._next
+            self._next = (index + 1) % self.rule.history
+            self._rises[index] = self.clock()
+            self._falls[index] = np.nan
+            self._current = index
+            self._accepted = False
+            self.stats.pulses += 1
+            accepted = self._evaluate()
+            if not accepted and self.rule.min_pulse_width > 0:
+                self.scheduler.arm(self, self.rule.min_pulse_width, self._check_width)
+        if accepted and self.when_motion:
+            self.when_motion()
+
+    def fall(self) -> None:
+        """The sensor's output went low, use as the sensor's `when_no_motion`."""
+        with self._lock:
+            if self._current is None:
+                return
+            self.scheduler.cancel(self)
+            now = self.clock()
+            # The pulse may have only just reached its width
+            just_accepted = self._evaluate()
+            self._falls[self._current] = now
+            accepted = self._accepted
+            if not accepted:
+                width = now - self._rises[self._current]
+                if width < self.rule.min_pulse_width:
+                    self.stats.rejected_short += 1
+                else:
+                    self.stats.rejected_sparse += 1
+                LOGGER.debug(f"Rejected a {width:.2f}s pulse.")
+            self._current = None
+            self._accepted = False
+        if just_accepted and self.when_motion:
+            self.when_motion()
+        if accepted and self.when_no_motion:
+            self.when_no_motion()
@@ -0,0 +1,560 @@
+#!/usr/bin/env python3
+"""
+Replays motion through `MotionActivated` and `turn_on_and_wait` in simulated
+time, so days of behaviour can be checked in seconds without waving at a
+sensor.
+
+Everything runs on gpiozero's mock pin factory. The sensor's edges (made up,
+or read back out of an `--events_file` recording) are driven onto a mock
+pin at the simulated time they happened, and the clock jumps straight from
+one thing happening to the next, be it an edge, an activator deadline or the
+end of a `sleep`. Every change of the activator is written down against the
+simulated clock, and for `MotionActivated` the timeline is checked against
+what it should have done: stay on from each motion start until a whole
+`activation_duration` has passed without another.
+
+gpiozero's own `MotionSensor` samples its pin on a background thread in real
+time, so the replays read the pin with `ReplaySensor` instead, which reacts
+to the pin as soon as it changes.
+
+Running the Program
+-------------------
+./replay.py --days 7 --activation_duration 30
+./replay.py --events_file motion.events --sensor_pin 14
+./replay.py --days 1 --watch
+"""
+import logging
+import os
+import random
+from contextlib import redirect_stdout
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from gpiozero import Device, DigitalInputDevice, LED
+from gpiozero.pins.mock import MockFactory
+
+from events import RISE, read_events
+from motion_activated import MotionActivated
+from pulse_filter import FilterRule
+from scheduler import DeadlineScheduler
+from watch import turn_on_and_wait
+
+# (seconds, high)
+Edge = Tuple[float, bool]
+# (on, off) seconds
+Interval = Tuple[float, float]
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class ReplaySensor(DigitalInputDevice):
+    """A motion sensor that reacts to its pin straight away, for mock pins"""
+    when_motion = DigitalInputDevice.when_activated
+    when_no_motion = DigitalInputDevice.when_deactivated
+    motion_detected = DigitalInputDevice.is_active
+
+
+class VirtualClock:
+    def __init__(self, start: float = 0.0) -> None:
+        """
+        Description
+        -----------
+        A clock that only moves when told to.
+
+        Params
+        ------
+        :start: float = 0.0
+        The time to start at, in seconds.
+        """
+        self.time = start
+
+    def __call__(self) -> float:
+        return self.time
+
+
+class Replay:
+    def __init__(
+        self,
+        edges: Iterable[Edge],
+        sensor_pin: int,
+        clock: VirtualClock,
+        scheduler: Optional[DeadlineScheduler] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        Drives edges onto a mock sensor pin and fires scheduler deadlines,
+        all in time order, moving the clock along as it goes.
+
+        Params
+        ------
+        :edges: Iterable[Edge]
+        (seconds, high) for every edge, in time order.
+
+        :sensor_pin: int
+        The mock pin to drive, set up `Device.pin_factory` as a MockFactory
+        first.
+
+        :clock: VirtualClock
+        The clock everything under test reads.
+
+        :scheduler: Optional[DeadlineScheduler] = None
+        The scheduler under test, which must not be started.
+        """
+        self.edges = iter(edges)
+        self.pin = Device.pin_factory.pin(sensor_pin)
+        self.clock = clock
+        self.scheduler = scheduler
+        self.edges_driven = 0
+        # name -> (device, [(seconds, on)]) for each device being watched
+        self.timelines: Dict[str, Tuple[object, List[Tuple[float, bool]]]] = {}
+        self._next_edge = next(self.edges, None)
+
+    def watch(self, name: str, device: object) -> None:
+        """
+        Description
+        -----------
+        Write down every change of an output device.
+
+        Params
+        ------
+        :name: str
+        What to call it in `timelines` and `intervals()`.
+
+        :device: object
+        Anything with `is_active`, like a gpiozero LED.
+        """
+        self.timelines[name] = (device, [(self.clock.time, bool(device.is_active))])
+
+    def _note_changes(self) -> None:
+        for device, timeline in self.timelines.values():
+            state = bool(device.is_active)
+            if state != timeline[-1][1]:
+                timeline.append((self.clock.time, state))
+
+    @property
+    def finished(self) -> bool:
+        """Whether every edge has been driven"""
+        return self._next_edge is None
+
+    def run_until(self, end: float) -> None:
+        """
+        Description
+        -----------
+        Replay everything due up to a time and leave the clock there.
+
+        Params
+        ------
+        :end: float
+        The time to run to, in seconds.
+        """
+        # Whatever is under test may have switched something since
+        self._note_changes()
+        while True:
+            edge_at = self._next_edge[0] if self._next_edge else float("inf")
+            deadline = self.scheduler.next_deadline() if self.scheduler else None
+            deadline = float("inf") if deadline is None else deadline
+            if min(edge_at, deadline) > end:
+                break
+            self.clock.time = max(self.clock.time, min(edge_at, deadline))
+            # A deadline due at the same moment as an edge goes first
+            if deadline <= edge_at:
+                self.scheduler.run_due(self.clock.time)
+            else:
+                if self._next_edge[1]:
+                    self.pin.drive_high()
+                else:
+                    self.pin.drive_low()
+                self.edges_driven += 1
+                self._next_edge = next(self.edges, None)
+            self._note_changes()
+        self.clock.time = max(self.clock.time, end)
+
+    def sleep(self, seconds: float) -> None:
+        """Stands in for time.sleep, replaying everything due in the meantime"""
+        self.run_until(self.clock.time + seconds)
+
+    def intervals(self, name: str) -> List[Interval]:
+        """
+        Description
+        -----------
+        When a watched device was on.
+
+        Params
+        ------
+        :name: str
+        The name it was watched under.
+
+        Return
+        ------
+        List[Interval]
+        (on, off) seconds for each time it was on, off is the clock's time
+        if it is still on.
+        """
+        _, timeline = self.timelines[name]
+        intervals, on_at = [], None
+        for at, on in timeline:
+            if on and on_at is None:
+                on_at = at
+            elif not on and on_at is not None:
+                intervals.append((on_at, at))
+                on_at = None
+        if on_at is not None:
+            intervals.append((on_at, self.clock.time))
+        return intervals
+
+
+def synthetic_edges(
+    days: float,
+    visits_per_day: int = 12,
+    seed: int = 0,
+) -> List[Edge]:
+    """
+    Description
+    -----------
+    Made up motion, a handful of visits a day each made of a run of pulses
+    the way an HC-SR501 puts them out.
+
+    Params
+    ------
+    :days: float
+    How many days of motion.
+
+    :visits_per_day: int = 12
+    How many visits each day.
+
+    :seed: int = 0
+    Seeds the randomness so a replay can be repeated.
+
+    Return
+    ------
+    List[Edge]
+    (seconds, high) for every edge, in time order.
+    """
+    generator = random.Random(seed)
+    visits = sorted(
+        generator.uniform(0, days * SECONDS_PER_DAY)
+        for _ in range(int(days * visits_per_day))
+    )
+    edges = []
+    last_fall = 0.0
+    for start in visits:
+        at = max(start, last_fall + 1)
+        for _ in range(generator.randint(1, 30)):
+            width = generator.uniform(2.5, 8)
+            edges += [(at, True), (at + width, False)]
+            last_fall = at + width
+            at = last_fall + generator.uniform(1, 90)
+    return edges
+
+
+def recorded_edges(path: str, sensor_pin: Optional[int] = None) -> List[Edge]:
+    """
+    Description
+    -----------
+    The edges out of an events file, timed from the first of them.
+
+    Params
+    ------
+    :path: str
+    A file written by `EventRecorder`.
+
+    :sensor_pin: Optional[int] = None
+    Only replay this pin's edges, every pin's by default.
+
+    Return
+    ------
+    List[Edge]
+    (seconds, high) for every edge, in time order.
+    """
+    events = [
+        (timestamp, edge)
+        for timestamp, pin, edge in read_events(path)
+        if sensor_pin is None or pin == sensor_pin
+    ]
+    if not events:
+        return []
+    first = events[0][0]
+    return [((timestamp - first) / 10**9, edge == RISE) for timestamp, edge in events]
+
+
+def expected_intervals(edges: Iterable[Edge], activation_duration: float) -> List[Interval]:
+    """
+    Description
+    -----------
+    When the activator should be on: from every motion start until a whole
+    activation duration has gone by without another.
+
+    Params
+    ------
+    :edges: Iterable[Edge]
+    (seconds, high) for every edge, in time order.
+
+    :activation_duration: float
+    How many seconds the activator stays on for.
+
+    Return
+    ------
+    List[Interval]
+    (on, off) seconds for each time it should be on.
+    """
+    intervals = []
+    for at, high in edges:
+        if not high:
+            continue
+        if intervals and at <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], at + activation_duration)
+        else:
+            intervals.append((at, at + activation_duration))
+    return intervals
+
+
+def replay_motion_activated(
+    edges: List[Edge],
+    activation_duration: float,
+    sensor_pin: int = 14,
+    activator_pin: int = 15,
+    filter_rule: Optional[FilterRule] = None,
+) -> Tuple[Replay, MotionActivated]:
+    """
+    Description
+    -----------
+    Run a `MotionActivated` through some motion in simulated time.
+
+    Params
+    ------
+    :edges: List[Edge]
+    (seconds, high) for every edge, in time order.
+
+    :activation_duration: float
+    How many seconds the activator stays on for.
+
+    :sensor_pin: int = 14
+    The mock pin for the sensor.
+
+    :activator_pin: int = 15
+    The mock pin for the activator.
+
+    :filter_rule: Optional[FilterRule] = None
+    Passed on to `MotionActivated`.
+
+    Return
+    ------
+    Tuple[Replay, MotionActivated]
+    The finished replay, its "activator" timeline is the activator's.
+    """
+    Device.pin_factory = MockFactory()
+    clock = VirtualClock()
+    scheduler = DeadlineScheduler(clock=clock)
+    motion = MotionActivated(
+        sensor_pin=sensor_pin,
+        activator_pin=activator_pin,
+        activation_duration=activation_duration,
+        scheduler=scheduler,
+        filter_rule=filter_rule,
+        sensor_class=ReplaySensor,
+    )
+    replay = Replay(edges, sensor_pin, clock, scheduler)
+    replay.watch("activator", motion.activator)
+    end = edges[-1][0] if edges else 0.0
+    replay.run_until(end + activation_duration + 1)
+    return replay, motion
+
+
+def replay_turn_on_and_wait(
+    edges: List[Edge],
+    shutdown_after_seconds: int,
+    rescan_after_seconds: int,
+    sensor_pin: int = 14,
+    led_pin: int = 15,
+    detection_led_pin: int = 18,
+) -> Replay:
+    """
+    Description
+    -----------
+    Run `watch.turn_on_and_wait` (over and over, the way `watch.py` does)
+    through some motion in simulated time, throwing away what it prints.
+
+    Params
+    ------
+    :edges: List[Edge]
+    (seconds, high) for every edge, in time order.
+
+    :shutdown_after_seconds: int
+    Passed on to `turn_on_and_wait`.
+
+    :rescan_after_seconds: int
+    Passed on to `turn_on_and_wait`.
+
+    :sensor_pin: int = 14
+    The mock pin for the sensor.
+
+    :led_pin: int = 15
+    The mock pin for the LED.
+
+    :detection_led_pin: int = 18
+    The mock pin for the detection LED.
+
+    Return
+    ------
+    Replay
+    The finished replay, with "led" and "detection_led" timelines.
+    """
+    Device.pin_factory = MockFactory()
+    clock = VirtualClock()
+    sensor = ReplaySensor(sensor_pin)
+    led = LED(led_pin)
+    detection_led = LED(detection_led_pin)
+    replay = Replay(edges, sensor_pin, clock)
+    replay.watch("led", led)
+    replay.watch("detection_led", detection_led)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        while not replay.finished:
+            turn_on_and_wait(
+                sensor=sensor,
+                led=led,
+                detection_led=detection_led,
+                shutdown_after_seconds=shutdown_after_seconds,
+                rescan_after_seconds=rescan_after_seconds,
+                sensor_pin=sensor_pin,
+                now=clock,
+                wait=replay.sleep,
+            )
+    return replay
+
+
+def check_timeline(actual: List[Interval], expected: List[Interval], tolerance: float = 1e-6) -> List[str]:
+    """
+    Description
+    -----------
+    Compare an activator's timeline with what it should have been.
+
+    Params
+    ------
+    :actual: List[Interval]
+    What the activator did.
+
+    :expected: List[Interval]
+    What it should have done.
+
+    :tolerance: float = 1e-6
+    How many seconds apart two switches can be and still match.
+
+    Return
+    ------
+    List[str]
+    A description of each mismatch, empty if they match.
+    """
+    problems = []
+    if len(actual) != len(expected):
+        problems.append(f"Expected {len(expected)} activations, got {len(actual)}.")
+    for (on, off), (expected_on, expected_off) in zip(actual, expected):
+        if abs(on - expected_on) > tolerance or abs(off - expected_off) > tolerance:
+            problems.append(
+                f"Expected on at {expected_on:.3f}s until {expected_off:.3f}s, " +
+                f"got {on:.3f}s until {off:.3f}s."
+            )
+    return problems
+
+
+def check_failing_callback() -> List[str]:
+    """
+    Description
+    -----------
+    Check that a deadline whose callback raises doesn't stop the deadlines
+    after it from firing.
+
+    Return
+    ------
+    List[str]
+    A description of each problem, empty if there are none.
+    """
+    clock = VirtualClock()
+    scheduler = DeadlineScheduler(clock)
+    fired = []
+
+    def broken() -> None:
+        raise OSError("The device is closed.")
+
+    scheduler.arm("broken", 1.0, broken)
+    scheduler.arm("later", 2.0, lambda: fired.append("later"))
+    logger = logging.getLogger("DeadlineScheduler")
+    disabled, logger.disabled = logger.disabled, True
+    try:
+        clock.time = 1.0
+        scheduler.run_due()
+        clock.time = 2.0
+        scheduler.run_due()
+    except Exception as e:
+        return [f"A failing deadline callback escaped the scheduler: {e!r}"]
+    finally:
+        logger.disabled = disabled
+    if fired != ["later"]:
+        return ["A failing deadline callback stopped the later deadlines from firing."]
+    return []
+
+
+def _on_seconds(intervals: List[Interval]) -> float:
+    return sum(off - on for on, off in intervals)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--days", type=float, default=7, help="Days of made up motion. (default: 7)")
+    parser.add_argument("--seed", type=int, default=0, help="Seeds the made up motion. (default: 0)")
+    parser.add_argument(
+        "--events_file",
+        default=None,
+        help="Replay this recording instead of made up motion.",
+    )
+    parser.add_argument("--sensor_pin", type=int, default=None, help="Only replay this pin from --events_file.")
+    parser.add_argument("--activation_duration", type=float, default=30)
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Replay through watch.py's turn_on_and_wait instead of MotionActivated.",
+    )
+    parser.add_argument("--shutdown_after_seconds", type=int, default=5 * 60)
+    parser.add_argument("--rescan_after_seconds", type=int, default=1)
+
+    args = parser.parse_args()
+
+    if args.events_file:
+        edges = recorded_edges(args.events_file, args.sensor_pin)
+    else:
+        edges = synthetic_edges(args.days, seed=args.seed)
+    # Every motion start would otherwise be logged
+    logging.getLogger("MotionActivated").disabled = True
+
+    started = perf_counter()
+    if args.watch:
+        replay = replay_turn_on_and_wait(edges, args.shutdown_after_seconds, args.rescan_after_seconds)
+        intervals = replay.intervals("led")
+        problems = []
+    else:
+        replay, _ = replay_motion_activated(edges, args.activation_duration)
+        intervals = replay.intervals("activator")
+        problems = check_timeline(intervals, expected_intervals(edges, args.activation_duration))
+    elapsed = perf_counter() - started
+
+    simulated = replay.clock.time
+    print(
+        f"Replayed {replay.edges_driven} edges over {simulated / SECONDS_PER_DAY:.2f} simulated days " +
+        f"in {elapsed:.2f}s ({simulated / max(elapsed, 1e-9):,.0f}x real time)."
+    )
+    print(
+        f"The activator switched on {len(intervals)} times and was on for " +
+        f"{_on_seconds(intervals) / max(simulated, 1e-9):.1%} of the time."
+    )
+    problems += check_failing_callback()
+    for problem in problems[:20]:
+        print(problem)
+    if problems:
+        raise SystemExit(f"{len(problems)} problems with the activator's timeline.")
+    if not args.watch:
+        print("The activator's timeline matched.")
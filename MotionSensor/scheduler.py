@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+A deadline scheduler for turning things off after a while.
+
+Each deadline is keyed (for example by the activator it turns off) and
+re-arming a key pushes its deadline back, so a light that keeps seeing motion
+keeps getting more time. Deadlines are kept in a heap and a single thread
+sleeps until the earliest one is due, so nothing wakes up at all while there
+is nothing to do, and a callback fires exactly once when its deadline passes.
+A callback that raises is logged and the rest carry on firing.
+"""
+import heapq
+import itertools
+import threading
+from time import monotonic
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from logs import get_logger
+
+LOGGER = get_logger("DeadlineScheduler")
+
+
+class DeadlineScheduler:
+    def __init__(self, clock: Callable[[], float] = monotonic) -> None:
+        """
+        Description
+        -----------
+        A heap of keyed deadlines, each of which calls back once when it
+        passes. The scheduler can run on its own thread (see start) or be
+        driven by hand with run_due, which is how simulated time works.
+
+        Params
+        ------
+        :clock: Callable[[], float] = monotonic
+        The clock deadlines are measured against
+        """
+        self.clock = clock
+        # (deadline, sequence number, key), stale entries are skipped
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        # key -> (deadline, sequence number, callback) for live deadlines
+        self._armed: Dict[Hashable, Tuple[float, int, Callable[[], None]]] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def arm(self, key: Hashable, delay: float, callback: Callable[[], None]) -> None:
+        """
+        Description
+        -----------
+        Set (or move) the deadline for a key, replacing any earlier deadline
+        and callback for it
+
+        Params
+        ------
+        :key: Hashable
+        What the deadline is for
+
+        :delay: float
+        Seconds from now until the deadline
+
+        :callback: Callable[[], None]
+        Called once, from the scheduler's thread, when the deadline passes
+        """
+        with self._condition:
+            deadline = self.clock() + delay
+            sequence = next(self._sequence)
+            self._armed[key] = (deadline, sequence, callback)
+            heapq.heappush(self._heap, (deadline, sequence, key))
+            self._condition.notify()
+
+    def cancel(self, key: Hashable) -> None:
+        """
+        Description
+        -----------
+        Drop the deadline for a key without calling back
+
+        Params
+        ------
+        :key: Hashable
+        What the deadline is for
+        """
+        with self._condition:
+            self._armed.pop(key, None)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """
+        Description
+        -----------
+        When a key's deadline is, if it has one
+
+        Params
+        ------
+        :key: Hashable
+        What the deadline is for
+
+        Return
+        ------
+        Optional[float]
+        The deadline on the scheduler's clock, None if there is none armed
+        """
+        with self._condition:
+            armed = self._armed.get(key)
+            return None if armed is None else armed[0]
+
+    def _next_deadline(self) -> Optional[float]:
+        """The earliest live deadline, dropping stale heap entries on the way"""
+        while self._heap:
+            deadline, sequence, key = self._heap[0]
+            armed = self._armed.get(key)
+            if armed is not None and armed[1] == sequence:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Description
+        -----------
+        When the earliest deadline is
+
+        Return
+        ------
+        Optional[float]
+        The deadline on the scheduler's clock, None if nothing is armed
+        """
+        with self._condition:
+            return self._next_deadline()
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """
+        Description
+        -----------
+        Call back every deadline that has passed, earliest first
+
+        Params
+        ------
+        :now: Optional[float] = None
+        The time to fire deadlines up to, the clock's time by default
+
+        Return
+        ------
+        int
+        How many deadlines fired
+        """
+        fired = 0
+        while True:
+            with self._condition:
+                if now is None:
+                    now = self.clock()
+                deadline = self._next_deadline()
+                if deadline is None or deadline > now:
+                    return fired
+                _, _, key = heapq.heappop(self._heap)
+                _, _, callback = self._armed.pop(key)
+            # Called outside the lock so the callback is free to re-arm
+            try:
+                callback()
+            except Exception:
+                # One device failing to switch off mustn't stop every other
+                # deadline, this is the only thread that fires them
+                LOGGER.exception(f"The deadline for {key!r} failed.")
+            fired += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    deadline = self._next_deadline()
+                    if deadline is not None and deadline <= self.clock():
+                        break
+                    timeout = None if deadline is None else deadline - self.clock()
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+            self.run_due()
+
+    def start(self) -> None:
+        """
+        Description
+        -----------
+        Fire deadlines from a background thread as they pass
+        """
+        with self._condition:
+            self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="DeadlineScheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Description
+        -----------
+        Stop the background thread, any deadlines still armed stay armed
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
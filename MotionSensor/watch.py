@@ -57,16 +57,23 @@ here as well!
 """
 from time import sleep
 from time import time
+from typing import Callable, Optional
 
 from gpiozero import MotionSensor
 from gpiozero import LED
 
+from events import FALL, RISE, EventRecorder
+
 
 def turn_on_and_wait(sensor: object,
                      led: object,
                      detection_led: object,
                      shutdown_after_seconds: int,
-                     rescan_after_seconds: int) -> None:
+                     rescan_after_seconds: int,
+                     recorder: Optional[EventRecorder] = None,
+                     sensor_pin: int = 0,
+                     now: Callable[[], float] = time,
+                     wait: Callable[[float], None] = sleep) -> None:
     """
     Description
     -----------
@@ -93,6 +100,18 @@ def turn_on_and_wait(sensor: object,
     :rescan_after_seconds: int
     The number of seconds to wait before scanning again.
 
+    :recorder: Optional[EventRecorder] = None
+    Where to record every motion start and stop for later analysis.
+
+    :sensor_pin: int = 0
+    The pin the sensor is on, to label the recorded events with.
+
+    :now: Callable[[], float] = time
+    The clock to time the shutdown with.
+
+    :wait: Callable[[float], None] = sleep
+    How to wait between scans, swap both out to run in simulated time.
+
     Return
     ------
     None
@@ -107,12 +126,24 @@ def turn_on_and_wait(sensor: object,
     # interval and potentiometer are roughly the same interval then you should
     # have no trouble using this. If anything it is better that the
     # potentiometer be tuned to slightly longer.
-    sensor.when_motion = detection_led.on
-    sensor.when_no_motion = detection_led.off
+    if recorder is None:
+        sensor.when_motion = detection_led.on
+        sensor.when_no_motion = detection_led.off
+    else:
+        def motion():
+            recorder.record(sensor_pin, RISE)
+            detection_led.on()
+
+        def no_motion():
+            recorder.record(sensor_pin, FALL)
+            detection_led.off()
 
-    started_waiting_time = time()
+        sensor.when_motion = motion
+        sensor.when_no_motion = no_motion
+
+    started_waiting_time = now()
     while True:
-        current_time = time()
+        current_time = now()
         if sensor.motion_detected:
             started_waiting_time = current_time
             print("Motion detected.")
@@ -126,7 +157,7 @@ def turn_on_and_wait(sensor: object,
                 led.off()
                 break
         print(f"Is the light lit?: `{led.is_lit}`")
-        sleep(rescan_after_seconds)
+        wait(rescan_after_seconds)
 
 
 if __name__ == "__main__":
@@ -162,7 +193,16 @@ if __name__ == "__main__":
         default=1,
         help="In seconds, how long to wait between motion checks. (default: 1)"
     )
+    parser.add_argument(
+        '--events_file',
+        required=False,
+        default=None,
+        help="A file to record every motion start and stop to. (default: none)"
+    )
     args = parser.parse_args()
+    recorder = EventRecorder(path=args.events_file) if args.events_file else None
+    if recorder is not None:
+        recorder.start()
     sensor = MotionSensor(args.sensor_pin)
     led = LED(args.led_pin)
     detection_led = LED(args.detection_led_pin)
@@ -173,32 +213,16 @@ if __name__ == "__main__":
                 led=led,
                 detection_led=detection_led,
                 shutdown_after_seconds=int(args.shutdown_after_seconds),
-                rescan_after_seconds=int(args.rescan_after_seconds)
+                rescan_after_seconds=int(args.rescan_after_seconds),
+                recorder=recorder,
+                sensor_pin=int(args.sensor_pin)
             )
         except KeyboardInterrupt:
             print("Ending the program.")
+            if recorder is not None:
+                recorder.stop()
             sensor.close()
             led.close()
             detection_led.close()
             break
 
-
-while True:
-    still_moving = sensor.motion_detected
-    if still_moving:
-            last_detected = time()
-    keep_on = abs(time() - last_detected) <= 60
-    if (still_moving or keep_on) and not led_on:
-            print("Motion detected, turining LED on!")
-            led.toggle()
-    elif (still_moving or keep_on) and led_on:
-            print(f"LED Still on... for `{time() - last_detected}` seconds")
-    elif not (still_moving or keep_on) and not led_on:
-            print("nothing detected...")
-    elif not (still_moving or keep_on) and led_on:
-            print(f"Dormant for `{time() - last_detected}` seconds, turning off")
-            led.toggle()
-    else:
-            print("idk how we got here?")
-    sleep(5)
-    led_on = led.is_lit
\ No newline at end of file
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Serves any number of motion sensor -> activator zones from one process.
+
+Rather than starting a separate `motion_activated.py` (and a separate python
+interpreter) per room from `/etc/rc.local`, list every room in a config file
+and run this once. Every zone shares the same deadline scheduler thread, a
+zone can be driven by several sensors (say one at each end of a hallway) and
+a sensor can drive several zones. Sending the process SIGHUP reloads the
+config without restarting it, only touching the pins that changed.
+
+The config is JSON like so:
+
+```
+{
+    "zones": [
+        {
+            "name": "hallway",
+            "sensor_pins": [14, 23],
+            "activator_pin": 15,
+            "activation_duration": 60
+        },
+        {
+            "name": "closet",
+            "sensor_pins": [24],
+            "activator_pin": 18,
+            "activation_duration": 30
+        }
+    ]
+}
+```
+"""
+import json
+import math
+import signal
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from gpiozero import LED
+from gpiozero import MotionSensor
+from gpiozero.exc import GPIOZeroError
+
+from activator import TimedActivator
+from logs import get_logger
+from scheduler import DeadlineScheduler
+
+LOGGER = get_logger("ZoneManager")
+
+# The BCM numbered GPIO pins on the Pi's header
+GPIO_PINS = range(28)
+
+
+@dataclass(frozen=True)
+class ZoneConfig:
+    name: str
+    sensor_pins: Tuple[int, ...]
+    activator_pin: int
+    activation_duration: float
+
+
+def load_config(path: str) -> List[ZoneConfig]:
+    """
+    Description
+    -----------
+    Read and check the zones in a config file.
+
+    Params
+    ------
+    :path: str
+    The JSON config file, see the module docstring for its layout.
+
+    Return
+    ------
+    List[ZoneConfig]
+    The zones in the config.
+    """
+    with open(path) as config_file:
+        config = json.load(config_file)
+    zones = [
+        ZoneConfig(
+            name=zone["name"],
+            sensor_pins=tuple(int(pin) for pin in zone["sensor_pins"]),
+            activator_pin=int(zone["activator_pin"]),
+            activation_duration=float(zone["activation_duration"]),
+        )
+        for zone in config["zones"]
+    ]
+    activator_pins = [zone.activator_pin for zone in zones]
+    if len(set(activator_pins)) != len(activator_pins):
+        raise ValueError(f"Each zone needs its own activator pin, got {activator_pins}.")
+    for zone in zones:
+        if not zone.sensor_pins:
+            raise ValueError(f"Zone {zone.name} has no sensor pins.")
+        if set(zone.sensor_pins) & set(activator_pins):
+            raise ValueError(f"Zone {zone.name} uses an activator pin as a sensor pin.")
+        bad_pins = [pin for pin in zone.sensor_pins + (zone.activator_pin,) if pin not in GPIO_PINS]
+        if bad_pins:
+            raise ValueError(f"Zone {zone.name} uses pins {bad_pins} which are not GPIO pins.")
+        if not math.isfinite(zone.activation_duration) or zone.activation_duration <= 0:
+            raise ValueError(f"Zone {zone.name} needs an activation duration above 0 seconds.")
+    return zones
+
+
+class ZoneManager:
+    def __init__(self, config_path: str, scheduler: DeadlineScheduler = None) -> None:
+        """
+        Description
+        -----------
+        Sets up every zone in the config file.
+
+        Params
+        ------
+        :config_path: str
+        The JSON config file, see the module docstring for its layout.
+
+        :scheduler: DeadlineScheduler = None
+        The scheduler that turns the activators off, one is created if not
+        given.
+        """
+        self.config_path = config_path
+        self.scheduler = scheduler or DeadlineScheduler()
+        self.sensors: Dict[int, MotionSensor] = {}
+        self.timers: Dict[int, TimedActivator] = {}
+        self.zones: Dict[str, ZoneConfig] = {}
+        # sensor pin -> the activators it drives, swapped out whole on reload
+        # so the gpiozero callback threads never see it half updated.
+        self._routes: Dict[int, Tuple[TimedActivator, ...]] = {}
+        self._reload_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._reload_requested = False
+        self._stopped = False
+        self.reload()
+
+    def _sense_motion(self, sensor_pin: int) -> None:
+        for timer in self._routes.get(sensor_pin, ()):
+            timer.trigger()
+        LOGGER.debug(f"Motion detected on {sensor_pin=}.")
+
+    def reload(self) -> None:
+        """
+        Description
+        -----------
+        Read the config file again and apply it, opening the pins of new
+        zones, closing the pins of removed ones and updating the rest in place.
+        If the config is broken, or a new pin can't be opened, the zones
+        already running are left alone. Moving a pin from a sensor to an
+        activator or back needs a restart.
+        """
+        with self._reload_lock:
+            try:
+                zones = load_config(self.config_path)
+            except (OSError, KeyError, TypeError, ValueError) as e:
+                LOGGER.error(f"Could not load {self.config_path}, keeping the current zones: {e!r}")
+                return
+
+            wanted_activators = {zone.activator_pin: zone for zone in zones}
+            wanted_sensors = {pin for zone in zones for pin in zone.sensor_pins}
+            moved = (set(wanted_activators) & set(self.sensors)) | (wanted_sensors & set(self.timers))
+            if moved:
+                LOGGER.error(
+                    f"Cannot move pins {sorted(moved)} between sensors and activators without "
+                    "a restart, keeping the current zones."
+                )
+                return
+
+            # Open every new pin before touching the running zones, so a pin
+            # that is busy or broken leaves them as they were
+            new_timers: Dict[int, TimedActivator] = {}
+            new_sensors: Dict[int, MotionSensor] = {}
+            opened = []
+            try:
+                for pin in set(wanted_activators) - set(self.timers):
+                    led = LED(pin)
+                    opened.append(led)
+                    new_timers[pin] = TimedActivator(
+                        led, wanted_activators[pin].activation_duration, self.scheduler
+                    )
+                for pin in wanted_sensors - set(self.sensors):
+                    sensor = MotionSensor(pin)
+                    opened.append(sensor)
+                    sensor.when_motion = lambda pin=pin: self._sense_motion(pin)
+                    new_sensors[pin] = sensor
+            except (GPIOZeroError, OSError, ValueError) as e:
+                for device in opened:
+                    device.close()
+                LOGGER.error(f"Could not open the pins in {self.config_path}, keeping the current zones: {e!r}")
+                return
+
+            for pin, timer in self.timers.items():
+                if pin in wanted_activators:
+                    timer.activation_duration = wanted_activators[pin].activation_duration
+            timers = {pin: timer for pin, timer in self.timers.items() if pin in wanted_activators}
+            timers.update(new_timers)
+
+            # Route motion away from the removed activators before shutting
+            # them down, so a callback can't switch on one that is closed
+            routes: Dict[int, List[TimedActivator]] = {}
+            for zone in zones:
+                for sensor_pin in zone.sensor_pins:
+                    routes.setdefault(sensor_pin, []).append(timers[zone.activator_pin])
+            self._routes = {pin: tuple(targets) for pin, targets in routes.items()}
+            removed_timers = [timer for pin, timer in self.timers.items() if pin not in wanted_activators]
+            self.timers = timers
+            removed_sensors = [sensor for pin, sensor in self.sensors.items() if pin not in wanted_sensors]
+            self.sensors = {pin: sensor for pin, sensor in self.sensors.items() if pin in wanted_sensors}
+            self.sensors.update(new_sensors)
+
+            for timer in removed_timers:
+                timer.shutdown()
+                timer.device.close()
+            for sensor in removed_sensors:
+                sensor.close()
+
+            self.zones = {zone.name: zone for zone in zones}
+            LOGGER.info(
+                f"Loaded {len(self.zones)} zones from {self.config_path}: " +
+                ", ".join(
+                    f"{zone.name} ({list(zone.sensor_pins)} -> {zone.activator_pin} " +
+                    f"for {zone.activation_duration}s)"
+                    for zone in zones
+                )
+            )
+
+    def request_reload(self, *_) -> None:
+        """Reload the config from the `run()` loop, safe to call from a signal handler."""
+        self._reload_requested = True
+        self._wake.set()
+
+    def stop(self) -> None:
+        """Makes `run()` return."""
+        self._stopped = True
+        self._wake.set()
+
+    def run(self) -> None:
+        LOGGER.info("Beginning to watch the zones...")
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, self.request_reload)
+        self.scheduler.start()
+        try:
+            while not self._stopped:
+                self._wake.wait()
+                self._wake.clear()
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+        finally:
+            LOGGER.error("Zone manager shutdown detected! Shutting things off.")
+            self.scheduler.stop()
+            for timer in self.timers.values():
+                timer.shutdown()
+                timer.device.close()
+            for sensor in self.sensors.values():
+                sensor.close()
+            LOGGER.debug("Done.")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--config", required=True, help="The JSON zone config file.")
+
+    args = parser.parse_args()
+
+    ZoneManager(args.config).run()
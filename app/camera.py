@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Keeps the camera warm and hands out frames on request.
+
+Starting `raspistill -o - -t 1` for every picture pays for the process
+starting, the camera powering up and the auto exposure settling, which is
+around a second before the first byte shows up. `CaptureService` keeps one
+frame source running for as long as it lives instead, so a picture costs
+only the capture itself, and a request can take the latest frame if it is
+fresh enough without capturing at all.
+
+Frame sources
+-------------
+- RaspistillSource: one long running raspistill, either in signal mode
+  (a frame is taken each time it is sent SIGUSR1) or timelapse mode (it
+  takes frames continuously and the newest is handed out)
+- OneShotSource: the old way, a new raspistill per frame, for comparison
+- FakeFrameSource: pretends to be a camera with a warm up and a per frame
+  cost, so the service can be tried out and timed without one
+
+Running the Program
+-------------------
+./camera.py --fake                 # time one shot against warm captures
+./camera.py --fake --count 50
+./camera.py --mode timelapse       # the same with the real camera
+"""
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from time import monotonic, perf_counter, sleep
+from typing import List, NamedTuple, Optional
+
+from logs import get_logger
+
+LOGGER = get_logger("Camera")
+
+SIGNAL = "signal"
+TIMELAPSE = "timelapse"
+FRAME_PATTERN = "frame%04d.jpg"
+FRAME_PREFIX, FRAME_SUFFIX = "frame", ".jpg"
+# Seconds between checks for raspistill having finished writing a frame
+POLL_INTERVAL = 0.005
+# Lines of raspistill's stderr kept to explain it exiting
+ERROR_LINES = 20
+
+
+class CameraError(RuntimeError):
+    pass
+
+
+class Frame(NamedTuple):
+    data: bytes
+    # On the monotonic clock
+    captured_at: float
+    number: int
+
+
+class RaspistillSource:
+    def __init__(
+        self,
+        mode: str = SIGNAL,
+        interval: float = 0.5,
+        args: Optional[List[str]] = None,
+        directory: Optional[str] = None,
+        timeout: float = 10.0,
+    ) -> None:
+        """
+        Description
+        -----------
+        One raspistill kept running for as long as the source is open.
+
+        raspistill writes each frame to a temporary name and renames it once
+        it is complete, so a frame is only read once its final name shows up.
+        In TIMELAPSE mode all but the newest frame are deleted every
+        `interval` whether or not anything asks for one, so the directory
+        (memory, in /dev/shm) never fills up.
+        Whatever it writes to stderr is logged as it comes, so the pipe never
+        fills up and stalls it.
+
+        Params
+        ------
+        :mode: str = SIGNAL
+        SIGNAL to take a frame on every `capture()`, or TIMELAPSE to have
+        raspistill take one every `interval` seconds and hand out the newest.
+
+        :interval: float = 0.5
+        Seconds between frames in TIMELAPSE mode.
+
+        :args: Optional[List[str]] = None
+        Any other raspistill arguments, like ["-w", "1280", "-h", "720"].
+
+        :directory: Optional[str] = None
+        Where raspistill writes frames, a new directory in /dev/shm (memory,
+        to spare the SD card) if there is one, else the temp directory, and
+        removed again on `close()`.
+
+        :timeout: float = 10.0
+        Seconds to wait for a frame before giving up.
+        """
+        if mode not in (SIGNAL, TIMELAPSE):
+            raise ValueError(f"Unknown raspistill mode {mode}, use {SIGNAL} or {TIMELAPSE}.")
+        self.mode = mode
+        self.interval = interval
+        self.args = list(args or [])
+        self.directory = directory
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self._number = 0
+        self._own_directory = False
+        self._errors: deque = deque(maxlen=ERROR_LINES)
+        self._stderr_reader: Optional[threading.Thread] = None
+        # Held while picking out or deleting timelapse frames, so a frame
+        # being handed out is never pruned from under it
+        self._frames_lock = threading.Lock()
+        self._pruner: Optional[threading.Thread] = None
+        self._stop_pruning = threading.Event()
+
+    def start(self) -> None:
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(
+                prefix="raspistill-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None
+            )
+            self._own_directory = True
+        command = ["raspistill", "-t", "0", "-o", os.path.join(self.directory, FRAME_PATTERN)]
+        if self.mode == SIGNAL:
+            command.append("-s")
+        else:
+            command += ["-tl", str(int(self.interval * 1000))]
+        self.process = subprocess.Popen(
+            command + self.args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        self._errors.clear()
+        self._stderr_reader = threading.Thread(
+            target=self._read_stderr, args=(self.process.stderr,), name="RaspistillStderr", daemon=True
+        )
+        self._stderr_reader.start()
+        LOGGER.info(f"Started {' '.join(command + self.args)}")
+        if self.mode == SIGNAL:
+            self._wait_for_signal_handler()
+        else:
+            self._stop_pruning.clear()
+            self._pruner = threading.Thread(target=self._prune_loop, name="RaspistillPruner", daemon=True)
+            self._pruner.start()
+
+    def _read_stderr(self, stderr) -> None:
+        for line in stderr:
+            line = line.decode("utf-8", "replace").rstrip()
+            if line:
+                self._errors.append(line)
+                LOGGER.warning(f"raspistill: {line}")
+
+    def _ready_for_signal(self) -> Optional[bool]:
+        """Whether SIGUSR1 would be taken rather than kill raspistill, None if /proc can't tell."""
+        proc = f"/proc/{self.process.pid}"
+        usr1 = 1 << (signal.SIGUSR1 - 1)
+        try:
+            with open(f"{proc}/status") as status_file:
+                masks = [
+                    int(line.split()[1], 16) for line in status_file
+                    if line.startswith(("SigCgt:", "SigBlk:", "SigIgn:"))
+                ]
+        except OSError:
+            return None
+        if any(mask & usr1 for mask in masks):
+            return True
+        # While in sigwait the kernel shows the signals waited for as
+        # unblocked, so look for it waiting there instead
+        try:
+            with open(f"{proc}/wchan") as wchan_file:
+                return "sigtimedwait" in wchan_file.read()
+        except OSError:
+            return False
+
+    def _wait_for_signal_handler(self) -> None:
+        """
+        SIGUSR1 kills raspistill until it has set up its handler for it, so
+        wait for that to show up in /proc before the first capture. Catching
+        it, blocking it to take it with sigwait (which raspistill does) or
+        ignoring it all mean it no longer kills the process.
+        """
+        deadline = monotonic() + self.timeout
+        while True:
+            ready = self._ready_for_signal()
+            if ready is None:
+                # No /proc to check, the first capture will have to take its chances
+                return
+            if ready:
+                return
+            self._check_alive()
+            if monotonic() > deadline:
+                LOGGER.warning(
+                    f"Could not tell if raspistill was ready for captures after {self.timeout}s, "
+                    "going ahead anyway."
+                )
+                return
+            sleep(POLL_INTERVAL)
+
+    def _frame_path(self, number: int) -> str:
+        return os.path.join(self.directory, FRAME_PATTERN % number)
+
+    def _check_alive(self) -> None:
+        if self.process is None:
+            raise CameraError("The camera has not been started.")
+        if self.process.poll() is not None:
+            # Let the reader catch up with whatever it said on the way out
+            self._stderr_reader.join(1.0)
+            raise CameraError(
+                f"raspistill exited with {self.process.returncode}: " + "\n".join(self._errors)
+            )
+
+    def _finished_frames(self) -> List[str]:
+        """The finished frames' names, oldest first by their number."""
+        numbered = []
+        for name in os.listdir(self.directory):
+            number = name[len(FRAME_PREFIX):-len(FRAME_SUFFIX)]
+            if name.startswith(FRAME_PREFIX) and name.endswith(FRAME_SUFFIX) and number.isdigit():
+                # Sorted by number, past 9999 the names no longer sort as text
+                numbered.append((int(number), name))
+        return [name for _, name in sorted(numbered)]
+
+    def _prune(self) -> Optional[str]:
+        """Delete all but the newest finished frame. Call with the frames lock held."""
+        finished = self._finished_frames()
+        for name in finished[:-1]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        return finished[-1] if finished else None
+
+    def _prune_loop(self) -> None:
+        while not self._stop_pruning.wait(self.interval):
+            try:
+                with self._frames_lock:
+                    self._prune()
+            except OSError as e:
+                LOGGER.error(f"Could not prune old frames from {self.directory}: {e!r}")
+
+    def _read(self, path: str) -> bytes:
+        with open(path, "rb") as frame_file:
+            data = frame_file.read()
+        os.unlink(path)
+        return data
+
+    def capture(self) -> bytes:
+        self._check_alive()
+        deadline = monotonic() + self.timeout
+        if self.mode == SIGNAL:
+            path = self._frame_path(self._number)
+            self.process.send_signal(signal.SIGUSR1)
+            while not os.path.exists(path):
+                if monotonic() > deadline:
+                    raise CameraError(f"No frame from raspistill after {self.timeout}s.")
+                self._check_alive()
+                sleep(POLL_INTERVAL)
+            self._number += 1
+            return self._read(path)
+        # Hand out the newest finished frame, dropping any older ones
+        while True:
+            with self._frames_lock:
+                newest = self._prune()
+                if newest is not None:
+                    return self._read(os.path.join(self.directory, newest))
+            if monotonic() > deadline:
+                raise CameraError(f"No frame from raspistill after {self.timeout}s.")
+            self._check_alive()
+            sleep(POLL_INTERVAL)
+
+    def close(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+        if self._pruner is not None:
+            self._stop_pruning.set()
+            self._pruner.join()
+            self._pruner = None
+        if self._stderr_reader is not None:
+            self._stderr_reader.join(1.0)
+            self._stderr_reader = None
+        self.process = None
+        if self._own_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self._own_directory = False
+        self._number = 0
+
+
+class OneShotSource:
+    def __init__(self, args: Optional[List[str]] = None) -> None:
+        """
+        Description
+        -----------
+        A new `raspistill -o - -t 1` for every frame, the way
+        `capture_and_send_image.py` has always done it.
+
+        Params
+        ------
+        :args: Optional[List[str]] = None
+        Any other raspistill arguments.
+        """
+        self.args = list(args or [])
+
+    def start(self) -> None:
+        pass
+
+    def capture(self) -> bytes:
+        output = subprocess.run(
+            ["raspistill", "-o", "-", "-t", "1"] + self.args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if output.returncode or not output.stdout:
+            raise CameraError(output.stderr.decode("utf-8", "replace"))
+        return output.stdout
+
+    def close(self) -> None:
+        pass
+
+
+class FakeFrameSource:
+    def __init__(
+        self,
+        warm_up: float = 1.0,
+        frame_time: float = 0.05,
+        frame_size: int = 256 * 1024,
+        one_shot: bool = False,
+    ) -> None:
+        """
+        Description
+        -----------
+        Pretends to be a camera: starting it takes `warm_up` seconds and each
+        frame `frame_time` seconds more. The frames are made up JPEG sized
+        bytes, numbered so they can be told apart.
+
+        Params
+        ------
+        :warm_up: float = 1.0
+        Seconds for the pretend process to start and the exposure to settle.
+
+        :frame_time: float = 0.05
+        Seconds to take each frame once warm.
+
+        :frame_size: int = 256 * 1024
+        How many bytes each frame is.
+
+        :one_shot: bool = False
+        Pay the warm up for every frame, like OneShotSource.
+        """
+        self.warm_up = warm_up
+        self.frame_time = frame_time
+        self.frame_size = frame_size
+        self.one_shot = one_shot
+        self.frames = 0
+        self._warm = False
+
+    def start(self) -> None:
+        if not self.one_shot:
+            sleep(self.warm_up)
+            self._warm = True
+
+    def capture(self) -> bytes:
+        if not self._warm:
+            sleep(self.warm_up)
+        sleep(self.frame_time)
+        self.frames += 1
+        # JPEG start and end markers around a numbered filler
+        body = f"fake frame {self.frames}".encode().ljust(self.frame_size - 4, b"\0")
+        return b"\xff\xd8" + body + b"\xff\xd9"
+
+    def close(self) -> None:
+        self._warm = False
+
+
+class CaptureService:
+    def __init__(self, source: object) -> None:
+        """
+        Description
+        -----------
+        Keeps a frame source open and hands out frames from it to any number
+        of threads. Only one capture runs at a time, and a request that comes
+        in while one is running waits for that frame instead of taking
+        another.
+
+        Params
+        ------
+        :source: object
+        Anything with `start()`, `capture() -> bytes` and `close()`, like
+        RaspistillSource or FakeFrameSource.
+        """
+        self.source = source
+        self.latest: Optional[Frame] = None
+        self.captures = 0
+        self.served = 0
+        self.served_cached = 0
+        self._condition = threading.Condition()
+        self._capturing = False
+        self._started = False
+
+    def start(self) -> None:
+        """Start the source now instead of on the first request."""
+        with self._condition:
+            if not self._started:
+                self.source.start()
+                self._started = True
+
+    def frame(self, max_age: float = 0.0, shared: bool = True) -> Frame:
+        """
+        Description
+        -----------
+        A frame no older than `max_age` seconds.
+
+        Params
+        ------
+        :max_age: float = 0.0
+        How old a frame already taken can be and still be handed out, 0
+        for a new one every time.
+
+        :shared: bool = True
+        Whether a capture already running when this is asked for will do.
+        False waits for it to finish and then takes another, so callers
+        that each need their own picture never get the same one.
+
+        Return
+        ------
+        Frame
+        The frame.
+        """
+        self.start()
+        requested_at = monotonic()
+        with self._condition:
+            while True:
+                latest = self.latest
+                if shared and latest is not None and latest.captured_at >= requested_at - max_age:
+                    self.served += 1
+                    self.served_cached += latest.captured_at < requested_at
+                    return latest
+                if not self._capturing:
+                    break
+                # Somebody else is capturing, that frame will do if shared,
+                # else wait for the camera to be free
+                self._condition.wait()
+            self._capturing = True
+        captured = None
+        try:
+            captured = Frame(self.source.capture(), monotonic(), self.captures)
+        finally:
+            with self._condition:
+                self._capturing = False
+                if captured is not None:
+                    self.latest = captured
+                    self.captures += 1
+                    self.served += 1
+                self._condition.notify_all()
+        return captured
+
+    def close(self) -> None:
+        with self._condition:
+            if self._started:
+                self.source.close()
+                self._started = False
+
+
+def time_captures(source: object, count: int) -> dict:
+    """
+    Description
+    -----------
+    Time `count` frames from a fresh service over a source.
+
+    Params
+    ------
+    :source: object
+    The frame source.
+
+    :count: int
+    How many frames to take.
+
+    Return
+    ------
+    dict
+    The time to the first frame, the mean time per frame after it and the
+    frames per second overall.
+    """
+    service = CaptureService(source)
+    started = perf_counter()
+    try:
+        service.frame()
+        first = perf_counter() - started
+        for _ in range(count - 1):
+            service.frame()
+    finally:
+        service.close()
+    total = perf_counter() - started
+    return {
+        "first_frame_seconds": first,
+        "seconds_per_frame": (total - first) / max(count - 1, 1),
+        "frames_per_second": count / total,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--fake", action="store_true", help="Use FakeFrameSource instead of the camera.")
+    parser.add_argument("--mode", choices=(SIGNAL, TIMELAPSE), default=SIGNAL)
+    parser.add_argument("--count", type=int, default=10, help="Frames to take each way. (default: 10)")
+
+    args = parser.parse_args()
+
+    if args.fake:
+        one_shot, warm = FakeFrameSource(one_shot=True), FakeFrameSource()
+    else:
+        one_shot, warm = OneShotSource(), RaspistillSource(mode=args.mode)
+    print(json.dumps({
+        "one_shot": time_captures(one_shot, args.count),
+        "warm": time_captures(warm, args.count),
+    }, indent=2))
@@ -3,25 +3,57 @@
 This application is to be used on a RaspberryPi that has the camera installed
 and turned on as well as the `raspistill' cli tool for taking pictures.
 
-Essentially this will take the picture and stream the image to stdout in
-base64. The client that picks up this bas64 encoded string can then
-decode it, save it to disk and display it themselves.
+Essentially this will take the picture and stream the image to stdout as
+framed binary (see `framing.py`): some metadata, the raw JPEG, and an error
+message instead if anything goes wrong. The client reads it back with
+`framing.read_image` (or `./framing.py --output picture.jpg`), save it to
+disk and display it themselves.
+
+`--base64` sends the picture as plain base64 instead, for the clients that
+expect that. The picture is streamed from raspistill to stdout a chunk at a
+time either way, so memory use stays the same whatever the resolution, and
+`--base64 --buffered` reads the whole picture in first the way this always
+used to. Streamed base64 is only ever the picture, if raspistill fails what
+it said goes to stderr and the exit code is 1.
+
+`--min_change` only sends the picture if it looks different enough from the
+last one this sent (see `frame_change.py`), remembering that one in
+`--state_file` between runs. The picture has to be read in whole to compare
+it, and when it is held back only the metadata is sent (with "unchanged"
+set and the bytes saved), or with `--base64` nothing at all and the exit
+code is 3.
 """
+import os
 import sys
 import base64
+import binascii
 import subprocess
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
 
-from logs import get_logger
+from framing import IMAGE, write_error, write_message, write_metadata
+from logs import get_logger, set_log_stream
 
 LOGGER = get_logger()
 
+# A multiple of 3 bytes so that every chunk but the last encodes to base64
+# without padding, and the chunks joined up are the same as encoding it whole
+CHUNK_SIZE = 3 * 16 * 1024
+RASPISTILL = ['raspistill', '-o', '-', '-t', '1']
+# Where --min_change remembers the last picture sent between runs
+STATE_FILE = os.path.join(tempfile.gettempdir(), 'capture_and_send_image.last.npz')
+# The exit code with --base64 when the picture was held back
+UNCHANGED = 3
+
 
 def take_picture() -> bytes:
     """Takes the picture and streams the data to bytes"""
     # Not useing the check=True flag because if this fails I want to
     # pass that further downstream to the client application.
     output = subprocess.run(
-        ['raspistill', '-o', '-', '-t', '1'],
+        RASPISTILL,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE
     )
@@ -34,6 +66,263 @@ def take_picture() -> bytes:
         return base64.standard_b64encode(output.stdout)
 
 
+def _read_chunks(pipe: BinaryIO, chunk_size: int) -> Iterator[memoryview]:
+    """
+    Read a pipe a full chunk at a time into one buffer reused for every
+    chunk, each chunk has to be used up before asking for the next.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        # Pipes hand over whatever they have, fill the chunk up first
+        filled = 0
+        while filled < chunk_size:
+            read = pipe.readinto(view[filled:])
+            if not read:
+                break
+            filled += read
+        if filled:
+            yield view[:filled]
+        if filled < chunk_size:
+            return
+
+
+def _start_raspistill() -> subprocess.Popen:
+    # Unbuffered so the pipe is read straight into the chunk buffer
+    return subprocess.Popen(RASPISTILL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+
+def _collect_stderr(process: subprocess.Popen) -> Callable[[], str]:
+    """
+    Read the process's stderr on a thread while its stdout is being read, so
+    a chatty raspistill can't fill the pipe and stall. Returns a function
+    that waits for the process to finish and gives back all it said.
+    """
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    reader.start()
+
+    def finish() -> str:
+        reader.join()
+        process.wait()
+        return b"".join(errors).decode('utf-8', 'replace')
+    return finish
+
+
+def send_picture(output: Optional[BinaryIO] = None, chunk_size: int = CHUNK_SIZE) -> bool:
+    """
+    Description
+    -----------
+    Takes the picture and streams it as framed binary as it comes off the
+    camera: a metadata message, the picture, then an error message if
+    raspistill had anything to say.
+
+    Params
+    ------
+    :output: Optional[BinaryIO] = None
+    Where to write the frames, stdout by default.
+
+    :chunk_size: int = CHUNK_SIZE
+    How many bytes of the picture to send per frame.
+
+    Return
+    ------
+    bool
+    Whether the picture was taken without errors.
+    """
+    if output is None:
+        sys.stdout.flush()
+        output = sys.stdout.buffer
+    write_metadata(output, {
+        "command": " ".join(RASPISTILL),
+        "taken_at": datetime.now(timezone.utc).isoformat(),
+    })
+    try:
+        process = _start_raspistill()
+    except OSError as e:
+        # The metadata is already out, finish with an error so the client
+        # isn't left with half a conversation
+        errors = f"Could not start {RASPISTILL[0]}: {e}"
+        LOGGER.error(errors)
+        write_error(output, errors)
+        output.flush()
+        return False
+    finish = _collect_stderr(process)
+    sent = write_message(output, IMAGE, _read_chunks(process.stdout, chunk_size))
+    errors = finish()
+    if process.returncode and not errors:
+        errors = f"raspistill exited with {process.returncode} after {sent} bytes."
+    if errors:
+        LOGGER.error('Encountered an error!')
+        LOGGER.error(errors)
+        write_error(output, errors)
+    output.flush()
+    return not errors
+
+
+def stream_picture(output: Optional[BinaryIO] = None, chunk_size: int = CHUNK_SIZE) -> bool:
+    """
+    Description
+    -----------
+    Takes the picture and streams it base64 encoded as it comes off the
+    camera. raspistill's output is read into one buffer that is reused for
+    every chunk, so only a chunk of the picture is ever held at a time.
+    Anything raspistill has to say goes to stderr, never into the base64.
+
+    Params
+    ------
+    :output: Optional[BinaryIO] = None
+    Where to write the base64, stdout by default.
+
+    :chunk_size: int = CHUNK_SIZE
+    How many bytes of the picture to encode at a time, a multiple of 3.
+
+    Return
+    ------
+    bool
+    Whether the picture was taken without errors.
+    """
+    if chunk_size % 3:
+        raise ValueError(f"Cannot stream base64 in chunks of {chunk_size}, use a multiple of 3.")
+    if output is None:
+        sys.stdout.flush()
+        output = sys.stdout.buffer
+    process = _start_raspistill()
+    finish = _collect_stderr(process)
+    streamed = 0
+    for chunk in _read_chunks(process.stdout, chunk_size):
+        # The standard library can't encode into an existing buffer, this
+        # chunk's encoding is the only other copy made
+        output.write(binascii.b2a_base64(chunk, newline=False))
+        streamed += len(chunk)
+    output.flush()
+    errors = finish()
+    if process.returncode and not errors:
+        errors = f"raspistill exited with {process.returncode} after {streamed} bytes."
+    if errors:
+        LOGGER.error('Encountered an error, see stderr.')
+        sys.stderr.write(errors)
+        sys.stderr.flush()
+    return not errors
+
+
+def take_picture_if_changed(
+    min_change: float,
+    state_file: str = STATE_FILE,
+) -> Tuple[Optional[bytes], str, Dict[str, Any]]:
+    """
+    Description
+    -----------
+    Takes the picture and checks it against the last one sent, remembering
+    it as the last one sent if it changed enough.
+
+    Params
+    ------
+    :min_change: float
+    How different it has to be, see `frame_change.ChangeDetector`.
+
+    :state_file: str = STATE_FILE
+    Where the last picture sent is remembered between runs.
+
+    Return
+    ------
+    Tuple[Optional[bytes], str, Dict[str, Any]]
+    The picture (None if it was held back or couldn't be taken), what
+    raspistill had to say if it failed, and metadata about the check.
+    """
+    # Only needed, along with Pillow and NumPy, when asked for
+    from frame_change import ChangeDetector
+
+    try:
+        output = subprocess.run(RASPISTILL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        return None, f"Could not start {RASPISTILL[0]}: {e}", {}
+    errors = output.stderr.decode('utf-8', 'replace')
+    if output.returncode and not errors:
+        errors = f"raspistill exited with {output.returncode}."
+    if errors or not output.stdout:
+        return None, errors or "raspistill sent no picture.", {}
+    detector = ChangeDetector(min_change)
+    detector.load(state_file)
+    changed = detector.check(output.stdout)
+    metadata = {"unchanged": not changed, "change": detector.last_score}
+    if changed:
+        detector.save(state_file)
+        return output.stdout, "", metadata
+    metadata["bytes_saved"] = len(output.stdout)
+    LOGGER.info(f"Held back a {len(output.stdout)} byte picture, it hasn't changed enough.")
+    return None, "", metadata
+
+
+def _send_if_changed(min_change: float, state_file: str, as_base64: bool) -> int:
+    picture, errors, metadata = take_picture_if_changed(min_change, state_file)
+    if as_base64:
+        if errors:
+            sys.stderr.write(errors)
+            return 1
+        if picture is None:
+            return UNCHANGED
+        sys.stdout.write(base64.standard_b64encode(picture).decode('utf-8'))
+        return 0
+    sys.stdout.flush()
+    output = sys.stdout.buffer
+    write_metadata(output, {
+        "command": " ".join(RASPISTILL),
+        "taken_at": datetime.now(timezone.utc).isoformat(),
+        **metadata,
+    })
+    if errors:
+        write_error(output, errors)
+    elif picture is not None:
+        write_message(output, IMAGE, [picture])
+    output.flush()
+    return 1 if errors else 0
+
+
 if __name__ == "__main__":
-    picture = take_picture()
-    sys.stdout.write(picture.decode('utf-8'))
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        '--base64',
+        action='store_true',
+        help="Send the picture as plain base64 rather than framed binary."
+    )
+    parser.add_argument(
+        '--buffered',
+        action='store_true',
+        help="With --base64, read the whole picture in before sending it."
+    )
+    parser.add_argument(
+        '--min_change',
+        type=float,
+        default=None,
+        help="Only send the picture if it differs from the last one sent by this much, see frame_change.py."
+    )
+    parser.add_argument(
+        '--state_file',
+        default=STATE_FILE,
+        help=f"With --min_change, where to remember the last picture sent. (default: {STATE_FILE})"
+    )
+    args = parser.parse_args()
+
+    if args.min_change is not None:
+        set_log_stream(sys.stderr)
+        sys.exit(_send_if_changed(args.min_change, args.state_file, args.base64))
+    elif not args.base64:
+        # Keep the logs out of the frames
+        set_log_stream(sys.stderr)
+        sys.exit(0 if send_picture() else 1)
+    elif args.buffered:
+        picture = take_picture()
+        if isinstance(picture, str):
+            # The error from raspistill, passed on as is
+            sys.stdout.write(picture)
+            sys.exit(1)
+        sys.stdout.write(picture.decode('utf-8'))
+    else:
+        set_log_stream(sys.stderr)
+        sys.exit(0 if stream_picture() else 1)
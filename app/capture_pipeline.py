@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Takes pictures when motion is sensed without ever holding up the sensor.
+
+A trigger (from a gpiozero callback, say) only puts a note on a small
+bounded queue and returns. A pool of workers takes the notes off, captures a
+frame each and hands it to every sink: files on disk, stdout or a socket,
+the last two framed the same way `capture_and_send_image.py` sends them (see
+`framing.py`). When the camera can't keep up the queue fills, and rather than
+piling up captures the policy decides what gives:
+
+- merge: triggers that come in while the queue is full are folded into the
+  newest waiting one, so a burst of motion becomes one picture (the default)
+- drop_newest: new triggers are dropped while the queue is full
+- drop_oldest: the oldest waiting trigger is dropped to make room
+
+Counts of triggers, captures, merges and drops are kept in `stats`.
+
+There is only one camera, so with a `CaptureService` the workers take turns
+at it and each asks for a frame of its own (`shared=False`) rather than
+sharing one that is already being taken, which would send the same picture
+once per worker. More workers then help by sending one picture while the
+next is taken, not by taking pictures at once.
+
+With a `frame_change.ChangeDetector` (`--min_change` from the command line)
+pictures that look the same as the last one sent are held back before they
+reach the sinks, and the bytes that saved are counted.
+
+To take pictures from `MotionActivated`, hand it the pipeline's trigger:
+
+```
+service = CaptureService(RaspistillSource())
+pipeline = CapturePipeline(lambda: service.frame(shared=False).data, [FileSink("/home/pi/motion")])
+pipeline.start()
+MotionActivated(14, 15, 60, on_motion=pipeline.trigger).run()
+```
+
+Running the Program
+-------------------
+./capture_pipeline.py --sensor_pin 14 --directory /home/pi/motion
+./capture_pipeline.py --sensor_pin 14 --socket 192.168.1.10:8765
+./capture_pipeline.py --fake --triggers 100 --policy drop_oldest
+./capture_pipeline.py --sensor_pin 14 --socket 192.168.1.10:8765 --min_change 2
+"""
+import os
+import socket
+import sys
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from time import monotonic, sleep
+from typing import BinaryIO, Callable, Deque, List, Optional, Tuple, Union
+
+from camera import CaptureService, FakeFrameSource, RaspistillSource
+from framing import IMAGE, write_message, write_metadata
+from logs import get_logger, set_log_stream
+
+LOGGER = get_logger("CapturePipeline")
+
+MERGE = "merge"
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+POLICIES = (MERGE, DROP_NEWEST, DROP_OLDEST)
+
+
+@dataclass
+class Trigger:
+    # On the monotonic clock and the wall clock
+    at: float
+    wall: float
+    # How many triggers this one stands for after merging
+    count: int = 1
+
+
+@dataclass
+class PipelineStats:
+    """
+    Description
+    -----------
+    Running totals for the pipeline
+    """
+    triggers: int = 0
+    merged: int = 0
+    dropped: int = 0
+    captures: int = 0
+    capture_failures: int = 0
+    sink_failures: int = 0
+    unchanged: int = 0
+    bytes_captured: int = 0
+    bytes_saved: int = 0
+
+
+class FileSink:
+    def __init__(self, directory: str, name_format: str = "motion-%Y%m%d-%H%M%S-{number:05d}.jpg") -> None:
+        """
+        Description
+        -----------
+        Saves every frame to its own file.
+
+        Params
+        ------
+        :directory: str
+        Where to save them, created if need be.
+
+        :name_format: str = "motion-%Y%m%d-%H%M%S-{number:05d}.jpg"
+        The file name, strftime'd with when it was triggered and then
+        formatted with a running `number`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name_format = name_format
+        self._number = 0
+        self._lock = threading.Lock()
+
+    def send(self, frame: bytes, trigger: Trigger) -> None:
+        with self._lock:
+            number = self._number
+            self._number += 1
+        name = datetime.fromtimestamp(trigger.wall).strftime(self.name_format).format(number=number)
+        # Written under a temporary name so nothing reads it half written
+        path = os.path.join(self.directory, name)
+        with open(path + "~", "wb") as frame_file:
+            frame_file.write(frame)
+        os.replace(path + "~", path)
+
+    def close(self) -> None:
+        pass
+
+
+class StreamSink:
+    def __init__(self, stream: Optional[BinaryIO] = None) -> None:
+        """
+        Description
+        -----------
+        Writes every frame to a stream as framed binary.
+
+        Params
+        ------
+        :stream: Optional[BinaryIO] = None
+        Where to write them, stdout by default.
+        """
+        self.stream = stream or sys.stdout.buffer
+        self._lock = threading.Lock()
+
+    def send(self, frame: bytes, trigger: Trigger) -> None:
+        with self._lock:
+            _write_framed(self.stream, frame, trigger)
+            self.stream.flush()
+
+    def close(self) -> None:
+        self.stream.flush()
+
+
+class SocketSink:
+    def __init__(self, address: Union[str, Tuple[str, int]], timeout: float = 10.0) -> None:
+        """
+        Description
+        -----------
+        Sends every frame as framed binary over one connection, connecting
+        again the next time round if it drops.
+
+        Params
+        ------
+        :address: Union[str, Tuple[str, int]]
+        A unix socket path or a (host, port) to connect to.
+
+        :timeout: float = 10.0
+        Seconds to wait on the other end before giving up on a frame.
+        """
+        self.address = address
+        self.timeout = timeout
+        self._connection: Optional[socket.socket] = None
+        self._stream: Optional[BinaryIO] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> BinaryIO:
+        if self._stream is None:
+            if isinstance(self.address, str):
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                connection.settimeout(self.timeout)
+                connection.connect(self.address)
+            else:
+                connection = socket.create_connection(self.address, self.timeout)
+            self._connection = connection
+            self._stream = connection.makefile("wb")
+        return self._stream
+
+    def send(self, frame: bytes, trigger: Trigger) -> None:
+        with self._lock:
+            try:
+                stream = self._connect()
+                _write_framed(stream, frame, trigger)
+                stream.flush()
+            except OSError:
+                self._disconnect()
+                raise
+
+    def _disconnect(self) -> None:
+        for closeable in (self._stream, self._connection):
+            if closeable is not None:
+                try:
+                    closeable.close()
+                except OSError:
+                    pass
+        self._stream = self._connection = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+
+def _write_framed(stream: BinaryIO, frame: bytes, trigger: Trigger) -> None:
+    write_metadata(stream, {
+        "triggered_at": datetime.fromtimestamp(trigger.wall).astimezone().isoformat(),
+        "triggers": trigger.count,
+    })
+    write_message(stream, IMAGE, [frame])
+
+
+class CapturePipeline:
+    def __init__(
+        self,
+        capture: Callable[[], bytes],
+        sinks: List[object],
+        workers: int = 1,
+        queue_size: int = 1,
+        policy: str = MERGE,
+        detector: Optional[object] = None,
+    ) -> None:
+        """
+        Description
+        -----------
+        A bounded queue of capture triggers and the workers that serve it.
+
+        Params
+        ------
+        :capture: Callable[[], bytes]
+        Takes a picture, like `lambda: service.frame(shared=False).data` for a
+        `camera.CaptureService`.
+
+        :sinks: List[object]
+        Where the pictures go, anything with `send(frame, trigger)` and
+        `close()`.
+
+        :workers: int = 1
+        How many captures can run at once.
+
+        :queue_size: int = 1
+        How many triggers can wait for a worker.
+
+        :policy: str = MERGE
+        What happens to triggers that don't fit, see the module docstring.
+
+        :detector: Optional[object] = None
+        Anything with `check(frame) -> bool`, like a
+        `frame_change.ChangeDetector`, to hold back pictures that haven't
+        changed. Every picture is sent without one.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, use one of {', '.join(POLICIES)}.")
+        if workers < 1 or queue_size < 1:
+            raise ValueError("Cannot run a pipeline without workers or room for a trigger.")
+        self.capture = capture
+        self.sinks = list(sinks)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.policy = policy
+        self.detector = detector
+        self.stats = PipelineStats()
+        self._pending: Deque[Trigger] = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._busy = 0
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def queue_depth(self) -> int:
+        """How many triggers are waiting for a worker"""
+        with self._condition:
+            return len(self._pending)
+
+    def trigger(self) -> None:
+        """
+        Description
+        -----------
+        Ask for a picture. This never waits, so it is safe to call straight
+        from a gpiozero callback.
+        """
+        with self._condition:
+            self.stats.triggers += 1
+            if len(self._pending) >= self.queue_size:
+                if self.policy == MERGE:
+                    self._pending[-1].count += 1
+                    self.stats.merged += 1
+                    return
+                self.stats.dropped += 1
+                if self.policy != DROP_OLDEST:
+                    return
+                self._pending.popleft()
+            self._pending.append(Trigger(monotonic(), datetime.now().timestamp()))
+            self._condition.notify()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                trigger = self._pending.popleft()
+                self._busy += 1
+            try:
+                self._serve(trigger)
+            finally:
+                with self._condition:
+                    self._busy -= 1
+                    self._condition.notify_all()
+
+    def _serve(self, trigger: Trigger) -> None:
+        try:
+            frame = self.capture()
+        except Exception as e:
+            with self._condition:
+                self.stats.capture_failures += 1
+            LOGGER.error(f"Could not capture a picture: {e!r}")
+            return
+        with self._condition:
+            self.stats.captures += 1
+            self.stats.bytes_captured += len(frame)
+        if self.detector is not None and not self.detector.check(frame):
+            with self._condition:
+                self.stats.unchanged += 1
+                self.stats.bytes_saved += len(frame)
+            return
+        for sink in self.sinks:
+            try:
+                sink.send(frame, trigger)
+            except Exception as e:
+                with self._condition:
+                    self.stats.sink_failures += 1
+                LOGGER.error(f"Could not send a picture to {type(sink).__name__}: {e!r}")
+
+    def start(self) -> None:
+        with self._condition:
+            self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"CaptureWorker-{number}", daemon=True)
+            for number in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def wait(self) -> None:
+        """Wait for every trigger so far to be served."""
+        with self._condition:
+            while self._pending or self._busy:
+                self._condition.wait()
+
+    def stop(self, drain: bool = True) -> None:
+        """
+        Description
+        -----------
+        Stop the workers and close the sinks.
+
+        Params
+        ------
+        :drain: bool = True
+        Serve the triggers still waiting first, else drop them.
+        """
+        with self._condition:
+            if not drain:
+                self.stats.dropped += len(self._pending)
+                self._pending.clear()
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for sink in self.sinks:
+            sink.close()
+
+
+def _parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    host, _, port = address.rpartition(":")
+    return (host, int(port)) if host and port.isdigit() else address
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--sensor_pin", type=int, default=None, help="The PIR sensor's GPIO pin.")
+    parser.add_argument("--directory", default=None, help="Save pictures here.")
+    parser.add_argument("--stdout", action="store_true", help="Send pictures to stdout as framed binary.")
+    parser.add_argument("--socket", default=None, help="Send pictures to host:port or a unix socket path.")
+    parser.add_argument("--policy", choices=POLICIES, default=MERGE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--queue_size", type=int, default=1)
+    parser.add_argument(
+        "--min_change",
+        type=float,
+        default=None,
+        help="Only send pictures that differ from the last one sent by this much, see frame_change.py.",
+    )
+    parser.add_argument("--fake", action="store_true", help="Use a pretend camera and pretend motion.")
+    parser.add_argument("--triggers", type=int, default=50, help="With --fake, how many triggers to send.")
+    parser.add_argument(
+        "--trigger_interval",
+        type=float,
+        default=0.01,
+        help="With --fake, seconds between triggers. (default: 0.01)",
+    )
+
+    args = parser.parse_args()
+    if args.sensor_pin is None and not args.fake:
+        parser.error("Either give a --sensor_pin or try it out with --fake.")
+
+    sinks = []
+    if args.directory:
+        sinks.append(FileSink(args.directory))
+    if args.stdout:
+        # Keep the logs out of the frames
+        set_log_stream(sys.stderr)
+        sinks.append(StreamSink())
+    if args.socket:
+        sinks.append(SocketSink(_parse_address(args.socket)))
+
+    detector = None
+    if args.min_change is not None:
+        # Only needed, along with Pillow and NumPy, when asked for
+        from frame_change import ChangeDetector
+
+        detector = ChangeDetector(args.min_change)
+
+    service = CaptureService(FakeFrameSource() if args.fake else RaspistillSource())
+    service.start()
+    pipeline = CapturePipeline(
+        lambda: service.frame(shared=False).data,
+        sinks,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        policy=args.policy,
+        detector=detector,
+    )
+    pipeline.start()
+    try:
+        if args.fake:
+            for _ in range(args.triggers):
+                pipeline.trigger()
+                sleep(args.trigger_interval)
+            pipeline.wait()
+        else:
+            from gpiozero import MotionSensor
+
+            sensor = MotionSensor(args.sensor_pin)
+            sensor.when_motion = pipeline.trigger
+            LOGGER.info(f"Taking pictures on motion from {args.sensor_pin=}")
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop(drain=False)
+        service.close()
+        print(json.dumps(asdict(pipeline.stats)), file=sys.stderr)
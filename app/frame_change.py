@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Decides whether a picture is worth sending by comparing it with the last one
+that was sent, so a link with little bandwidth only carries pictures where
+something actually changed.
+
+Each picture is checked two ways:
+- its hash, which catches a camera handing back the very same frame
+- a small greyscale thumbnail, compared pixel by pixel with the thumbnail of
+  the last picture sent: the mean absolute difference (0 to 255) has to
+  reach the threshold for the picture to count as changed
+
+The thumbnail is decoded with Pillow's JPEG draft mode, which scales the
+picture down while decoding it rather than after, so checking a full size
+picture costs a few milliseconds rather than a full decode. It is always
+compared with the last picture *sent*, not just the last one seen, so a slow
+change (the light going down, say) still gets through once it adds up.
+
+Anything that can't be decoded is sent, the check only ever holds back
+pictures it is sure about.
+
+Running the Program
+-------------------
+./frame_change.py /home/pi/motion/*.jpg
+./frame_change.py --threshold 4 --size 80x60 /home/pi/motion/*.jpg
+"""
+import hashlib
+import io
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from logs import get_logger
+
+LOGGER = get_logger("FrameChange")
+
+# Mean absolute difference in greyscale levels, enough to get past sensor
+# noise and JPEG artefacts but not a person walking through the frame
+DEFAULT_THRESHOLD = 2.0
+DEFAULT_SIZE = (80, 60)
+
+
+@dataclass
+class ChangeStats:
+    """
+    Description
+    -----------
+    Running totals of the pictures checked
+    """
+    checked: int = 0
+    sent: int = 0
+    duplicates: int = 0
+    unchanged: int = 0
+    undecodable: int = 0
+    bytes_checked: int = 0
+    bytes_saved: int = 0
+
+
+class ChangeDetector:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, size: Tuple[int, int] = DEFAULT_SIZE) -> None:
+        """
+        Description
+        -----------
+        Keeps the hash and thumbnail of the last picture sent and checks new
+        pictures against them. Safe to share between threads.
+
+        Params
+        ------
+        :threshold: float = DEFAULT_THRESHOLD
+        How different a picture's thumbnail has to be, as the mean absolute
+        difference of its greyscale pixels, to be sent. 0 only holds back
+        exact duplicates.
+
+        :size: Tuple[int, int] = DEFAULT_SIZE
+        The most the thumbnails can be, width by height. The picture's
+        aspect ratio is kept.
+        """
+        self.threshold = threshold
+        self.size = size
+        self.stats = ChangeStats()
+        # How different the last picture checked was, None if it wasn't compared
+        self.last_score: Optional[float] = None
+        self._digest: Optional[bytes] = None
+        self._thumbnail: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def thumbnail(self, frame: bytes) -> np.ndarray:
+        """
+        Description
+        -----------
+        Decode a small greyscale copy of a picture.
+
+        Params
+        ------
+        :frame: bytes
+        The picture, JPEG or anything else Pillow can read.
+
+        Return
+        ------
+        np.ndarray
+        The thumbnail's pixels as int16, so they can be subtracted without
+        wrapping round. Pillow raises if the picture can't be read.
+        """
+        with Image.open(io.BytesIO(frame)) as image:
+            # Only JPEGs can be scaled while decoding, for anything else
+            # this does nothing
+            image.draft("L", self.size)
+            image = image.convert("L")
+            image.thumbnail(self.size)
+            return np.asarray(image, dtype=np.int16)
+
+    def _try_thumbnail(self, frame: bytes) -> Optional[np.ndarray]:
+        try:
+            return self.thumbnail(frame)
+        except Exception as e:
+            LOGGER.warning(f"Could not decode a {len(frame)} byte picture to compare it, sending it: {e!r}")
+            return None
+
+    def check(self, frame: bytes) -> bool:
+        """
+        Description
+        -----------
+        Check a picture and, if it is to be sent, remember it as the last one
+        sent.
+
+        Params
+        ------
+        :frame: bytes
+        The picture.
+
+        Return
+        ------
+        bool
+        Whether the picture changed enough to be sent.
+        """
+        digest = hashlib.blake2b(frame, digest_size=16).digest()
+        # Decoded outside the lock so several workers can decode at once,
+        # skipped when the picture looks like a duplicate already
+        decoded = digest != self._digest
+        thumbnail = self._try_thumbnail(frame) if decoded else None
+        # Checked and updated in one go, so two workers with the same
+        # picture can't both decide it is new
+        with self._lock:
+            self.stats.checked += 1
+            self.stats.bytes_checked += len(frame)
+            if digest == self._digest:
+                self.last_score = 0.0
+                self.stats.duplicates += 1
+                self.stats.bytes_saved += len(frame)
+                return False
+            if not decoded:
+                # The last picture sent changed since, rare enough to decode here
+                thumbnail = self._try_thumbnail(frame)
+            previous = self._thumbnail
+            score = None
+            if thumbnail is not None and previous is not None and thumbnail.shape == previous.shape:
+                score = float(np.abs(thumbnail - previous).mean())
+            self.last_score = score
+            if score is not None and score < self.threshold:
+                self.stats.unchanged += 1
+                self.stats.bytes_saved += len(frame)
+                return False
+            self.stats.sent += 1
+            self._digest = digest
+            if thumbnail is None:
+                # Keep comparing against the last picture that could be read
+                self.stats.undecodable += 1
+            else:
+                self._thumbnail = thumbnail
+            return True
+
+    def reset(self) -> None:
+        """Forget the last picture sent, so the next one is sent whatever it looks like."""
+        with self._lock:
+            self._digest = None
+            self._thumbnail = None
+
+
+    def save(self, path: str) -> None:
+        """
+        Description
+        -----------
+        Save the last picture sent's hash and thumbnail, for a program that
+        takes one picture per run to compare the next run's against.
+
+        Params
+        ------
+        :path: str
+        Where to save them, replaced whole so a reader never sees it half
+        written.
+        """
+        with self._lock:
+            digest, thumbnail = self._digest, self._thumbnail
+        state = {}
+        if digest is not None:
+            state["digest"] = np.frombuffer(digest, dtype=np.uint8)
+        if thumbnail is not None:
+            state["thumbnail"] = thumbnail
+        with open(path + "~", "wb") as state_file:
+            np.savez(state_file, **state)
+        os.replace(path + "~", path)
+
+    def load(self, path: str) -> bool:
+        """
+        Description
+        -----------
+        Pick up the last picture sent from a file written by `save`.
+
+        Params
+        ------
+        :path: str
+        The file.
+
+        Return
+        ------
+        bool
+        Whether it was loaded, a missing or unreadable file leaves the
+        detector as it was so the next picture is sent.
+        """
+        try:
+            with np.load(path) as state:
+                digest = state["digest"].tobytes() if "digest" in state else None
+                thumbnail = state["thumbnail"].astype(np.int16) if "thumbnail" in state else None
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            LOGGER.warning(f"Could not load the last picture sent from {path}, starting afresh: {e!r}")
+            return False
+        with self._lock:
+            self._digest, self._thumbnail = digest, thumbnail
+        return True
+
+
+def _parse_size(size: str) -> Tuple[int, int]:
+    width, _, height = size.lower().partition("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from dataclasses import asdict
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("pictures", nargs="+", help="Pictures in the order they were taken.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Mean absolute difference for a picture to count as changed. (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--size",
+        type=_parse_size,
+        default=DEFAULT_SIZE,
+        help="The thumbnail size to compare at, as WIDTHxHEIGHT. (default: 80x60)",
+    )
+    args = parser.parse_args()
+
+    detector = ChangeDetector(args.threshold, args.size)
+    for path in args.pictures:
+        with open(path, "rb") as picture_file:
+            sent = detector.check(picture_file.read())
+        score = "-" if detector.last_score is None else f"{detector.last_score:.2f}"
+        print(f"{'send' if sent else 'skip'}\t{score}\t{path}")
+    print(json.dumps(asdict(detector.stats)))
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+A small binary protocol for sending pictures (and anything that goes wrong
+taking them) down a pipe, and the reader for the client end of it.
+
+Everything is sent as frames, each a 16 byte header followed by the payload:
+
+```
+ 0      4         5      6       7      8          12         16
+ | RPIF | version | type | flags | pad  | length   | crc32    | payload...
+```
+
+- type: IMAGE (raw JPEG bytes), ERROR (utf-8 text) or METADATA (JSON)
+- flags: MORE when the payload carries on in the next frame of the same
+  type, so a picture can be sent a chunk at a time as it is taken without
+  knowing its size up front
+- length and crc32: of this frame's payload, big endian
+
+Unlike base64 the picture goes over as is (a third smaller and nothing to
+decode), and errors come through as their own messages rather than in place
+of the picture.
+
+Running the Program
+-------------------
+ssh pi ./capture_and_send_image.py | ./framing.py --output picture.jpg
+"""
+import json
+import struct
+import zlib
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, NamedTuple, Optional
+
+MAGIC = b"RPIF"
+VERSION = 1
+HEADER = struct.Struct("!4sBBBxII")
+
+IMAGE = 1
+ERROR = 2
+METADATA = 3
+TYPE_NAMES = {IMAGE: "image", ERROR: "error", METADATA: "metadata"}
+
+MORE = 0x01
+# Frames bigger than this are taken to be garbage rather than read in
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class FramingError(ValueError):
+    pass
+
+
+class RemoteError(RuntimeError):
+    pass
+
+
+class Message(NamedTuple):
+    type: int
+    payload: bytes
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return json.loads(self.payload)
+
+    @property
+    def error(self) -> str:
+        return self.payload.decode("utf-8", "replace")
+
+
+def write_frame(output: BinaryIO, frame_type: int, payload: bytes, flags: int = 0) -> None:
+    """
+    Description
+    -----------
+    Write one frame.
+
+    Params
+    ------
+    :output: BinaryIO
+    Where to write it.
+
+    :frame_type: int
+    IMAGE, ERROR or METADATA.
+
+    :payload: bytes
+    What to send, anything bytes like.
+
+    :flags: int = 0
+    MORE if the payload carries on in the next frame.
+    """
+    output.write(HEADER.pack(MAGIC, VERSION, frame_type, flags, len(payload), zlib.crc32(payload)))
+    output.write(payload)
+
+
+def write_message(output: BinaryIO, frame_type: int, chunks: Iterable[bytes]) -> int:
+    """
+    Description
+    -----------
+    Write a message a chunk at a time, as MORE frames ending with an empty
+    frame.
+
+    Params
+    ------
+    :output: BinaryIO
+    Where to write it.
+
+    :frame_type: int
+    IMAGE, ERROR or METADATA.
+
+    :chunks: Iterable[bytes]
+    The message in pieces.
+
+    Return
+    ------
+    int
+    How many payload bytes were written.
+    """
+    written = 0
+    for chunk in chunks:
+        if chunk:
+            write_frame(output, frame_type, chunk, MORE)
+            written += len(chunk)
+    write_frame(output, frame_type, b"")
+    return written
+
+
+def write_metadata(output: BinaryIO, metadata: Dict[str, Any]) -> None:
+    write_frame(output, METADATA, json.dumps(metadata).encode("utf-8"))
+
+
+def write_error(output: BinaryIO, error: str) -> None:
+    write_frame(output, ERROR, error.encode("utf-8"))
+
+
+class FrameReader:
+    def __init__(self, stream: BinaryIO) -> None:
+        """
+        Description
+        -----------
+        Reads frames back off a stream and joins them into messages.
+
+        Params
+        ------
+        :stream: BinaryIO
+        The stream to read, like `sys.stdin.buffer` or a socket's
+        `makefile("rb")`.
+        """
+        self.stream = stream
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = self.stream.read(size)
+        # Pipes and sockets can hand over less than asked for
+        while data is not None and len(data) < size:
+            more = self.stream.read(size - len(data))
+            if not more:
+                break
+            data += more
+        return data or b""
+
+    def read_frame(self) -> Optional[tuple]:
+        """
+        Description
+        -----------
+        Read the next frame.
+
+        Return
+        ------
+        Optional[tuple]
+        (type, flags, payload), None at the end of the stream.
+        """
+        header = self._read_exactly(HEADER.size)
+        if not header:
+            return None
+        if len(header) < HEADER.size:
+            raise FramingError("The stream ended part way through a frame header.")
+        magic, version, frame_type, flags, length, checksum = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise FramingError(f"Expected a frame, got {header[:4]!r}. Was it sent as base64?")
+        if version != VERSION:
+            raise FramingError(f"Cannot read version {version} frames.")
+        if length > MAX_FRAME:
+            raise FramingError(f"A {length} byte frame is too big to be real.")
+        payload = self._read_exactly(length)
+        if len(payload) < length:
+            raise FramingError("The stream ended part way through a frame.")
+        if zlib.crc32(payload) != checksum:
+            raise FramingError(f"A {TYPE_NAMES.get(frame_type, frame_type)} frame failed its checksum.")
+        return frame_type, flags, payload
+
+    def read_message(self) -> Optional[Message]:
+        """
+        Description
+        -----------
+        Read the next whole message, joining up MORE frames.
+
+        Return
+        ------
+        Optional[Message]
+        The message, None at the end of the stream.
+        """
+        frame = self.read_frame()
+        if frame is None:
+            return None
+        frame_type, flags, payload = frame
+        if not flags & MORE:
+            return Message(frame_type, payload)
+        parts = [payload]
+        while flags & MORE:
+            frame = self.read_frame()
+            if frame is None:
+                raise FramingError("The stream ended part way through a message.")
+            next_type, flags, payload = frame
+            if next_type != frame_type:
+                raise FramingError("A message was interrupted by a different type of frame.")
+            parts.append(payload)
+        return Message(frame_type, b"".join(parts))
+
+    def __iter__(self) -> Iterator[Message]:
+        while True:
+            message = self.read_message()
+            if message is None:
+                return
+            yield message
+
+
+def read_image(stream: BinaryIO) -> tuple:
+    """
+    Description
+    -----------
+    Read a picture sent by `capture_and_send_image.py`.
+
+    Params
+    ------
+    :stream: BinaryIO
+    The stream to read.
+
+    Return
+    ------
+    tuple
+    (the JPEG bytes, the metadata sent along with it). The bytes are None
+    if the sender held the picture back as unchanged (`--min_change`).
+    RemoteError is raised with the sender's message if it hit an error
+    taking the picture.
+    """
+    image, metadata = None, {}
+    for message in FrameReader(stream):
+        if message.type == ERROR:
+            raise RemoteError(message.error)
+        if message.type == METADATA:
+            metadata.update(message.metadata)
+        elif message.type == IMAGE:
+            image = message.payload
+    if image is None and not metadata.get("unchanged"):
+        raise FramingError("The stream ended without a picture.")
+    return image, metadata
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--output", required=True, help="Where to save the picture.")
+    args = parser.parse_args()
+
+    try:
+        picture, metadata = read_image(sys.stdin.buffer)
+    except (FramingError, RemoteError) as e:
+        sys.exit(f"Could not get the picture: {e}")
+    if picture is not None:
+        with open(args.output, "wb") as picture_file:
+            picture_file.write(picture)
+    print(json.dumps({"bytes": len(picture or b""), **metadata}))